@@ -18,6 +18,60 @@ class Settings(BaseSettings):
     # Application settings
     DEBUG: bool = True
     API_VERSION: str = "v1"
+
+    # Recommendation inference micro-batching
+    INFERENCE_BATCH_MAX_SIZE: int = 32
+    INFERENCE_BATCH_MAX_WAIT_MS: float = 5.0
+    INFERENCE_QUEUE_MAX_DEPTH: int = 1000
+
+    # Recommendation inference executor
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_MAX_PENDING: int = 8
+    INFERENCE_TORCH_THREADS: int = 2  # per call: torch intra-op + numpy BLAS (threadpoolctl)
+    INFERENCE_TIMEOUT_MS: float = 250.0
+
+    # Item vector index: "exact" or "ivf" (approximate)
+    ITEM_INDEX_BACKEND: str = "exact"
+    ITEM_INDEX_NPROBE: int = 16
+
+    # Book card cache (goodbooks_book_id / _id -> projected book)
+    BOOK_CACHE_MAX_SIZE: int = 20000
+    BOOK_CACHE_TTL_SECONDS: float = 300.0
+
+    # Authenticated user cache (get_current_user)
+    AUTH_USER_CACHE_MAX_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False  # True: cached user lives until the token expires
+
+    # bcrypt worker pool
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Loans
+    MAX_ACTIVE_LOANS: int = 5
+
+    # Listing totals (count cache for paginated lists)
+    LISTING_COUNT_CACHE_MAX_SIZE: int = 1000
+    LISTING_COUNT_CACHE_TTL_SECONDS: float = 30.0
+
+    # Catalogue search (in-process inverted index)
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_MAX_DELTA: int = 1000
+
+    # Per-user taste profiles (recommendations)
+    TASTE_PROFILE_RECENT_BOOKS: int = 20
+    TASTE_PROFILE_LIKED_RATING: int = 4
+
+    # Genre facets for /recommendations/categories (background refresh)
+    CATEGORY_FACETS_REFRESH_SECONDS: float = 300.0
+
+    # Per-user recommendation sections cache (stale-while-revalidate)
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_MAX_SIZE: int = 20000
+    RECOMMENDATION_CACHE_TTL_SECONDS: float = 300.0
+    RECOMMENDATION_CACHE_STALE_SECONDS: float = 3600.0
+    RECOMMENDATION_CACHE_REFRESH_WORKERS: int = 2
+    RECOMMENDATION_CACHE_MAX_PENDING: int = 1000
     
     class Config:
         env_file = ".env"
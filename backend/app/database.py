@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import PyMongoError
 from typing import Optional
 from .config import settings
 
@@ -25,6 +26,28 @@ async def close_mongo_connection():
         print("Closed MongoDB connection")
 
 
+async def ensure_indexes():
+    """
+    Indeksy, na których opiera się poprawność API (nie tylko wydajność).
+    Zakładane przy starcie, żeby działały też na bazach sprzed init_db.py.
+    """
+    db = get_database()
+    try:
+        # jedno aktywne wypożyczenie danej książki na użytkownika (create_loan)
+        await db.loans.create_index(
+            [("user_id", ASCENDING), ("book_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "active"},
+            name="active_loan_unique",
+        )
+    except PyMongoError as e:
+        # zwykle duplikaty aktywnych wypożyczeń sprzed indeksu – bez niego
+        # create_loan nie blokuje ponownego wypożyczenia tej samej książki
+        print(f"⚠️  Nie udało się założyć indeksu active_loan_unique: {e}")
+        print("   Bez indeksu duplikaty aktywnych wypożyczeń NIE są blokowane.")
+        print("   Usuń zduplikowane aktywne wypożyczenia i zrestartuj API.")
+
+
 def get_database():
     """Get database instance"""
     if not motor_client:
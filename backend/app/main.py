@@ -2,8 +2,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from .database import connect_to_mongo, close_mongo_connection
+from .config import settings
+from .database import connect_to_mongo, close_mongo_connection, ensure_indexes, get_database
 from .routes import auth, books, users, loans, reviews, recommendations
+from .services.inference_batcher import recommendation_batcher
+from .services.inference_executor import inference_executor
+from .services.search_index import catalog_search
+from .services.category_facets import category_facets
+from .services.recommendation_cache import recommendation_cache
+from .utils.security import shutdown_password_executor
+from recommendation_engine.goodbooks_lightgcn_service import goodbooks_lgcn_service
 
 
 
@@ -12,8 +20,24 @@ from .routes import auth, books, users, loans, reviews, recommendations
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await ensure_indexes()
+    # indeks wyszukiwania buduje się w tle – do tego czasu search idzie przez $regex
+    if settings.SEARCH_INDEX_ENABLED:
+        catalog_search.start_background_load(get_database())
+    # fasety gatunków liczone w tle, żądania czytają je z pamięci
+    category_facets.start(get_database())
+    # LightGCN ładuje się w tle – do tego czasu rekomendacje idą z fallbacku
+    goodbooks_lgcn_service.start_background_load(
+        index_backend=settings.ITEM_INDEX_BACKEND,
+        nprobe=settings.ITEM_INDEX_NPROBE,
+    )
     yield
     # Shutdown
+    await category_facets.stop()
+    await recommendation_cache.stop()
+    await recommendation_batcher.stop()
+    inference_executor.shutdown()
+    shutdown_password_executor()
     await close_mongo_connection()
 
 
@@ -31,6 +55,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # kursor kolejnej strony recenzji (routes/reviews.py)
 )
 
 # Rejestracja routerów
@@ -4,17 +4,27 @@ from typing import Optional
 from datetime import datetime
 from ..models.user import UserCreate, UserResponse, UserInDB
 from ..utils.security import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    PasswordHasherBusy,
     create_access_token,
     decode_access_token
 )
 from ..database import get_database
+from ..services.user_cache import user_cache
 from bson import ObjectId
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def password_busy_exception() -> HTTPException:
+    """503 gdy pula bcrypt jest pełna – nowy obiekt na każde żądanie"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"},
+    )
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     """Get current authenticated user"""
@@ -32,6 +42,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     if user_id is None:
         raise credentials_exception
     
+    cached = user_cache.get(payload)
+    if cached is not None:
+        return cached
+    
     db = get_database()
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     
@@ -39,7 +53,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         raise credentials_exception
     user["_id"] = str(user["_id"])
     
-    return UserInDB(**user)
+    return user_cache.set(payload, UserInDB(**user))
 
 
 async def get_current_active_user(
@@ -70,7 +84,10 @@ async def register(user: UserCreate):
     
     # Create user
     user_dict = user.model_dump()
-    user_dict["hashed_password"] = get_password_hash(user_dict.pop("password"))
+    try:
+        user_dict["hashed_password"] = await get_password_hash_async(user_dict.pop("password"))
+    except PasswordHasherBusy:
+        raise password_busy_exception()
     user_dict["created_at"] = datetime.utcnow()
     user_dict["updated_at"] = datetime.utcnow()
     user_dict["is_active"] = True
@@ -93,7 +110,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # Find user
     user = await db.users.find_one({"username": form_data.username})
     
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    try:
+        password_ok = bool(user) and await verify_password_async(form_data.password, user["hashed_password"])
+    except PasswordHasherBusy:
+        raise password_busy_exception()
+    
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -2,43 +2,82 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import Optional, List
 from bson import ObjectId
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import math
 
 from ..database import get_database
+from ..services.book_cache import book_cache
+from ..services.book_resolver import books_by_ids
+from ..services.search_index import catalog_search
+from ..services.similar_books import find_embedding_neighbours
 from ..routes.auth import get_current_active_user, get_current_user
+from ..utils.pagination import InvalidCursor, fetch_page, listing_counts
 from ..models.user import UserInDB
 
 router = APIRouter()
 
 
+def parse_goodbooks_book_id(value) -> Optional[int]:
+    """
+    goodbooks_book_id zapisujemy wyłącznie jako int (unikalny indeks sparse).
+    Akceptuje int albo string z liczbą całkowitą; None = brak powiązania.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy goodbooks_book_id")
+    if isinstance(value, int):
+        parsed = value
+    elif isinstance(value, str) and value.strip().isdigit():
+        parsed = int(value.strip())
+    elif isinstance(value, float) and value.is_integer():
+        parsed = int(value)
+    else:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy goodbooks_book_id")
+
+    if parsed <= 0:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy goodbooks_book_id")
+    return parsed
+
+
+async def ensure_goodbooks_book_id_free(db, goodbooks_book_id: int, book_id: Optional[str] = None) -> None:
+    query = {"goodbooks_book_id": goodbooks_book_id}
+    if book_id is not None:
+        query["_id"] = {"$ne": ObjectId(book_id)}
+    if await db.books.find_one(query, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="Ten goodbooks_book_id jest już przypisany do innej książki")
+
+
 # ============================================
 # GET /books/ - Lista książek z paginacją
 # ============================================
+SEARCH_MODES = ("auto", "index", "text", "regex")
+# ile trafień indeksu na jedno zapytanie $in przy filtrowaniu/sortowaniu w Mongo
+SEARCH_FILTER_CHUNK = 1000
+
+
 @router.get("/")
 async def get_books(
     page: int = Query(1, ge=1, description="Numer strony"),
     limit: int = Query(12, ge=1, le=100, description="Liczba książek na stronę"),
     search: Optional[str] = Query(None, description="Szukaj po tytule lub autorze"),
     genre: Optional[str] = Query(None, description="Filtruj po gatunku"),
-    sort: str = Query("title", description="Sortowanie: title, -title, -average_rating, -ratings_count, publication_year, -publication_year"),
-    available_only: bool = Query(False, description="Tylko dostępne")
+    sort: Optional[str] = Query(None, description="Sortowanie: title, -title, -average_rating, -ratings_count, publication_year, -publication_year (domyślnie title, przy wyszukiwaniu – trafność)"),
+    available_only: bool = Query(False, description="Tylko dostępne"),
+    cursor: Optional[str] = Query(None, description="Kursor z next_cursor poprzedniej strony (zamiast page)"),
+    search_mode: str = Query("auto", description="Wyszukiwanie: auto (indeks, gdy gotowy), index, text ($text Mongo), regex")
 ):
     """
     Pobierz listę książek z paginacją, wyszukiwaniem i filtrami.
     """
     db = get_database()
     
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy search_mode (dozwolone: {', '.join(SEARCH_MODES)})")
+    
     # Buduj query
     query = {}
     
-    # Wyszukiwanie tekstowe
-    if search:
-        # Użyj text search jeśli dostępny, w przeciwnym razie regex
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"author": {"$regex": search, "$options": "i"}}
-        ]
-    
     # Filtr gatunku
     if genre:
         query["genre"] = {"$regex": genre, "$options": "i"}
@@ -47,34 +86,81 @@ async def get_books(
     if available_only:
         query["available_copies"] = {"$gt": 0}
     
+    # Wyszukiwanie tekstowe
+    if search:
+        if search_mode in ("auto", "index") and catalog_search.is_ready:
+            # indeks w pamięci: prefiksy, bez diakrytyków, ranking trafności;
+            # stronicowanie po pełnej liście trafień, Mongo dostaje tylko id strony
+            if cursor:
+                raise HTTPException(status_code=400, detail="Kursor nie jest obsługiwany przy wyszukiwaniu – użyj page")
+            ranked_ids = [ObjectId(book_id) for book_id, _ in catalog_search.search(search)]
+            books, total = await _index_search_page(db, query, ranked_ids, sort, page, limit)
+            return _page_response(books, total, page, limit)
+        elif search_mode == "text":
+            query["$text"] = {"$search": search}
+        else:
+            # stara ścieżka (i fallback, dopóki indeks się buduje)
+            query["$or"] = [
+                {"title": {"$regex": search, "$options": "i"}},
+                {"author": {"$regex": search, "$options": "i"}}
+            ]
+    
+    # bez jawnego sortowania wyniki $text idą według trafności
+    if sort is None and "$text" in query:
+        if cursor:
+            raise HTTPException(status_code=400, detail="Kursor nie jest obsługiwany przy sortowaniu po trafności")
+        books, total = await _text_score_page(db, query, page, limit)
+        return _page_response(books, total, page, limit)
+    
     # Sortowanie
-    sort_field = sort.lstrip("-")
-    sort_order = -1 if sort.startswith("-") else 1
-    
-    # Mapowanie pól sortowania
-    sort_mapping = {
-        "title": "title",
-        "author": "author",
-        "average_rating": "average_rating",
-        "ratings_count": "ratings_count",
-        "publication_year": "publication_year",
-        "created_at": "created_at"
-    }
-    sort_field = sort_mapping.get(sort_field, "title")
+    sort_field, sort_order = _sort_spec(sort or "title")
     
-    # Policz całkowitą liczbę
-    total = await db.books.count_documents(query)
+    # Liczba wyników – szacowana / z krótkiego cache (bez count_documents na każde żądanie)
+    total = await listing_counts.count(db.books, query)
     total_pages = math.ceil(total / limit) if total > 0 else 1
     
-    # Pobierz książki
-    skip = (page - 1) * limit
-    cursor = db.books.find(query).sort(sort_field, sort_order).skip(skip).limit(limit)
+    # Pobierz książki – po kursorze (keyset) albo klasycznie po numerze strony
+    try:
+        books, next_cursor = await fetch_page(
+            db.books, query, sort_field, sort_order, limit,
+            cursor=cursor, skip=(page - 1) * limit,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    books = []
-    async for book in cursor:
+    for book in books:
         book["_id"] = str(book["_id"])
-        books.append(book)
     
+    return {
+        "books": books,
+        "total": total,
+        "page": None if cursor else page,
+        "limit": limit,
+        "total_pages": total_pages,
+        "has_next": next_cursor is not None,
+        "has_prev": bool(cursor) or page > 1,
+        "next_cursor": next_cursor
+    }
+
+
+# Mapowanie pól sortowania
+SORT_FIELDS = {
+    "title": "title",
+    "author": "author",
+    "average_rating": "average_rating",
+    "ratings_count": "ratings_count",
+    "publication_year": "publication_year",
+    "created_at": "created_at"
+}
+
+
+def _sort_spec(sort: str):
+    """(pole, kierunek) z parametru sort, np. "-average_rating" -> ("average_rating", -1)."""
+    return SORT_FIELDS.get(sort.lstrip("-"), "title"), -1 if sort.startswith("-") else 1
+
+
+def _page_response(books: List[dict], total: int, page: int, limit: int) -> dict:
+    total_pages = math.ceil(total / limit) if total > 0 else 1
     return {
         "books": books,
         "total": total,
@@ -82,7 +168,88 @@ async def get_books(
         "limit": limit,
         "total_pages": total_pages,
         "has_next": page < total_pages,
-        "has_prev": page > 1
+        "has_prev": page > 1,
+        "next_cursor": None
+    }
+
+
+def _mongo_sort_key(value):
+    """Klucz porządku jak w Mongo dla typów z katalogu: null < liczby < tekst < daty."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value)
+    return (4, str(value))
+
+
+async def _index_search_page(db, filters: dict, ranked_ids: List[ObjectId], sort: Optional[str],
+                             page: int, limit: int):
+    """
+    Strona pełnej listy trafień indeksu: według trafności albo jawnego sort.
+    Bez filtrów i sortowania Mongo czyta tylko książki strony; z nimi –
+    jeden przebieg po trafieniach w porcjach $in po SEARCH_FILTER_CHUNK.
+    """
+    if filters or sort is not None:
+        sort_field, sort_order = _sort_spec(sort) if sort is not None else (None, 1)
+        projection = {sort_field: 1} if sort_field else {"_id": 1}
+        matching = {}
+        for start in range(0, len(ranked_ids), SEARCH_FILTER_CHUNK):
+            chunk = ranked_ids[start:start + SEARCH_FILTER_CHUNK]
+            async for doc in db.books.find({**filters, "_id": {"$in": chunk}}, projection):
+                matching[doc["_id"]] = doc.get(sort_field) if sort_field else None
+        ranked_ids = [book_id for book_id in ranked_ids if book_id in matching]
+        if sort_field:
+            # _id jako rozstrzygnięcie remisów – jak keyset_sort
+            ranked_ids.sort(key=lambda book_id: (_mongo_sort_key(matching[book_id]), book_id),
+                            reverse=sort_order == -1)
+    
+    page_ids = ranked_ids[(page - 1) * limit:page * limit]
+    by_id = await books_by_ids(db, page_ids)
+    books = []
+    for book_id in page_ids:
+        book = by_id.get(str(book_id))
+        if book:
+            book["_id"] = str(book["_id"])
+            books.append(book)
+    return books, len(ranked_ids)
+
+
+async def _text_score_page(db, query: dict, page: int, limit: int):
+    """Strona wyników $text posortowana po textScore (wymaga indeksu tekstowego)."""
+    score = {"$meta": "textScore"}
+    try:
+        total = await listing_counts.count(db.books, query)
+        cursor = db.books.find(query, {"score": score}).sort([("score", score)]).skip((page - 1) * limit).limit(limit)
+        books = await cursor.to_list(None)
+    except OperationFailure:
+        raise HTTPException(status_code=400, detail="Brak indeksu tekstowego – użyj search_mode=index lub regex")
+    for book in books:
+        book["_id"] = str(book["_id"])
+    return books, total
+
+
+# ============================================
+# GET /books/suggest - Podpowiedzi (type-ahead)
+# ============================================
+# zadeklarowane przed /{book_id}, inaczej "suggest" trafiłoby jako book_id
+@router.get("/suggest")
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="Wpisywany tekst"),
+    limit: int = Query(8, ge=1, le=20, description="Liczba podpowiedzi")
+):
+    """
+    Podpowiedzi tytułów i autorów dla wyszukiwarki – z indeksu w pamięci,
+    bez zapytań do Mongo. Dopóki indeks się buduje: ready=false i pusta lista.
+    """
+    suggestions = catalog_search.suggest(q, limit)
+    return {
+        "query": q,
+        "ready": suggestions is not None,
+        "suggestions": suggestions or []
     }
 
 
@@ -132,9 +299,21 @@ async def create_book(
     book_data.setdefault("ratings_count", 0)
     book_data.setdefault("total_loans", 0)
     
-    result = await db.books.insert_one(book_data)
+    if "goodbooks_book_id" in book_data:
+        gb_id = parse_goodbooks_book_id(book_data.pop("goodbooks_book_id"))
+        if gb_id is not None:
+            await ensure_goodbooks_book_id_free(db, gb_id)
+            book_data["goodbooks_book_id"] = gb_id
+    
+    try:
+        result = await db.books.insert_one(book_data)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Książka o tym goodbooks_book_id lub ISBN już istnieje")
+    if book_data.get("goodbooks_book_id") is not None:
+        book_cache.invalidate(goodbooks_book_id=book_data["goodbooks_book_id"])
     
     created_book = await db.books.find_one({"_id": result.inserted_id})
+    catalog_search.upsert(created_book)
     created_book["_id"] = str(created_book["_id"])
     
     return created_book
@@ -165,15 +344,28 @@ async def update_book(
     # Usuń _id jeśli został przesłany
     book_data.pop("_id", None)
     
-    result = await db.books.update_one(
-        {"_id": ObjectId(book_id)},
-        {"$set": book_data}
-    )
+    update = {"$set": book_data}
+    if "goodbooks_book_id" in book_data:
+        gb_id = parse_goodbooks_book_id(book_data.pop("goodbooks_book_id"))
+        if gb_id is None:
+            # null w indeksie sparse też jest wartością – usuwamy pole
+            update["$unset"] = {"goodbooks_book_id": ""}
+        else:
+            await ensure_goodbooks_book_id_free(db, gb_id, book_id)
+            book_data["goodbooks_book_id"] = gb_id
+    
+    try:
+        result = await db.books.update_one({"_id": ObjectId(book_id)}, update)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Książka o tym goodbooks_book_id lub ISBN już istnieje")
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Książka nie znaleziona")
     
+    book_cache.invalidate(book_id=book_id, goodbooks_book_id=book_data.get("goodbooks_book_id"))
+    
     updated_book = await db.books.find_one({"_id": ObjectId(book_id)})
+    catalog_search.upsert(updated_book)
     updated_book["_id"] = str(updated_book["_id"])
     
     return updated_book
@@ -215,6 +407,9 @@ async def delete_book(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Książka nie znaleziona")
     
+    book_cache.invalidate(book_id=book_id)
+    catalog_search.remove(book_id)
+    
     return {"message": "Książka została usunięta"}
 
 
@@ -227,7 +422,8 @@ async def get_similar_books(
     limit: int = Query(6, ge=1, le=20)
 ):
     """
-    Pobierz podobne książki (na podstawie gatunku i autora).
+    Pobierz podobne książki – sąsiedzi z embeddingów LightGCN,
+    a dla książek bez embeddingu – na podstawie gatunku i autora.
     """
     db = get_database()
     
@@ -239,6 +435,12 @@ async def get_similar_books(
     if not book:
         raise HTTPException(status_code=404, detail="Książka nie znaleziona")
     
+    neighbours = await find_embedding_neighbours(db, book, limit)
+    if neighbours is not None:
+        for similar_book in neighbours:
+            similar_book["_id"] = str(similar_book["_id"])
+        return neighbours
+    
     # Znajdź podobne po gatunku lub autorze
     query = {
         "_id": {"$ne": ObjectId(book_id)},
@@ -1,11 +1,19 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import Optional
+from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
 
+from ..config import settings
 from ..database import get_database
 from ..routes.auth import get_current_active_user
 from ..models.user import UserInDB
+from ..services.book_cache import book_cache
+from ..services.book_resolver import books_by_ids, users_by_ids
+from ..services import user_profiles
+from ..services.recommendation_cache import recommendation_cache
+from ..utils.pagination import InvalidCursor, fetch_page, listing_counts
 from pydantic import BaseModel
 
 
@@ -34,29 +42,23 @@ def serialize_doc(doc: dict) -> dict:
             out[key] = value
     return out
 
-async def enrich_loan(db, loan):
-    """Uzupełnia wypożyczenie o dane książki i użytkownika."""
-    
+# pola potrzebne do wzbogacenia wypożyczenia
+LOAN_BOOK_PROJECTION = {"title": 1, "author": 1, "image_url": 1, "cover_image": 1}
+LOAN_USER_PROJECTION = {"username": 1, "full_name": 1}
+
+
+def apply_loan_details(loan: dict, book: Optional[dict], user: Optional[dict]) -> dict:
+    """Dokleja do wypożyczenia dane książki/użytkownika i is_overdue."""
     loan = dict(loan)  # ← unikamy problemów z Cursor/Raw doc
 
-    # Book
-    try:
-        book = await db.books.find_one({"_id": ObjectId(loan["book_id"])})
-        if book:
-            loan["book_title"] = book.get("title", "")
-            loan["book_author"] = book.get("author", "")
-            loan["book_image"] = book.get("image_url") or book.get("cover_image")
-    except:
-        pass
+    if book:
+        loan["book_title"] = book.get("title", "")
+        loan["book_author"] = book.get("author", "")
+        loan["book_image"] = book.get("image_url") or book.get("cover_image")
 
-    # User
-    try:
-        user = await db.users.find_one({"_id": ObjectId(loan["user_id"])})
-        if user:
-            loan["username"] = user.get("username", "")
-            loan["user_name"] = user.get("full_name", "")
-    except:
-        pass
+    if user:
+        loan["username"] = user.get("username", "")
+        loan["user_name"] = user.get("full_name", "")
 
     loan["is_overdue"] = (
         loan.get("status") == "active"
@@ -69,6 +71,31 @@ async def enrich_loan(db, loan):
     return loan
 
 
+async def enrich_loans(db, loans: List[dict], user: Optional[dict] = None) -> List[dict]:
+    """
+    Uzupełnia całą stronę wypożyczeń o dane książek i użytkowników –
+    dwa zapytania $in (równolegle) zamiast dwóch find_one na wypożyczenie.
+
+    user – gdy wszystkie wypożyczenia należą do znanego użytkownika
+    (np. /me), zapytanie o użytkowników jest pomijane.
+    """
+    if not loans:
+        return []
+
+    books_query = books_by_ids(db, (loan["book_id"] for loan in loans), LOAN_BOOK_PROJECTION)
+    if user is None:
+        users_query = users_by_ids(db, (loan["user_id"] for loan in loans), LOAN_USER_PROJECTION)
+        books, users_by_id = await asyncio.gather(books_query, users_query)
+    else:
+        books = await books_query
+        users_by_id = {str(loan["user_id"]): user for loan in loans}
+
+    return [
+        apply_loan_details(loan, books.get(str(loan["book_id"])), users_by_id.get(str(loan["user_id"])))
+        for loan in loans
+    ]
+
+
 
 # ============================================================================
 #  LISTA WSZYSTKICH WYPOŻYCZEŃ (panel admina)
@@ -79,6 +106,7 @@ async def get_loans(
     status: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Kursor z next_cursor poprzedniej strony (zamiast page)"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     if current_user.role not in ["admin", "librarian"]:
@@ -88,17 +116,24 @@ async def get_loans(
 
     query = {"status": status} if status else {}
 
-    cursor = db.loans.find(query).sort("loan_date", -1).skip((page - 1) * limit).limit(limit)
+    try:
+        loans, next_cursor = await fetch_page(
+            db.loans, query, "loan_date", -1, limit,
+            cursor=cursor, skip=(page - 1) * limit,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    loans = [enrich_loan(db, loan) async for loan in cursor]
+    loans = await enrich_loans(db, loans)
 
-    total = await db.loans.count_documents(query)
+    total = await listing_counts.count(db.loans, query)
 
     return {
         "loans": loans,
         "total": total,
-        "page": page,
-        "limit": limit
+        "page": None if cursor else page,
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -119,11 +154,8 @@ async def get_my_loans(
 
     cursor = db.loans.find(query).sort("loan_date", -1)
 
-    loans = []
-    async for loan in cursor:
-        loans.append(await enrich_loan(db, loan))  # ← KLUCZOWA POPRAWKA
-
-    return loans
+    user = {"username": current_user.username or "", "full_name": current_user.full_name or ""}
+    return await enrich_loans(db, await cursor.to_list(None), user=user)
 
 
 
@@ -148,7 +180,7 @@ async def get_loan(
     if loan["user_id"] != current_user.id and current_user.role not in ["admin", "librarian"]:
         raise HTTPException(status_code=403, detail="Brak uprawnień")
 
-    return enrich_loan(db, loan)
+    return (await enrich_loans(db, [loan]))[0]
 
 
 # ============================================================================
@@ -159,39 +191,108 @@ class LoanCreate(BaseModel):
     book_id: str
     librarian_notes: Optional[str] = None
 
+
+async def active_loans_count(db, user_id: str) -> int:
+    """
+    Licznik active_loans_count użytkownika – ten sam, który zajmuje
+    reserve_user_slot. Brakujące pole jest jednorazowo wyliczane z loans.
+    """
+    user_filter = {"_id": oid(user_id)}
+    user = await db.users.find_one(user_filter, {"active_loans_count": 1})
+    if user and "active_loans_count" in user:
+        return user["active_loans_count"]
+
+    count = await db.loans.count_documents({"user_id": user_id, "status": "active"})
+    if user:
+        await db.users.update_one(
+            {**user_filter, "active_loans_count": {"$exists": False}},
+            {"$set": {"active_loans_count": count}},
+        )
+    return count
+
+
+async def reserve_user_slot(db, user_id: str) -> bool:
+    """
+    Atomowo zajmuje jedno z MAX_ACTIVE_LOANS miejsc użytkownika
+    (licznik active_loans_count w dokumencie users).
+
+    Użytkownicy sprzed wprowadzenia licznika nie mają tego pola – wtedy
+    jest jednorazowo wyliczane z kolekcji loans i próba jest powtarzana.
+    """
+    limit = settings.MAX_ACTIVE_LOANS
+    user_filter = {"_id": oid(user_id)}
+
+    for _ in range(2):
+        reserved = await db.users.find_one_and_update(
+            {**user_filter, "active_loans_count": {"$lt": limit}},
+            {"$inc": {"active_loans_count": 1}},
+            projection={"_id": 1},
+        )
+        if reserved:
+            return True
+
+        user = await db.users.find_one(user_filter, {"active_loans_count": 1})
+        if not user or "active_loans_count" in user:
+            return False
+
+        await active_loans_count(db, user_id)
+
+    return False
+
+
+async def release_user_slot(db, user_id: str) -> None:
+    await db.users.update_one(
+        {"_id": oid(user_id), "active_loans_count": {"$gt": 0}},
+        {"$inc": {"active_loans_count": -1}},
+    )
+
+
+async def release_copy(db, book_id: str) -> None:
+    await db.books.update_one({"_id": oid(book_id)}, {"$inc": {"available_copies": 1}})
+    book_cache.invalidate(book_id=book_id)
+
+
 @router.post("/", status_code=201)
 async def create_loan(
     data: LoanCreate,
     current_user: UserInDB = Depends(get_current_active_user)
 ):
+    """
+    Wypożyczenie bez wyścigów: egzemplarz i miejsce w limicie użytkownika
+    rezerwowane są warunkowymi find_one_and_update, duplikat aktywnego
+    wypożyczenia blokuje częściowy indeks unikalny active_loan_unique
+    (DuplicateKeyError przy insert_one). Każdy nieudany krok cofa
+    wcześniejsze rezerwacje.
+
+    Zapisy na szczęśliwej ścieżce: egzemplarz, miejsce w limicie, loan,
+    profil gustu – bez odczytów przed nimi.
+    """
     db = get_database()
 
     if not ObjectId.is_valid(data.book_id):
         raise HTTPException(status_code=400, detail="Nieprawidłowy ID książki")
 
-    book = await db.books.find_one({"_id": oid(data.book_id)})
+    # najpierw egzemplarz – przy wyprzedanej książce to jedyny zapis
+    book = await db.books.find_one_and_update(
+        {"_id": oid(data.book_id), "available_copies": {"$gt": 0}},
+        {"$inc": {"available_copies": -1}},
+        projection={**LOAN_BOOK_PROJECTION, **user_profiles.PROFILE_BOOK_PROJECTION},
+    )
     if not book:
-        raise HTTPException(404, "Książka nie znaleziona")
-
-    if book.get("available_copies", 0) <= 0:
+        if not await db.books.find_one({"_id": oid(data.book_id)}, {"_id": 1}):
+            raise HTTPException(404, "Książka nie znaleziona")
         raise HTTPException(400, "Brak dostępnych egzemplarzy")
 
-    existing = await db.loans.find_one({
-        "book_id": data.book_id,
-        "user_id": current_user.id,
-        "status": "active"
-    })
-    if existing:
-        raise HTTPException(400, "Masz już wypożyczoną tę książkę")
-
-    if await db.loans.count_documents({"user_id": current_user.id, "status": "active"}) >= 5:
-        raise HTTPException(400, "Osiągnięto limit 5 wypożyczeń")
+    if not await reserve_user_slot(db, current_user.id):
+        await release_copy(db, data.book_id)
+        raise HTTPException(400, f"Osiągnięto limit {settings.MAX_ACTIVE_LOANS} wypożyczeń")
 
+    now = datetime.utcnow()
     loan = {
         "book_id": data.book_id,
         "user_id": current_user.id,
-        "loan_date": datetime.utcnow(),
-        "due_date": datetime.utcnow() + timedelta(days=30),
+        "loan_date": now,
+        "due_date": now + timedelta(days=30),
         "return_date": None,
         "status": "active",
         "renewal_count": 0,
@@ -199,16 +300,20 @@ async def create_loan(
         "librarian_notes": data.librarian_notes
     }
 
-    result = await db.loans.insert_one(loan)
-
-    await db.books.update_one(
-        {"_id": oid(data.book_id)},
-        {"$inc": {"available_copies": -1}}
-    )
+    try:
+        await db.loans.insert_one(loan)
+    except DuplicateKeyError:
+        await release_copy(db, data.book_id)
+        await release_user_slot(db, current_user.id)
+        raise HTTPException(400, "Masz już wypożyczoną tę książkę")
 
-    created = await db.loans.find_one({"_id": result.inserted_id})
+    book_cache.invalidate(book_id=data.book_id)
+    await user_profiles.record_loan(db, current_user.id, data.book_id, book)
+    recommendation_cache.invalidate_user(current_user.id)
 
-    return await enrich_loan(db, created)
+    # insert_one uzupełnia loan["_id"] – bez ponownego odczytu i enrich_loans
+    user = {"username": current_user.username or "", "full_name": current_user.full_name or ""}
+    return apply_loan_details(loan, book, user)
 
 
 
@@ -238,8 +343,9 @@ async def return_loan(
     if loan["status"] != "active":
         raise HTTPException(400, "To wypożyczenie nie jest aktywne")
 
-    await db.loans.update_one(
-        {"_id": oid(loan_id)},
+    # warunek na status – równoległy drugi zwrot nie odda egzemplarza dwa razy
+    result = await db.loans.update_one(
+        {"_id": oid(loan_id), "status": "active"},
         {
             "$set": {
                 "status": "returned",
@@ -248,11 +354,12 @@ async def return_loan(
             }
         }
     )
+    if result.modified_count != 1:
+        raise HTTPException(400, "To wypożyczenie nie jest aktywne")
 
-    await db.books.update_one(
-        {"_id": oid(loan["book_id"])},
-        {"$inc": {"available_copies": 1}}
-    )
+    await release_copy(db, loan["book_id"])
+    await release_user_slot(db, loan["user_id"])
+    recommendation_cache.invalidate_user(loan["user_id"])
 
     return {"message": "Książka została zwrócona"}
 
@@ -312,8 +419,7 @@ async def can_borrow(book_id: str, current_user: UserInDB = Depends(get_current_
     if await db.loans.find_one({"book_id": book_id, "user_id": current_user.id, "status": "active"}):
         return {"can_borrow": False, "reason": "Masz już wypożyczoną tę książkę"}
 
-    count = await db.loans.count_documents({"user_id": current_user.id, "status": "active"})
-    if count >= 5:
-        return {"can_borrow": False, "reason": "Limit 5 wypożyczeń"}
+    if await active_loans_count(db, current_user.id) >= settings.MAX_ACTIVE_LOANS:
+        return {"can_borrow": False, "reason": f"Limit {settings.MAX_ACTIVE_LOANS} wypożyczeń"}
 
     return {"can_borrow": True}
@@ -2,16 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional
 from datetime import datetime
 from bson import ObjectId
+import asyncio
 import random
 import json
 from pathlib import Path
 from recommendation_engine.goodbooks_lightgcn_service import goodbooks_lgcn_service
-from recommendation_engine.goodbooks_lightgcn import MODEL_DIR
+from recommendation_engine.serving_artifact import MODEL_DIR
 
 
 from pydantic import BaseModel
 
 from ..database import get_database
+from ..config import settings
+from ..services.inference_batcher import recommendation_batcher, InferenceQueueFull
+from ..services.inference_executor import inference_executor, InferenceSaturated
+from ..services.book_cache import book_cache
+from ..services.search_index import catalog_search
+from ..services.category_facets import category_facets
+from ..services.recommendation_cache import recommendation_cache, Uncached
+from ..services.book_resolver import in_rank_order, to_object_ids
+from ..services import user_profiles
+from ..services.similar_books import find_embedding_neighbours
 from .auth import get_current_user
 
 
@@ -77,10 +88,18 @@ class InteractionIn(BaseModel):
 
 @router.get("/health")
 async def health_check():
+    model_status = goodbooks_lgcn_service.status()
     return {
         "status": "healthy",
-        "model_loaded": False,
-        "fallback_mode": True,
+        "model_loaded": goodbooks_lgcn_service.is_loaded,
+        "fallback_mode": not goodbooks_lgcn_service.is_loaded,
+        "model": model_status,
+        "batcher": recommendation_batcher.stats(),
+        "executor": inference_executor.stats(),
+        "book_cache": book_cache.stats(),
+        "search_index": catalog_search.stats(),
+        "categories": category_facets.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
         "timestamp": datetime.now().isoformat(),
     }
 
@@ -168,38 +187,17 @@ async def get_featured(
     limit: int = Query(default=10, le=20),
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_database()
     user_id = str(current_user.id)
+    return await recommendation_cache.get(
+        user_id, "featured", (limit,),
+        lambda: _compute_featured(get_database(), user_id, limit),
+    )
 
-    favorite_genres = []
-
-    pipeline = [
-        {"$match": {"user_id": ObjectId(user_id)}},
-        {"$lookup": {
-            "from": "books",
-            "localField": "book_id",
-            "foreignField": "_id",
-            "as": "book",
-        }},
-        {"$unwind": "$book"},
-        {"$addFields": {
-            "bookGenres": {
-                "$cond": [
-                    {"$isArray": "$book.genres"},
-                    "$book.genres",
-                    {"$cond": [{"$isArray": "$book.genre"}, "$book.genre", ["$book.genre"]]}
-                ]
-            }
-        }},
-        {"$unwind": "$bookGenres"},
-        {"$group": {"_id": "$bookGenres", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 5},
-    ]
 
-    async for doc in db.loans.aggregate(pipeline):
-        if doc["_id"]:
-            favorite_genres.append(doc["_id"])
+async def _compute_featured(db, user_id: str, limit: int) -> list:
+    # top gatunki z profilu gustu (jeden odczyt po _id zamiast $lookup po loans)
+    profile = await user_profiles.get_profile(db, user_id)
+    favorite_genres = user_profiles.top_genres(profile, 5)
 
     books = []
 
@@ -243,42 +241,8 @@ async def get_featured(
 
 @router.get("/categories")
 async def get_categories():
-    db = get_database()
-
-    pipeline = [
-        {"$addFields": {
-            "genres": {
-                "$cond": [
-                    {"$isArray": "$genres"},
-                    "$genres",
-                    {"$cond": [{"$isArray": "$genre"}, "$genre", ["$genre"]]}
-                ]
-            }
-        }},
-        {"$unwind": "$genres"},
-        {"$group": {
-            "_id": "$genres",
-            "count": {"$sum": 1},
-            "covers": {"$push": "$coverImage"},
-        }},
-        {"$project": {
-            "name": "$_id",
-            "count": 1,
-            "sampleCovers": {"$slice": ["$covers", 6]},
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": 10},
-    ]
-
-    out = []
-    async for cat in db.books.aggregate(pipeline):
-        out.append({
-            "name": cat["name"],
-            "count": cat["count"],
-            "sampleCovers": [c for c in cat["sampleCovers"] if c],
-        })
-
-    return out
+    # lista przeliczana w tle (services/category_facets.py) – bez skanu books na żądanie
+    return await category_facets.get(get_database())
 
 
 # ==========================================================
@@ -290,34 +254,52 @@ async def get_because_borrowed(
     limit: int = Query(default=3, le=5),
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_database()
     user_id = str(current_user.id)
-
-    loans = db.loans.find({"user_id": ObjectId(user_id)}).sort("borrowed_at", -1).limit(limit)
-
-    sections = []
-
-    async for loan in loans:
-        raw = await db.books.find_one({"_id": loan["book_id"]})
-        if not raw:
+    return await recommendation_cache.get(
+        user_id, "because-borrowed", (limit,),
+        lambda: _compute_because_borrowed(get_database(), user_id, limit),
+    )
+
+
+async def _compute_because_borrowed(db, user_id: str, limit: int) -> list:
+    # ostatnie wypożyczenia z profilu -> karty książek jednym $in (cache)
+    profile = await user_profiles.get_profile(db, user_id)
+    recent_ids = profile.get("recent_book_ids", [])[:limit]
+    cards = await book_cache.get_by_ids(db, recent_ids)
+
+    sources = []
+    for book_id in recent_ids:
+        card = cards.get(book_id)
+        if not card:
             continue
 
-        source = normalize_book(serialize_doc(raw))
+        source = normalize_book(serialize_doc(card))
         genres = source["genres"]
         author = source.get("author")
 
-        similar_query = {"_id": {"$ne": loan["book_id"]}, "$or": []}
-
+        similar_or = []
         if genres:
-            similar_query["$or"].append({"genres": {"$in": genres}})
+            similar_or.append({"genres": {"$in": genres}})
         if author:
-            similar_query["$or"].append({"author": author})
+            similar_or.append({"author": author})
 
-        if not similar_query["$or"]:
-            continue
+        if similar_or:
+            sources.append((source, {"_id": {"$ne": ObjectId(book_id)}, "$or": similar_or}))
+
+    # zapytania o podobne dla wszystkich źródeł równolegle
+    results = await asyncio.gather(*(
+        db.books.find(similar_query).limit(6).to_list(6)
+        for _, similar_query in sources
+    ))
+
+    sections = []
+
+    for (source, _), similar in zip(sources, results):
+        genres = source["genres"]
+        author = source.get("author")
 
         recs = []
-        async for raw2 in db.books.find(similar_query).limit(6):
+        for raw2 in similar:
             b = normalize_book(serialize_doc(raw2))
 
             score = 0.5
@@ -351,10 +333,16 @@ async def get_discovery_queue(
     limit: int = Query(default=12, le=30),
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_database()
     user_id = str(current_user.id)
+    return await recommendation_cache.get(
+        user_id, "discovery-queue", (limit,),
+        lambda: _compute_discovery_queue(get_database(), user_id, limit),
+    )
 
-    borrowed = [loan["book_id"] async for loan in db.loans.find({"user_id": ObjectId(user_id)})]
+
+async def _compute_discovery_queue(db, user_id: str, limit: int) -> list:
+    profile = await user_profiles.get_profile(db, user_id)
+    borrowed = to_object_ids(profile.get("borrowed_book_ids", []))
 
     query = {"_id": {"$nin": borrowed}} if borrowed else {}
 
@@ -379,37 +367,26 @@ async def get_known_authors(
     limit: int = Query(default=6, le=10),
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_database()
     user_id = str(current_user.id)
+    return await recommendation_cache.get(
+        user_id, "known-authors", (limit,),
+        lambda: _compute_known_authors(get_database(), user_id, limit),
+    )
 
-    pipeline = [
-        {"$match": {"user_id": ObjectId(user_id)}},
-        {"$lookup": {
-            "from": "books",
-            "localField": "book_id",
-            "foreignField": "_id",
-            "as": "book"
-        }},
-        {"$unwind": "$book"},
-        {"$group": {
-            "_id": "$book.author",
-            "count": {"$sum": 1}
-        }},
-        {"$match": {"_id": {"$ne": None}}},
-        {"$sort": {"count": -1}},
-        {"$limit": limit}
-    ]
 
-    authors = []
+async def _compute_known_authors(db, user_id: str, limit: int) -> list:
+    profile = await user_profiles.get_profile(db, user_id)
+    author_names = user_profiles.top_authors(profile, limit)
 
-    async for doc in db.loans.aggregate(pipeline):
-        author_name = doc["_id"]
+    # najnowsza książka każdego autora – zapytania równolegle
+    latest_books = await asyncio.gather(*(
+        db.books.find_one({"author": author_name}, sort=[("publication_year", -1)])
+        for author_name in author_names
+    ))
 
-        latest = await db.books.find_one(
-            {"author": author_name},
-            sort=[("publication_year", -1)]
-        )
+    authors = []
 
+    for author_name, latest in zip(author_names, latest_books):
         if latest:
             latest = normalize_book(serialize_doc(latest))
             authors.append({
@@ -441,6 +418,11 @@ async def get_similar(book_id: str, limit: int = Query(default=8, le=20)):
     if not raw:
         raise HTTPException(status_code=404, detail="Book not found")
 
+    # prekomputowani sąsiedzi z embeddingów; heurystyka tylko dla książek bez nich
+    neighbours = await find_embedding_neighbours(db, raw, limit)
+    if neighbours is not None:
+        return [normalize_book(serialize_doc(b)) for b in neighbours]
+
     source = normalize_book(serialize_doc(raw))
     genres = source["genres"]
     author = source.get("author")
@@ -522,44 +504,34 @@ async def get_user_lightgcn_recommendations(
     """
     Rekomendacje oparte na modelu LightGCN trenowanym na goodbooks-10k.
     Dla aktualnego użytkownika:
-    - bierzemy jego wypożyczenia
-    - filtrujemy tylko książki z goodbooks_book_id
+    - bierzemy jego książki goodbooks z profilu gustu (wypożyczone i wysoko ocenione)
     - generujemy embedding usera jako średnia embeddingów jego książek
     - zwracamy top-N dopasowanych książek z katalogu
+    Fallbacki (model niegotowy, pełna kolejka) nie trafiają do cache.
     """
-    db = get_database()
     user_id = getattr(current_user, "id", None)
     if not user_id:
         raise HTTPException(status_code=400, detail="Brak poprawnego użytkownika")
 
-    try:
-        uid = ObjectId(str(user_id))
-    except Exception:
+    if not ObjectId.is_valid(str(user_id)):
         raise HTTPException(status_code=400, detail="Nieprawidłowe ID użytkownika")
 
-    # 1) Wypożyczenia użytkownika
-    user_goodbooks_ids = set()
-
-    async for loan in db.loans.find({"user_id": uid}):
-        book_id = loan.get("book_id")
-        if not book_id:
-            continue
-
-        book = await db.books.find_one({"_id": book_id})
-        if not book:
-            continue
+    user_id = str(user_id)
+    return await recommendation_cache.get(
+        user_id, "user-lightgcn", (limit,),
+        lambda: _compute_user_lightgcn(get_database(), user_id, limit),
+    )
 
-        gb_id = book.get("goodbooks_book_id")
-        if gb_id is None:
-            continue
 
-        # goodbooks_book_id może być stringiem – rzutujemy na int
-        try:
-            gb_int = int(gb_id)
-        except (TypeError, ValueError):
-            continue
+async def _compute_user_lightgcn(db, user_id: str, limit: int):
+    # 0) Model jeszcze się ładuje (albo nie wstał) -> popularne książki z Mongo
+    if not goodbooks_lgcn_service.is_loaded:
+        return Uncached(await get_popular_goodbooks_fallback(db, limit))
 
-        user_goodbooks_ids.add(gb_int)
+    # 1) Książki goodbooks użytkownika – gotowe w profilu gustu
+    user_goodbooks_ids = user_profiles.seed_goodbooks_ids(
+        await user_profiles.get_profile(db, user_id)
+    )
 
     # 2) Jeśli user nie ma żadnych powiązań z goodbooks -> fallback globalny
     if not user_goodbooks_ids:
@@ -568,33 +540,33 @@ async def get_user_lightgcn_recommendations(
             top_k=limit * 3,
         )
     else:
-        rec_goodbooks_ids = goodbooks_lgcn_service.recommend_for_goodbooks_ids(
-            list(user_goodbooks_ids),
-            top_k=limit * 3,  # bierzemy trochę więcej, bo część może nie istnieć w Mongo
-        )
+        # scoring idzie przez micro-batcher (jeden matmul na wiele żądań, w puli inferencji);
+        # pełna kolejka/pula albo przekroczony czas => popularne zamiast czekania
+        try:
+            rec_goodbooks_ids = await asyncio.wait_for(
+                recommendation_batcher.submit(
+                    user_goodbooks_ids,
+                    top_k=limit * 3,  # bierzemy trochę więcej, bo część może nie istnieć w Mongo
+                ),
+                timeout=settings.INFERENCE_TIMEOUT_MS / 1000,
+            )
+        except (InferenceQueueFull, InferenceSaturated, asyncio.TimeoutError):
+            return Uncached(await get_popular_goodbooks_fallback(db, limit))
 
     # 3) Mapowanie goodbooks_book_id -> dokumenty książek w Mongo
-    results = []
-    seen = set()
+    # (cache kart + jedno zapytanie $in dla chybień, kolejność z rankingu modelu)
+    by_gb_id = await book_cache.get_by_goodbooks_ids(db, rec_goodbooks_ids)
 
-    for gb_id in rec_goodbooks_ids:
-        if len(results) >= limit:
-            break
-        if gb_id in seen:
-            continue
-        seen.add(gb_id)
-
-        # Próba dopasowania int i string
-        book = await db.books.find_one({"goodbooks_book_id": gb_id})
-        if not book:
-            book = await db.books.find_one({"goodbooks_book_id": str(gb_id)})
-
-        if not book:
-            continue
+    return [
+        normalize_book(serialize_doc(book))
+        for book in in_rank_order(rec_goodbooks_ids, by_gb_id, limit)
+    ]
 
-        book = normalize_book(serialize_doc(book))
-        # opcjonalnie możesz dopisać np. book["matchScore"] = ... jeśli chcesz
-        results.append(book)
 
-    return results
+async def get_popular_goodbooks_fallback(db, limit: int) -> list:
+    """Najpopularniejsze książki GoodBooks (ratings_count) – gdy model nie jest gotowy."""
+    cursor = db.books.find(
+        {"goodbooks_book_id": {"$exists": True}}
+    ).sort("ratings_count", -1).limit(limit)
 
+    return [normalize_book(serialize_doc(raw)) async for raw in cursor]
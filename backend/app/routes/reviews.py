@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from bson import ObjectId
@@ -7,9 +7,18 @@ from datetime import datetime
 from ..database import get_database
 from ..routes.auth import get_current_active_user
 from ..models.user import UserInDB
+from ..services.book_resolver import books_by_ids, users_by_ids
+from ..services import user_profiles
+from ..services.book_cache import book_cache
+from ..services.recommendation_cache import recommendation_cache
+from ..utils.pagination import InvalidCursor, fetch_page
 
 router = APIRouter()
 
+# pola dociągane do list recenzji
+REVIEW_USER_PROJECTION = {"username": 1, "full_name": 1}
+REVIEW_BOOK_PROJECTION = {"title": 1, "author": 1}
+
 
 # ============================================
 # Modele Pydantic
@@ -46,34 +55,41 @@ class ReviewResponse(BaseModel):
 @router.get("/book/{book_id}")
 async def get_book_reviews(
     book_id: str,
+    response: Response,
     page: int = Query(1, ge=1),
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Kursor z nagłówka X-Next-Cursor (zamiast page)")
 ):
     """
     Pobierz recenzje dla danej książki.
+    Kursor następnej strony zwracany jest w nagłówku X-Next-Cursor.
     """
     db = get_database()
     
     if not ObjectId.is_valid(book_id):
         raise HTTPException(status_code=400, detail="Nieprawidłowy ID książki")
     
-    skip = (page - 1) * limit
+    try:
+        page_docs, next_cursor = await fetch_page(
+            db.reviews, {"book_id": book_id}, "created_at", -1, limit,
+            cursor=cursor, skip=(page - 1) * limit,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
-    cursor = db.reviews.find({"book_id": book_id}).sort("created_at", -1).skip(skip).limit(limit)
+    # nazwy autorów recenzji – jedno zapytanie $in na całą stronę
+    users = await users_by_ids(db, (r.get("user_id") for r in page_docs if r.get("user_id")), REVIEW_USER_PROJECTION)
     
     reviews = []
-    async for review in cursor:
+    for review in page_docs:
         review["_id"] = str(review["_id"])
         
-        # Pobierz nazwę użytkownika
-        if review.get("user_id"):
-            try:
-                user = await db.users.find_one({"_id": ObjectId(review["user_id"])})
-                if user:
-                    review["username"] = user.get("username", "")
-                    review["user_name"] = user.get("full_name", "")
-            except:
-                pass
+        user = users.get(str(review.get("user_id")))
+        if user:
+            review["username"] = user.get("username", "")
+            review["user_name"] = user.get("full_name", "")
         
         reviews.append(review)
     
@@ -93,22 +109,18 @@ async def get_my_reviews(
     db = get_database()
     
     cursor = db.reviews.find({"user_id": current_user.id}).sort("created_at", -1)
+    reviews = await cursor.to_list(None)
     
-    reviews = []
-    async for review in cursor:
+    # tytuły książek – jedno zapytanie $in zamiast find_one na recenzję
+    books = await books_by_ids(db, (r.get("book_id") for r in reviews if r.get("book_id")), REVIEW_BOOK_PROJECTION)
+    
+    for review in reviews:
         review["_id"] = str(review["_id"])
         
-        # Pobierz tytuł książki
-        if review.get("book_id"):
-            try:
-                book = await db.books.find_one({"_id": ObjectId(review["book_id"])})
-                if book:
-                    review["book_title"] = book.get("title", "")
-                    review["book_author"] = book.get("author", "")
-            except:
-                pass
-        
-        reviews.append(review)
+        book = books.get(str(review.get("book_id")))
+        if book:
+            review["book_title"] = book.get("title", "")
+            review["book_author"] = book.get("author", "")
     
     return reviews
 
@@ -160,7 +172,10 @@ async def create_review(
     result = await db.reviews.insert_one(review_doc)
     
     # Aktualizuj średnią ocenę książki
-    await update_book_rating(db, review_data.book_id)
+    await apply_rating_delta(db, review_data.book_id, review_data.rating, 1)
+    if user_profiles.is_liked(review_data.rating):
+        await user_profiles.record_review(db, current_user.id, book, liked=True)
+    recommendation_cache.invalidate_user(current_user.id)
     
     # Pobierz utworzoną recenzję
     created_review = await db.reviews.find_one({"_id": result.inserted_id})
@@ -205,13 +220,22 @@ async def update_review(
     if review_data.content is not None:
         update_data["content"] = review_data.content
     
-    await db.reviews.update_one(
+    # dokument sprzed zmiany – różnica ocen liczona od faktycznie nadpisanej wartości
+    previous = await db.reviews.find_one_and_update(
         {"_id": ObjectId(review_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"rating": 1}
     )
     
     # Aktualizuj średnią ocenę książki
-    await update_book_rating(db, review["book_id"])
+    if previous and review_data.rating is not None and review_data.rating != previous.get("rating"):
+        await apply_rating_delta(db, review["book_id"], review_data.rating - previous.get("rating", 0), 0)
+
+        # ocena przeszła przez próg "polubienia" – profil gustu w górę albo w dół
+        liked = user_profiles.is_liked(review_data.rating)
+        if liked != user_profiles.is_liked(previous.get("rating")):
+            await record_review_taste(db, review["user_id"], review["book_id"], liked)
+        recommendation_cache.invalidate_user(review["user_id"])
     
     # Pobierz zaktualizowaną recenzję
     updated_review = await db.reviews.find_one({"_id": ObjectId(review_id)})
@@ -249,51 +273,105 @@ async def delete_review(
     
     book_id = review["book_id"]
     
-    # Usuń recenzję
-    await db.reviews.delete_one({"_id": ObjectId(review_id)})
+    # Usuń recenzję (przy równoległym usuwaniu tylko jedno żądanie dostanie dokument)
+    deleted = await db.reviews.find_one_and_delete({"_id": ObjectId(review_id)}, projection={"rating": 1})
     
     # Aktualizuj średnią ocenę książki
-    await update_book_rating(db, book_id)
+    if deleted:
+        await apply_rating_delta(db, book_id, -deleted.get("rating", 0), -1)
+        if user_profiles.is_liked(deleted.get("rating")):
+            await record_review_taste(db, review["user_id"], book_id, liked=False)
+        recommendation_cache.invalidate_user(review["user_id"])
     
     return {"message": "Recenzja została usunięta"}
 
 
+async def record_review_taste(db, user_id: str, book_id: str, liked: bool):
+    """Zmiana "polubienia" w profilu gustu – dociąga tylko pola potrzebne profilowi."""
+    book = await db.books.find_one({"_id": ObjectId(book_id)}, user_profiles.PROFILE_BOOK_PROJECTION)
+    if book:
+        await user_profiles.record_review(db, user_id, book, liked)
+
+
 # ============================================
 # Helper: Aktualizuj średnią ocenę książki
 # ============================================
-async def update_book_rating(db, book_id: str):
+def _rating_fields_stage(now: datetime) -> dict:
+    """Etap pipeline'u: average_rating / ratings_count wyliczone z rating_sum i rating_count."""
+    return {"$set": {
+        "ratings_count": "$rating_count",
+        "average_rating": {"$cond": [
+            {"$gt": ["$rating_count", 0]},
+            {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 2]},
+            0
+        ]},
+        "updated_at": now
+    }}
+
+
+async def apply_rating_delta(db, book_id: str, sum_delta: int, count_delta: int):
     """
-    Przelicz i zaktualizuj średnią ocenę książki na podstawie recenzji.
+    Przyrostowa aktualizacja ocen książki: rating_sum/rating_count zmieniane
+    o deltę i średnia liczona z nich – jedną atomową aktualizacją dokumentu
+    (update z pipeline'em), bez agregacji po wszystkich recenzjach.
+
+    Książki bez rating_count (sprzed tej zmiany) są jednorazowo przeliczane
+    w całości; gdy równoległe żądanie zdążyło je przeliczyć pierwsze, delta
+    idzie zwykłą ścieżką. Rozjazdy naprawia scripts/reconcile_ratings.py.
+
+    average_rating/ratings_count są w kartach book_cache – karta jest unieważniana.
+    """
+    if not ObjectId.is_valid(book_id):
+        return
+
+    for _ in range(2):
+        result = await db.books.update_one(
+            {"_id": ObjectId(book_id), "rating_count": {"$exists": True}},
+            [
+                {"$set": {
+                    "rating_sum": {"$add": ["$rating_sum", sum_delta]},
+                    "rating_count": {"$max": [0, {"$add": ["$rating_count", count_delta]}]}
+                }},
+                _rating_fields_stage(datetime.utcnow())
+            ]
+        )
+        if result.matched_count or await recompute_book_rating(db, book_id, only_missing=True):
+            break
+
+    book_cache.invalidate(book_id=book_id)
+
+
+async def recompute_book_rating(db, book_id: str, only_missing: bool = False) -> bool:
+    """
+    Przelicz oceny książki od zera na podstawie wszystkich jej recenzji.
+
+    only_missing – zapis tylko, gdy książka nie ma jeszcze rating_count
+    (starszy wynik agregacji nie nadpisze liczników ustawionych w międzyczasie).
+    Zwraca, czy książka została zaktualizowana.
     """
     pipeline = [
         {"$match": {"book_id": book_id}},
         {"$group": {
             "_id": "$book_id",
-            "average_rating": {"$avg": "$rating"},
-            "ratings_count": {"$sum": 1}
+            "rating_sum": {"$sum": "$rating"},
+            "rating_count": {"$sum": 1}
         }}
     ]
     
     cursor = db.reviews.aggregate(pipeline)
     result = await cursor.to_list(length=1)
+    stats = result[0] if result else {"rating_sum": 0, "rating_count": 0}
     
-    if result:
-        stats = result[0]
-        await db.books.update_one(
-            {"_id": ObjectId(book_id)},
-            {"$set": {
-                "average_rating": round(stats["average_rating"], 2),
-                "ratings_count": stats["ratings_count"],
-                "updated_at": datetime.utcnow()
-            }}
-        )
-    else:
-        # Brak recenzji - resetuj oceny
-        await db.books.update_one(
-            {"_id": ObjectId(book_id)},
-            {"$set": {
-                "average_rating": 0,
-                "ratings_count": 0,
-                "updated_at": datetime.utcnow()
-            }}
-        )
\ No newline at end of file
+    book_filter = {"_id": ObjectId(book_id)}
+    if only_missing:
+        book_filter["rating_count"] = {"$exists": False}
+
+    result = await db.books.update_one(
+        book_filter,
+        [
+            {"$set": {"rating_sum": stats["rating_sum"], "rating_count": stats["rating_count"]}},
+            _rating_fields_stage(datetime.utcnow())
+        ]
+    )
+    book_cache.invalidate(book_id=book_id)
+    return result.matched_count > 0
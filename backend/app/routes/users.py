@@ -8,6 +8,9 @@ from pydantic import BaseModel
 from ..database import get_database
 from ..models.user import UserInDB, UserResponse, UserUpdate
 from ..routes.auth import get_current_active_user
+from ..services.book_cache import book_cache
+from ..services.user_cache import user_cache
+from ..services.recommendation_cache import recommendation_cache
 
 try:
     from recommendation_engine.service import get_recommendations_for_goodbooks_user
@@ -57,6 +60,8 @@ async def update_my_profile(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
+    user_cache.invalidate(current_user.id)
+
     doc = await db.users.find_one({"_id": ObjectId(current_user.id)})
     doc["_id"] = str(doc["_id"])
     return UserResponse(**doc)
@@ -103,9 +108,11 @@ async def get_my_recommendations(
                 top_k=n,
             )
 
+            by_gb_id = await book_cache.get_by_goodbooks_ids(db, [rec["book_id"] for rec in recs])
+
             recommended_books = []
             for rec in recs:
-                book = await db.books.find_one({"goodbooks_book_id": rec["book_id"]})
+                book = by_gb_id.get(int(rec["book_id"]))
                 if not book:
                     continue
 
@@ -296,6 +303,8 @@ async def set_my_preferences(
         {"_id": ObjectId(current_user.id)},
         {"$set": update_data}
     )
+    user_cache.invalidate(current_user.id)
+    recommendation_cache.invalidate_user(current_user.id)
     
     doc = await db.users.find_one({"_id": ObjectId(current_user.id)})
     doc["_id"] = str(doc["_id"])
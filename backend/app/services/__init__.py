@@ -0,0 +1,4 @@
+"""
+Serwisy aplikacji – logika działająca pomiędzy routerami a bazą/modelem
+(batching inferencji, cache itp.).
+"""
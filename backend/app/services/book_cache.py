@@ -0,0 +1,119 @@
+"""
+Cache "kart" książek (projekcja pól potrzebnych do list/rekomendacji)
+po goodbooks_book_id i po _id – wspólny dla routerów rekomendacji.
+
+Chybienia dociągane są jednym zapytaniem $in (book_resolver), a wpisy
+unieważniane przez routes/books.py (create/update/delete) i routes/loans.py
+(zmiana available_copies przy wypożyczeniu/zwrocie).
+"""
+from typing import Dict, Iterable, Optional
+
+from ..config import settings
+from ..utils.cache import TTLCache
+from .book_resolver import books_by_goodbooks_ids, books_by_ids
+
+# pola używane przez karty książek na froncie
+BOOK_CARD_FIELDS = (
+    "title", "author", "authors_full", "genre", "genres", "description",
+    "image_url", "cover_image", "coverImage", "average_rating", "averageRating",
+    "ratings_count", "total_reviews", "available_copies", "total_copies",
+    "publication_year", "language", "publisher", "pages", "location", "isbn",
+    "goodbooks_book_id",
+)
+BOOK_CARD_PROJECTION = {field: 1 for field in BOOK_CARD_FIELDS}
+
+# znacznik "brak w Mongo" – model poleca też książki spoza katalogu biblioteki
+_MISSING = {}
+
+
+def _gb_key(gb_id: int):
+    return ("gb", int(gb_id))
+
+
+def _id_key(book_id):
+    return ("id", str(book_id))
+
+
+class BookCache:
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _store(self, card: dict) -> None:
+        self._cache.set(_id_key(card["_id"]), card)
+        try:
+            self._cache.set(_gb_key(card["goodbooks_book_id"]), card)
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    async def get_by_goodbooks_ids(self, db, gb_ids: Iterable[int]) -> Dict[int, dict]:
+        """{goodbooks_book_id: karta} – kopie, które wywołujący może modyfikować."""
+        found: Dict[int, dict] = {}
+        missing = []
+        for gb_id in {int(i) for i in gb_ids}:
+            card = self._cache.get(_gb_key(gb_id))
+            if card is None:
+                missing.append(gb_id)
+            elif card is not _MISSING:
+                found[gb_id] = card
+
+        if missing:
+            fetched = await books_by_goodbooks_ids(db, missing, BOOK_CARD_PROJECTION)
+            for gb_id in missing:
+                card = fetched.get(gb_id)
+                if card is None:
+                    self._cache.set(_gb_key(gb_id), _MISSING)
+                else:
+                    self._store(card)
+                    found[gb_id] = card
+
+        return {gb_id: dict(card) for gb_id, card in found.items()}
+
+    async def get_by_ids(self, db, ids: Iterable) -> Dict[str, dict]:
+        """{str(_id): karta} – kopie, które wywołujący może modyfikować."""
+        found: Dict[str, dict] = {}
+        missing = []
+        for book_id in {str(i) for i in ids}:
+            card = self._cache.get(_id_key(book_id))
+            if card is None:
+                missing.append(book_id)
+            else:
+                found[book_id] = card
+
+        if missing:
+            fetched = await books_by_ids(db, missing, BOOK_CARD_PROJECTION)
+            for book_id, card in fetched.items():
+                self._store(card)
+                found[book_id] = card
+
+        return {book_id: dict(card) for book_id, card in found.items()}
+
+    def invalidate(self, book_id=None, goodbooks_book_id: Optional[int] = None) -> None:
+        """
+        Usuwa kartę po _id i/lub goodbooks_book_id (oba klucze tej samej książki).
+        Po utworzeniu książki usuwa też znacznik braku dla jej goodbooks_book_id.
+        """
+        if book_id is not None:
+            card = self._cache.pop(_id_key(book_id))
+            if card is not None and card.get("goodbooks_book_id") is not None:
+                self.invalidate(goodbooks_book_id=card["goodbooks_book_id"])
+
+        if goodbooks_book_id is not None:
+            try:
+                card = self._cache.pop(_gb_key(goodbooks_book_id))
+            except (TypeError, ValueError):
+                return
+            if card is not None and card is not _MISSING:
+                self._cache.pop(_id_key(card["_id"]))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# Singleton cache kart książek
+book_cache = BookCache(
+    maxsize=settings.BOOK_CACHE_MAX_SIZE,
+    ttl=settings.BOOK_CACHE_TTL_SECONDS,
+)
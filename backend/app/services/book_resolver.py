@@ -0,0 +1,68 @@
+"""
+Batchowe rozwiązywanie identyfikatorów na dokumenty książek (i użytkowników).
+
+Zamiast find_one w pętli – jedno zapytanie $in na całą listę,
+a kolejność (np. ranking modelu) odtwarzana w pamięci.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+
+def to_object_ids(ids: Iterable) -> List[ObjectId]:
+    """Poprawne ObjectId ze stringów / ObjectId (niepoprawne pomija)."""
+    out = []
+    for i in ids:
+        if isinstance(i, ObjectId):
+            out.append(i)
+        elif ObjectId.is_valid(str(i)):
+            out.append(ObjectId(str(i)))
+    return out
+
+
+async def books_by_ids(db, ids: Iterable, projection: Optional[dict] = None) -> Dict[str, dict]:
+    """{str(_id): dokument} dla podanych _id – jedno zapytanie."""
+    oids = to_object_ids(set(ids))
+    if not oids:
+        return {}
+    cursor = db.books.find({"_id": {"$in": oids}}, projection)
+    return {str(doc["_id"]): doc async for doc in cursor}
+
+
+async def users_by_ids(db, ids: Iterable, projection: Optional[dict] = None) -> Dict[str, dict]:
+    """{str(_id): dokument} użytkowników – jedno zapytanie."""
+    oids = to_object_ids(set(ids))
+    if not oids:
+        return {}
+    cursor = db.users.find({"_id": {"$in": oids}}, projection)
+    return {str(doc["_id"]): doc async for doc in cursor}
+
+
+async def books_by_goodbooks_ids(db, gb_ids: Iterable[int], projection: Optional[dict] = None) -> Dict[int, dict]:
+    """
+    {goodbooks_book_id: dokument} – jedno zapytanie $in po unikalnym indeksie
+    goodbooks_book_id (zawsze int – scripts/migrate_goodbooks_ids.py).
+    """
+    ids = list({int(i) for i in gb_ids})
+    if not ids:
+        return {}
+
+    cursor = db.books.find({"goodbooks_book_id": {"$in": ids}}, projection)
+    return {doc["goodbooks_book_id"]: doc async for doc in cursor}
+
+
+def in_rank_order(gb_ids: Iterable[int], by_gb_id: Dict[int, dict], limit: Optional[int] = None) -> List[dict]:
+    """Dokumenty w kolejności gb_ids (bez duplikatów i brakujących), najwyżej limit."""
+    results = []
+    seen = set()
+    for gb_id in gb_ids:
+        if limit is not None and len(results) >= limit:
+            break
+        if gb_id in seen:
+            continue
+        seen.add(gb_id)
+
+        doc = by_gb_id.get(gb_id)
+        if doc is not None:
+            results.append(doc)
+    return results
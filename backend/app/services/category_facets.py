@@ -0,0 +1,139 @@
+"""
+Fasety gatunków dla /v1/recommendations/categories liczone w tle.
+
+Odświeżacz co CATEGORY_FACETS_REFRESH_SECONDS przelicza top gatunków
+(jedna agregacja $group bez zbierania okładek) i po 6 okładek dla każdego
+z nich (małe zapytania z limit). Żądania czytają gotową listę z pamięci –
+skan kolekcji books nie leży na ścieżce żądania.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from ..config import settings
+
+TOP_CATEGORIES = 10
+SAMPLE_COVERS = 6
+# dopóki nie ma żadnej listy, nieudane przeliczenie jest ponawiane szybciej
+RETRY_MIN_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+
+# genres (lista) albo genre (lista lub string) – jak normalize_book
+_GENRES_STAGE = {"$project": {
+    "genres": {
+        "$cond": [
+            {"$isArray": "$genres"},
+            "$genres",
+            {"$cond": [{"$isArray": "$genre"}, "$genre", ["$genre"]]}
+        ]
+    }
+}}
+
+
+class CategoryFacets:
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.categories: Optional[List[dict]] = None
+        self.refreshed_at: Optional[datetime] = None
+        self.refresh_error: Optional[str] = None
+        self.build_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._first_refresh: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.categories is not None
+
+    def start(self, db) -> None:
+        """Pierwsze przeliczenie od razu, potem co refresh_seconds."""
+        if self._task is None or self._task.done():
+            self._first_refresh = asyncio.create_task(self.refresh(db))
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        for task in (self._task, self._first_refresh):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._first_refresh = None
+
+    async def _run(self, db) -> None:
+        await asyncio.shield(self._first_refresh)
+        retry = RETRY_MIN_SECONDS
+        while True:
+            if self.categories is None:
+                # pierwsze przeliczenie się nie udało – backoff zamiast pełnego okresu
+                await asyncio.sleep(min(retry, self.refresh_seconds))
+                retry = min(retry * 2, RETRY_MAX_SECONDS)
+            else:
+                await asyncio.sleep(self.refresh_seconds)
+            await self.refresh(db)
+
+    async def compute(self, db) -> List[dict]:
+        pipeline = [
+            _GENRES_STAGE,
+            {"$unwind": "$genres"},
+            {"$match": {"genres": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$genres", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": TOP_CATEGORIES},
+        ]
+        top = await db.books.aggregate(pipeline).to_list(TOP_CATEGORIES)
+
+        covers = await asyncio.gather(*(
+            db.books.find(
+                {"$or": [{"genres": cat["_id"]}, {"genre": cat["_id"]}], "coverImage": {"$nin": [None, ""]}},
+                {"coverImage": 1},
+            ).limit(SAMPLE_COVERS).to_list(SAMPLE_COVERS)
+            for cat in top
+        ))
+
+        return [
+            {
+                "name": cat["_id"],
+                "count": cat["count"],
+                "sampleCovers": [doc["coverImage"] for doc in docs],
+            }
+            for cat, docs in zip(top, covers)
+        ]
+
+    async def refresh(self, db) -> None:
+        start = time.perf_counter()
+        try:
+            self.categories = await self.compute(db)
+            self.refreshed_at = datetime.utcnow()
+            self.refresh_error = None
+            self.build_seconds = time.perf_counter() - start
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # zostaje poprzednia lista – kolejna próba przy następnym odświeżeniu
+            # (bez listy: ponowienie z backoffem w _run)
+            self.refresh_error = str(e)
+            print(f"⚠️  Odświeżanie kategorii nie powiodło się: {e}")
+
+    async def get(self, db) -> List[dict]:
+        """Lista kategorii z pamięci; przed pierwszym przeliczeniem czeka na nie."""
+        if self.categories is None:
+            if self._first_refresh is None:
+                self.start(db)
+            await asyncio.shield(self._first_refresh)
+        return [dict(cat, sampleCovers=list(cat["sampleCovers"])) for cat in self.categories or []]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "categories": len(self.categories) if self.categories is not None else 0,
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "refresh_s": self.refresh_seconds,
+            "build_s": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "error": self.refresh_error,
+        }
+
+
+# Singleton faset gatunków
+category_facets = CategoryFacets(refresh_seconds=settings.CATEGORY_FACETS_REFRESH_SECONDS)
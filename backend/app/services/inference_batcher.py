@@ -0,0 +1,186 @@
+"""
+Micro-batching zapytań o rekomendacje LightGCN.
+
+Równoległe żądania /v1/recommendations/user-lightgcn trafiają do kolejki.
+Worker zbiera je przez INFERENCE_BATCH_MAX_WAIT_MS albo do
+INFERENCE_BATCH_MAX_SIZE sztuk, liczy wszystkie jednym wywołaniem
+recommend_batch() w puli inferencji i rozwiązuje future każdego żądania.
+
+Kolejne batche są wysyłane bez czekania na poprzedni – współbieżność
+ogranicza InferenceExecutor, a gdy pula jest pełna, future dostają
+InferenceSaturated (router oddaje wtedy fallback).
+"""
+import asyncio
+import time
+from typing import Callable, List, Optional, Set, Tuple
+
+from ..config import settings
+from ..utils.metrics import LatencyWindow
+from .inference_executor import InferenceExecutor, inference_executor
+from recommendation_engine.goodbooks_lightgcn_service import goodbooks_lgcn_service
+
+
+class InferenceQueueFull(Exception):
+    """Kolejka batchera jest pełna – wywołujący powinien użyć fallbacku."""
+
+
+class InferenceBatcher:
+    def __init__(
+        self,
+        batch_fn: Callable[[List[List[int]], int], List[List[int]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue_depth: int,
+        executor: InferenceExecutor,
+    ) -> None:
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_depth = max_queue_depth
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # metryki
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self.queue_latency = LatencyWindow()
+        self.batch_latency = LatencyWindow()
+
+    # ----------------------------------------------------------
+    #  Cykl życia
+    # ----------------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+        for task in list(self._in_flight):
+            task.cancel()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        # żądania, które nie doczekały się batcha
+        while self._queue is not None and not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            future.cancel()
+
+        self._worker = None
+        self._queue = None
+
+    # ----------------------------------------------------------
+    #  API
+    # ----------------------------------------------------------
+    async def submit(self, seeds: List[int], top_k: int) -> List[int]:
+        """Dodaje żądanie do kolejki i czeka na wynik swojego batcha."""
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((seeds, top_k, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise InferenceQueueFull()
+
+        return await future
+
+    # ----------------------------------------------------------
+    #  Worker
+    # ----------------------------------------------------------
+    async def _collect(self) -> List[Tuple]:
+        """Pierwsze żądanie czeka bez limitu, kolejne do upływu max_wait od pierwszego."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+            except asyncio.CancelledError:
+                # stop() w trakcie zbierania – zebrane żądania nie trafią już do kolejki
+                for _, _, future, _ in batch:
+                    future.cancel()
+                raise
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[Tuple]) -> None:
+        started = time.perf_counter()
+        for _, _, _, enqueued in batch:
+            self.queue_latency.add(started - enqueued)
+
+        seed_lists = [seeds for seeds, _, _, _ in batch]
+        top_k = max(k for _, k, _, _ in batch)
+
+        try:
+            results = await self.executor.run(self.batch_fn, seed_lists, top_k)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            for _, _, future, _ in batch:
+                future.cancel()
+            raise
+        finally:
+            self.batch_latency.add(time.perf_counter() - started)
+            self.batches += 1
+            self.requests += len(batch)
+
+        for (_, k, future, _), result in zip(batch, results):
+            # klient mógł się rozłączyć – future anulowany
+            if not future.done():
+                future.set_result(result[:k])
+
+    def stats(self) -> dict:
+        mean_size = self.requests / self.batches if self.batches else 0.0
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": len(self._in_flight),
+            "mean_batch_size": round(mean_size, 2),
+            "batch_fill": round(mean_size / self.max_batch_size, 3),
+            "queue_latency": self.queue_latency.summary(),
+            "batch_latency": self.batch_latency.summary(),
+        }
+
+
+def _score_batch(seed_lists: List[List[int]], top_k: int) -> List[List[int]]:
+    return goodbooks_lgcn_service.recommend_batch(seed_lists=seed_lists, top_k=top_k)
+
+
+# Singleton batchera dla LightGCN (worker startuje przy pierwszym żądaniu)
+recommendation_batcher = InferenceBatcher(
+    _score_batch,
+    max_batch_size=settings.INFERENCE_BATCH_MAX_SIZE,
+    max_wait_ms=settings.INFERENCE_BATCH_MAX_WAIT_MS,
+    max_queue_depth=settings.INFERENCE_QUEUE_MAX_DEPTH,
+    executor=inference_executor,
+)
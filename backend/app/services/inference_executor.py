@@ -0,0 +1,119 @@
+"""
+Dedykowana pula wątków dla inferencji modelu.
+
+Scoring (matmul + top-k) nie może blokować event loopa, a przy przeciążeniu
+lepiej od razu oddać fallback niż kolejkować w nieskończoność:
+- INFERENCE_WORKERS      – liczba wątków puli
+- INFERENCE_MAX_PENDING  – limit wywołań w toku (w puli + czekających na wątek);
+                           powyżej rzucamy InferenceSaturated
+- INFERENCE_TORCH_THREADS – wątki jednego wywołania: intra-op torch (ścieżka
+                           bez artefaktu) i BLAS numpy (ścieżka z artefaktu,
+                           przez threadpoolctl). Oba limity są globalne dla
+                           procesu – obejmują też np. budowanie indeksu IVF.
+
+Bez threadpoolctl limit BLAS trzeba ustawić zmiennymi środowiskowymi
+przed startem procesu (OMP_NUM_THREADS / OPENBLAS_NUM_THREADS / MKL_NUM_THREADS),
+inaczej workers x wątki BLAS przewyższa liczbę rdzeni.
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from ..config import settings
+from ..utils.metrics import LatencyWindow
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # threadpoolctl przychodzi ze scikit-learn – bez niego tylko zmienne środowiskowe
+    threadpool_limits = None
+
+
+class InferenceSaturated(Exception):
+    """Pula inferencji jest pełna – wywołujący powinien użyć fallbacku."""
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers: int, max_pending: int, torch_threads: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.torch_threads = torch_threads
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="inference",
+            initializer=self._init_worker,
+        )
+        # licznik modyfikowany tylko z event loopa – bez blokad
+        self._pending = 0
+        # limit BLAS (globalny) ustawiany raz, przy starcie pierwszego wątku puli
+        self._blas_limits = None
+        self._blas_lock = threading.Lock()
+
+        # metryki
+        self.calls = 0
+        self.saturated = 0
+        self.run_latency = LatencyWindow()    # czas wykonania w wątku
+        self.total_latency = LatencyWindow()  # czas od zlecenia do wyniku
+
+    def _init_worker(self) -> None:
+        if self.torch_threads <= 0:
+            return
+        # torch ładujemy tylko jeśli serwis już go zaimportował (ścieżka bez artefaktu)
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(self.torch_threads)
+
+        # numpy (ścieżka z artefaktu) – pule BLAS/OpenMP już załadowanych bibliotek
+        if threadpool_limits is not None:
+            with self._blas_lock:
+                if self._blas_limits is None:
+                    self._blas_limits = threadpool_limits(limits=self.torch_threads, user_api="blas")
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Wykonuje fn(*args) w puli; rzuca InferenceSaturated przy przeciążeniu."""
+        if self._pending >= self.max_pending:
+            self.saturated += 1
+            raise InferenceSaturated()
+
+        self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.run_latency.add(time.perf_counter() - start)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+            self.calls += 1
+            self.total_latency.add(time.perf_counter() - submitted)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "calls": self.calls,
+            "saturated": self.saturated,
+            "blas_threads_limited": self._blas_limits is not None,
+            "run_latency": self.run_latency.summary(),
+            "total_latency": self.total_latency.summary(),
+        }
+
+
+# Singleton puli inferencji
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_pending=settings.INFERENCE_MAX_PENDING,
+    torch_threads=settings.INFERENCE_TORCH_THREADS,
+)
@@ -0,0 +1,204 @@
+"""
+Cache policzonych sekcji rekomendacji per użytkownik (stale-while-revalidate).
+
+Klucz: (user_id, sekcja, parametry). Wpis jest świeży przez
+RECOMMENDATION_CACHE_TTL_SECONDS; potem – do RECOMMENDATION_CACHE_STALE_SECONDS –
+zwracany jest od razu, a przeliczenie idzie w tle. Chybienie liczy sekcję
+w żądaniu (równoległe chybienia tego samego klucza czekają na jedno liczenie).
+
+Zdarzenia zmieniające rekomendacje (wypożyczenie, zwrot, recenzja, zmiana
+preferencji) wołają invalidate_user(): wpisy użytkownika stają się nieświeże
+i trafiają do kolejki workerów, które przeliczają je zanim użytkownik wróci
+na stronę rekomendacji.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from ..config import settings
+from ..utils.cache import TTLCache
+
+Compute = Callable[[], Awaitable[Any]]
+
+
+class Uncached:
+    """Wynik zwracany bez zapisu w cache (np. fallback, gdy model nie jest gotowy)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+
+def _unwrap(value: Any) -> Any:
+    return value.value if isinstance(value, Uncached) else value
+
+
+class RecommendationCache:
+    def __init__(self, enabled: bool, maxsize: int, ttl: float, stale_ttl: float,
+                 refresh_workers: int, max_pending: int) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.refresh_workers = refresh_workers
+        self.max_pending = max_pending
+
+        # wpis: (wynik, monotonic policzenia, generacja użytkownika, funkcja liczenia)
+        self._cache = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+        # user_id -> klucze jego wpisów (do odświeżenia po zdarzeniu)
+        self._user_keys = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+        # user_id -> licznik zdarzeń; po stale_ttl od ostatniego zdarzenia wpisy
+        # sprzed niego i tak wygasły (albo są starsze niż ttl), więc można go zapomnieć
+        self._generation = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+
+        self._computing: Dict[Hashable, asyncio.Task] = {}
+        self._pending: Set[Hashable] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+
+        # metryki
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.dropped = 0
+
+    # ----------------------------------------------------------
+    #  Cykl życia
+    # ----------------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._workers = [asyncio.create_task(self._run()) for _ in range(self.refresh_workers)]
+
+    async def stop(self) -> None:
+        tasks = self._workers + list(self._computing.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._workers = []
+        self._computing.clear()
+        self._pending.clear()
+        self._queue = None
+
+    # ----------------------------------------------------------
+    #  Odczyt
+    # ----------------------------------------------------------
+    async def get(self, user_id: str, section: str, params: Tuple, compute: Compute) -> Any:
+        """Sekcja z cache; compute() może zwrócić Uncached, żeby wyniku nie zapisywać."""
+        if not self.enabled:
+            return _unwrap(await compute())
+
+        key = (str(user_id), section, params)
+        entry = self._cache.get(key)
+        if entry is not None:
+            value, computed_at, generation, _ = entry
+            if generation == self._generation.get(key[0], 0) and time.monotonic() - computed_at < self.ttl:
+                self.fresh_hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule(key, compute)
+            return value
+
+        self.misses += 1
+        return await self._compute_once(key, compute)
+
+    async def _compute_once(self, key: Hashable, compute: Compute) -> Any:
+        task = self._computing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, compute))
+            self._computing[key] = task
+            task.add_done_callback(lambda _: self._computing.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, key: Hashable, compute: Compute) -> Any:
+        user_id = key[0]
+        # generacja sprzed liczenia – zdarzenie w trakcie zostawi wpis nieświeżym
+        generation = self._generation.get(user_id, 0)
+        value = await compute()
+        self.refreshes += 1
+        if isinstance(value, Uncached):
+            return value.value
+
+        self._cache.set(key, (value, time.monotonic(), generation, compute))
+        keys = self._user_keys.get(user_id) or set()
+        keys.add(key)
+        self._user_keys.set(user_id, keys)
+        return value
+
+    # ----------------------------------------------------------
+    #  Odświeżanie w tle
+    # ----------------------------------------------------------
+    def _schedule(self, key: Hashable, compute: Compute) -> None:
+        if key in self._pending or key in self._computing:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((key, compute))
+        except asyncio.QueueFull:
+            # wpis zostaje nieświeży – kolejny odczyt spróbuje ponownie
+            self.dropped += 1
+            return
+        self._pending.add(key)
+
+    async def _run(self) -> None:
+        while True:
+            key, compute = await self._queue.get()
+            self._pending.discard(key)
+            try:
+                await self._compute_once(key, compute)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # zostaje poprzedni wynik – przeliczenie przy kolejnym odczycie
+                self.refresh_errors += 1
+                print(f"⚠️  Odświeżanie rekomendacji {key[:2]} nie powiodło się: {e}")
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Wpisy użytkownika stają się nieświeże i są przeliczane w tle."""
+        if not self.enabled:
+            return
+        user_id = str(user_id)
+        self._generation.set(user_id, self._generation.get(user_id, 0) + 1)
+
+        keys = self._user_keys.get(user_id) or set()
+        for key in list(keys):
+            entry = self._cache.get(key)
+            if entry is None:
+                keys.discard(key)
+            else:
+                self._schedule(key, entry[3])
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._user_keys.clear()
+
+    def stats(self) -> dict:
+        lookups = self.fresh_hits + self.stale_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "ttl_s": self.ttl,
+            "stale_s": self._cache.ttl,
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.fresh_hits + self.stale_hits) / lookups, 3) if lookups else None,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+        }
+
+
+# Singleton cache rekomendacji
+recommendation_cache = RecommendationCache(
+    enabled=settings.RECOMMENDATION_CACHE_ENABLED,
+    maxsize=settings.RECOMMENDATION_CACHE_MAX_SIZE,
+    ttl=settings.RECOMMENDATION_CACHE_TTL_SECONDS,
+    stale_ttl=settings.RECOMMENDATION_CACHE_STALE_SECONDS,
+    refresh_workers=settings.RECOMMENDATION_CACHE_REFRESH_WORKERS,
+    max_pending=settings.RECOMMENDATION_CACHE_MAX_PENDING,
+)
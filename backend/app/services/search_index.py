@@ -0,0 +1,477 @@
+"""
+Wyszukiwarka katalogu: odwrócony indeks w pamięci procesu po title /
+author / authors_full.
+
+- dopasowanie bez wielkości liter i diakrytyków (utils.text.normalize),
+- prefiksy słów ("sapk" -> "sapkowski") – wyszukiwanie w trakcie pisania,
+- wszystkie słowa zapytania muszą pasować (AND),
+- ranking: tytuł > autor, całe słowo > prefiks, plus popularność (ratings_count).
+
+Obok niego PrefixIndex dla /books/suggest: posortowana tablica
+znormalizowanych tytułów (także od 2., 3. ... słowa) i autorów – podpowiedzi
+to bisect + top-k po popularności, bez Mongo.
+
+Oba indeksy budowane są w tle przy starcie z jednego skanu db.books. Zmiany z routes/books.py trafiają do małej "delty"
+przeszukiwanej liniowo; gdy urośnie, indeks budowany jest od nowa.
+Każdy worker trzyma własną kopię.
+"""
+import asyncio
+import bisect
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..utils.text import tokenize
+
+TITLE_WEIGHT = 2.0
+AUTHOR_WEIGHT = 1.0
+# dopasowanie samego prefiksu słowa względem całego słowa
+PREFIX_FACTOR = 0.6
+POPULARITY_WEIGHT = 0.25
+# najkrótszy prefiks rozwijany na słowa i limit rozwinięć (najczęstsze słowa)
+MIN_PREFIX_LEN = 2
+MAX_PREFIX_TERMS = 64
+
+# podpowiedzi: klucze tytułu od pierwszych N słów, premia za początek tytułu,
+# zapamiętane top-k dla prefiksów pasujących do wielu kluczy (krótkich)
+SUGGEST_TITLE_WORDS = 4
+SUGGEST_TITLE_START_BONUS = 0.5
+SUGGEST_MEMO_MIN_RANGE = 2048
+SUGGEST_MEMO_SIZE = 64
+
+TITLE, AUTHOR = 0, 1
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+SEARCH_PROJECTION = {"title": 1, "author": 1, "authors_full": 1, "ratings_count": 1}
+
+
+def _doc_fields(doc: dict) -> Tuple[str, str, str, float]:
+    """(title, author, authors_full, ratings_count) dokumentu książki."""
+    return (
+        str(doc.get("title") or ""),
+        str(doc.get("author") or ""),
+        str(doc.get("authors_full") or ""),
+        float(doc.get("ratings_count") or 0),
+    )
+
+
+def suggest_key(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def title_keys(title: str) -> List[Tuple[str, float]]:
+    """Klucze podpowiedzi tytułu: (klucz, premia) – cały tytuł i od kolejnych słów."""
+    words = tokenize(title)
+    return [(" ".join(words[start:]), SUGGEST_TITLE_START_BONUS if start == 0 else 0.0)
+            for start in range(min(len(words), SUGGEST_TITLE_WORDS))]
+
+
+def author_keys(author: str) -> List[str]:
+    """Klucze podpowiedzi autora: całe nazwisko i imię oraz samo nazwisko."""
+    words = tokenize(author)
+    if not words:
+        return []
+    return [" ".join(words)] + ([words[-1]] if len(words) > 1 else [])
+
+
+def _max_per_doc(doc_ids: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unikalne doc_ids (rosnąco) i największa waga każdego z nich."""
+    if len(doc_ids) == 0:
+        return doc_ids, weights
+    order = np.argsort(doc_ids, kind="stable")
+    doc_ids, weights = doc_ids[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, doc_ids[1:] != doc_ids[:-1]])
+    return doc_ids[starts], np.maximum.reduceat(weights, starts)
+
+
+class InvertedIndex:
+    """Niezmienny indeks zbudowany z listy (id, title, author, authors_full, ratings_count)."""
+
+    def __init__(self, rows: Iterable[Tuple[str, str, str, str, float]]) -> None:
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.authors: List[str] = []
+        ratings = []
+        title_postings = defaultdict(list)
+        author_postings = defaultdict(list)
+
+        for pos, (book_id, title, author, authors_full, ratings_count) in enumerate(rows):
+            self.ids.append(book_id)
+            self.titles.append(title)
+            self.authors.append(author)
+            ratings.append(ratings_count)
+            for term in set(tokenize(title)):
+                title_postings[term].append(pos)
+            for term in set(tokenize(f"{author} {authors_full}")):
+                author_postings[term].append(pos)
+
+        self.positions: Dict[str, int] = {book_id: pos for pos, book_id in enumerate(self.ids)}
+        self.deleted = np.zeros(len(self.ids), dtype=bool)
+
+        # popularność: log1p(ratings_count) przeskalowane do [0, 1]
+        log_ratings = np.log1p(np.maximum(np.asarray(ratings, dtype=np.float64), 0))
+        self.max_log_ratings = float(log_ratings.max()) if len(log_ratings) else 0.0
+        self.popularity = (log_ratings / self.max_log_ratings if self.max_log_ratings > 0
+                           else log_ratings).astype(np.float32)
+
+        self.vocab: List[str] = sorted(set(title_postings) | set(author_postings))
+        self.title_postings = {t: np.asarray(p, dtype=np.int32) for t, p in title_postings.items()}
+        self.author_postings = {t: np.asarray(p, dtype=np.int32) for t, p in author_postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def popularity_of(self, ratings_count: float) -> float:
+        """Popularność spoza indeksu (delta) w tej samej skali co self.popularity."""
+        if self.max_log_ratings <= 0:
+            return 0.0
+        return min(float(np.log1p(max(ratings_count, 0.0))) / self.max_log_ratings, 1.0)
+
+    def _postings(self, term: str):
+        return self.title_postings.get(term, _EMPTY), self.author_postings.get(term, _EMPTY)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Słowa słownika pasujące do tokenu: (słowo, mnożnik dokładności)."""
+        terms = []
+        start = bisect.bisect_left(self.vocab, token)
+        if start < len(self.vocab) and self.vocab[start] == token:
+            terms.append((token, 1.0))
+            start += 1
+
+        if len(token) >= MIN_PREFIX_LEN:
+            end = bisect.bisect_left(self.vocab, token + "\uffff", lo=start)
+            prefixed = self.vocab[start:end]
+            if len(prefixed) > MAX_PREFIX_TERMS:
+                df = lambda t: sum(len(p) for p in self._postings(t))
+                prefixed = sorted(prefixed, key=df, reverse=True)[:MAX_PREFIX_TERMS]
+            terms.extend((t, PREFIX_FACTOR) for t in prefixed)
+        return terms
+
+    def _match_token(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        ids, weights = [], []
+        for term, factor in self._expand(token):
+            title_postings, author_postings = self._postings(term)
+            for postings, field_weight in ((title_postings, TITLE_WEIGHT), (author_postings, AUTHOR_WEIGHT)):
+                if len(postings):
+                    ids.append(postings)
+                    weights.append(np.full(len(postings), field_weight * factor, dtype=np.float32))
+        if not ids:
+            return _EMPTY, np.zeros(0, dtype=np.float32)
+        return _max_per_doc(np.concatenate(ids), np.concatenate(weights))
+
+    def search(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(pozycje, wyniki) dokumentów pasujących do wszystkich tokenów – bez sortowania."""
+        doc_ids, scores = None, None
+        for token in tokens:
+            ids, weights = self._match_token(token)
+            if doc_ids is None:
+                doc_ids, scores = ids, weights
+            else:
+                doc_ids, left, right = np.intersect1d(doc_ids, ids, assume_unique=True, return_indices=True)
+                scores = scores[left] + weights[right]
+            if len(doc_ids) == 0:
+                break
+
+        keep = ~self.deleted[doc_ids]
+        doc_ids, scores = doc_ids[keep], scores[keep]
+        return doc_ids, scores + POPULARITY_WEIGHT * self.popularity[doc_ids]
+
+
+class PrefixIndex:
+    """
+    Podpowiedzi (type-ahead) dla książek z InvertedIndex: posortowane klucze
+    tytułów i autorów + wynik (popularność, premia za początek tytułu).
+    """
+
+    def __init__(self, index: InvertedIndex) -> None:
+        self.index = index
+        self.author_names: List[str] = []
+        author_ids: Dict[str, int] = {}
+        author_scores: List[float] = []
+        # pozycja książki -> autor (-1 = brak); liczba nieusuniętych książek autora
+        self.book_authors = np.full(len(index), -1, dtype=np.int32)
+        entries = []  # (klucz, rodzaj, ref, premia)
+
+        for pos, (title, author) in enumerate(zip(index.titles, index.authors)):
+            for key, bonus in title_keys(title):
+                entries.append((key, TITLE, pos, bonus))
+
+            name_key = suggest_key(author)
+            if not name_key:
+                continue
+            author_id = author_ids.get(name_key)
+            if author_id is None:
+                author_id = author_ids[name_key] = len(self.author_names)
+                self.author_names.append(author)
+                author_scores.append(0.0)
+                entries.extend((key, AUTHOR, author_id, 0.0) for key in author_keys(author))
+            author_scores[author_id] = max(author_scores[author_id], float(index.popularity[pos]))
+            self.book_authors[pos] = author_id
+
+        self.author_books = np.bincount(self.book_authors[self.book_authors >= 0],
+                                        minlength=len(self.author_names)).astype(np.int32)
+
+        entries.sort(key=lambda e: e[0])
+        self.keys: List[str] = [e[0] for e in entries]
+        self.kinds = np.fromiter((e[1] for e in entries), dtype=np.int8, count=len(entries))
+        self.refs = np.fromiter((e[2] for e in entries), dtype=np.int32, count=len(entries))
+        bonus = np.fromiter((e[3] for e in entries), dtype=np.float32, count=len(entries))
+
+        is_title = self.kinds == TITLE
+        self.scores = bonus
+        self.scores[is_title] += index.popularity[self.refs[is_title]]
+        self.scores[~is_title] += np.asarray(author_scores, dtype=np.float32)[self.refs[~is_title]]
+        self._memo: Dict[str, np.ndarray] = {}
+
+    def remove_book(self, pos: int) -> None:
+        """Książka z indeksu usunięta/zmieniona – autor bez książek znika z podpowiedzi."""
+        author_id = self.book_authors[pos]
+        if author_id >= 0:
+            self.author_books[author_id] -= 1
+            if self.author_books[author_id] == 0:
+                self._memo.clear()
+
+    def _top_entries(self, lo: int, hi: int, want: int) -> np.ndarray:
+        """Pozycje kluczy z [lo, hi), malejąco po wyniku (najwyżej want)."""
+        scores = self.scores[lo:hi]
+        if hi - lo > want:
+            top = np.argpartition(-scores, want)[:want]
+        else:
+            top = np.arange(hi - lo)
+        return top[np.argsort(-scores[top], kind="stable")] + lo
+
+    def suggest(self, key: str, limit: int) -> List[Tuple[float, dict]]:
+        """[(wynik, podpowiedź)] – bez duplikatów tekstu i bez usuniętych książek."""
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + "\uffff", lo=lo)
+        if lo == hi:
+            return []
+
+        want = limit * 4
+        if hi - lo >= SUGGEST_MEMO_MIN_RANGE and want <= SUGGEST_MEMO_SIZE:
+            entries = self._memo.get(key)
+            if entries is None:
+                entries = self._memo[key] = self._top_entries(lo, hi, SUGGEST_MEMO_SIZE)
+        else:
+            entries = self._top_entries(lo, hi, want)
+
+        out, seen = [], set()
+        for entry in entries.tolist():
+            ref = int(self.refs[entry])
+            if self.kinds[entry] == TITLE:
+                if self.index.deleted[ref]:
+                    continue
+                item = {"type": "title", "text": self.index.titles[ref],
+                        "book_id": self.index.ids[ref], "author": self.index.authors[ref]}
+            else:
+                if self.author_books[ref] <= 0:
+                    continue
+                item = {"type": "author", "text": self.author_names[ref]}
+
+            dedupe = (item["type"], item["text"].casefold())
+            if dedupe in seen:
+                continue
+            seen.add(dedupe)
+            out.append((float(self.scores[entry]), item))
+            if len(out) >= limit:
+                break
+        return out
+
+
+class _DeltaBook(NamedTuple):
+    """Książka dodana/zmieniona po zbudowaniu indeksów."""
+    title: str
+    author: str
+    ratings_count: float
+    title_terms: set
+    author_terms: set
+    title_keys: List[Tuple[str, float]]
+    author_keys: List[str]
+
+
+def _score_delta_doc(tokens: List[str], title_terms: set, author_terms: set) -> Optional[float]:
+    """Wynik dokumentu z delty liczony tak jak w InvertedIndex (None = brak dopasowania)."""
+    total = 0.0
+    for token in tokens:
+        best = 0.0
+        for terms, field_weight in ((title_terms, TITLE_WEIGHT), (author_terms, AUTHOR_WEIGHT)):
+            if token in terms:
+                best = max(best, field_weight)
+            elif len(token) >= MIN_PREFIX_LEN and any(t.startswith(token) for t in terms):
+                best = max(best, field_weight * PREFIX_FACTOR)
+        if best == 0.0:
+            return None
+        total += best
+    return total
+
+
+class CatalogSearch:
+    """Indeks katalogu dla get_books – ładowany w tle, aktualizowany przez routes/books.py."""
+
+    def __init__(self, max_delta: int) -> None:
+        self.max_delta = max_delta
+        self.index: Optional[InvertedIndex] = None
+        self.prefix: Optional[PrefixIndex] = None
+        self.is_loading = False
+        self.load_error: Optional[str] = None
+        self.build_seconds: Optional[float] = None
+
+        self._db = None
+        self._seq = 0
+        # id -> _DeltaBook; None = usunięta
+        self._delta: Dict[str, Optional[_DeltaBook]] = {}
+        self._delta_seq: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.index is not None
+
+    def start_background_load(self, db) -> None:
+        """Buduje indeks w tle (tylko jedno budowanie naraz)."""
+        self._db = db
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.load(db))
+
+    async def load(self, db) -> None:
+        self.is_loading = True
+        start = time.perf_counter()
+        seq_at_start = self._seq
+        try:
+            rows = []
+            async for doc in db.books.find({}, SEARCH_PROJECTION):
+                rows.append((str(doc["_id"]), *_doc_fields(doc)))
+            index, prefix = await asyncio.to_thread(self._build, rows)
+
+            # zmiany sprzed rozpoczęcia budowania są już w nowym indeksie
+            for book_id in [i for i, seq in self._delta_seq.items() if seq <= seq_at_start]:
+                self._delta.pop(book_id, None)
+                self._delta_seq.pop(book_id, None)
+            for book_id in self._delta:
+                self._remove_indexed(index, prefix, book_id)
+
+            self.index, self.prefix = index, prefix
+            self.load_error = None
+            self.build_seconds = time.perf_counter() - start
+            print(f"✅ Indeks wyszukiwania gotowy: {len(index)} książek, {len(index.vocab)} słów, "
+                  f"{len(prefix.keys)} kluczy podpowiedzi ({self.build_seconds:.1f} s)")
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Nie udało się zbudować indeksu wyszukiwania: {self.load_error}")
+        finally:
+            self.is_loading = False
+
+    @staticmethod
+    def _build(rows) -> Tuple[InvertedIndex, PrefixIndex]:
+        index = InvertedIndex(rows)
+        return index, PrefixIndex(index)
+
+    @staticmethod
+    def _remove_indexed(index: InvertedIndex, prefix: PrefixIndex, book_id: str) -> None:
+        """Ukrywa wersję książki z indeksów (tytuł w wynikach, autor w podpowiedziach)."""
+        pos = index.positions.get(book_id)
+        if pos is not None and not index.deleted[pos]:
+            index.deleted[pos] = True
+            prefix.remove_book(pos)
+
+    def _record(self, book_id: str, entry: Optional[_DeltaBook]) -> None:
+        self._seq += 1
+        self._delta[book_id] = entry
+        self._delta_seq[book_id] = self._seq
+        if self.index is not None:
+            self._remove_indexed(self.index, self.prefix, book_id)
+
+        if len(self._delta) > self.max_delta and self._db is not None:
+            self.start_background_load(self._db)
+
+    def upsert(self, book: dict) -> None:
+        """Nowa lub zmieniona książka (dokument z title/author/authors_full/ratings_count)."""
+        title, author, authors_full, ratings_count = _doc_fields(book)
+        self._record(str(book["_id"]), _DeltaBook(
+            title=title,
+            author=author,
+            ratings_count=ratings_count,
+            title_terms=set(tokenize(title)),
+            author_terms=set(tokenize(f"{author} {authors_full}")),
+            title_keys=title_keys(title),
+            author_keys=author_keys(author),
+        ))
+
+    def remove(self, book_id) -> None:
+        self._record(str(book_id), None)
+
+    def search(self, query: str, limit: Optional[int] = None) -> Optional[List[Tuple[str, float]]]:
+        """
+        Dopasowane [(book_id, wynik)], malejąco (wszystkie albo najlepsze limit);
+        None gdy indeks nie jest jeszcze gotowy (wywołujący używa wtedy $regex).
+        """
+        if self.index is None:
+            return None
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        positions, scores = self.index.search(tokens)
+        hits = [(self.index.ids[p], float(s)) for p, s in zip(positions.tolist(), scores.tolist())]
+
+        for book_id, entry in self._delta.items():
+            if entry is None:
+                continue
+            score = _score_delta_doc(tokens, entry.title_terms, entry.author_terms)
+            if score is not None:
+                hits.append((book_id, score + POPULARITY_WEIGHT * self.index.popularity_of(entry.ratings_count)))
+
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits[:limit]
+
+    def suggest(self, query: str, limit: int) -> Optional[List[dict]]:
+        """
+        Podpowiedzi tytułów i autorów dla wpisywanego prefiksu, malejąco
+        po popularności; None gdy indeks nie jest jeszcze gotowy.
+        """
+        if self.prefix is None:
+            return None
+        key = suggest_key(query)
+        if not key:
+            return []
+
+        scored = self.prefix.suggest(key, limit)
+        for book_id, entry in self._delta.items():
+            if entry is None:
+                continue
+            popularity = self.index.popularity_of(entry.ratings_count)
+            bonuses = [bonus for k, bonus in entry.title_keys if k.startswith(key)]
+            if bonuses:
+                scored.append((popularity + max(bonuses), {"type": "title", "text": entry.title,
+                                                          "book_id": book_id, "author": entry.author}))
+            if any(k.startswith(key) for k in entry.author_keys):
+                scored.append((popularity, {"type": "author", "text": entry.author}))
+
+        scored.sort(key=lambda s: -s[0])
+        out, seen = [], set()
+        for _, item in scored:
+            dedupe = (item["type"], item["text"].casefold())
+            if dedupe not in seen:
+                seen.add(dedupe)
+                out.append(item)
+        return out[:limit]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "loading": self.is_loading,
+            "error": self.load_error,
+            "books": len(self.index) if self.index is not None else 0,
+            "terms": len(self.index.vocab) if self.index is not None else 0,
+            "suggest_keys": len(self.prefix.keys) if self.prefix is not None else 0,
+            "delta": len(self._delta),
+            "build_s": round(self.build_seconds, 2) if self.build_seconds is not None else None,
+        }
+
+
+# Singleton wyszukiwarki katalogu
+catalog_search = CatalogSearch(max_delta=settings.SEARCH_INDEX_MAX_DELTA)
@@ -0,0 +1,46 @@
+"""
+Podobne książki z prekomputowanej tablicy sąsiadów LightGCN.
+
+Wspólne dla /v1/books/{id}/similar i /v1/recommendations/similar/{id}:
+sąsiedzi są czytani z artefaktu (item_neighbours.npy), a karty książek
+z book_cache (chybienia – jednym zapytaniem $in po goodbooks_book_id).
+"""
+from typing import List, Optional
+
+from recommendation_engine.goodbooks_lightgcn_service import goodbooks_lgcn_service
+from recommendation_engine.item_neighbours import NEIGHBOURS_TOP_N
+
+from .book_cache import book_cache
+
+
+async def find_embedding_neighbours(db, book: dict, limit: int) -> Optional[List[dict]]:
+    """
+    Karty podobnych książek (od najbardziej podobnej) z polem
+    "similarity". None, gdy książka nie ma embeddingu (model niezaładowany,
+    brak goodbooks_book_id, książka spoza modelu) – wtedy route używa heurystyki.
+    """
+    if not goodbooks_lgcn_service.is_loaded:
+        return None
+
+    gb_id = book.get("goodbooks_book_id")
+    if gb_id is None:
+        return None
+
+    # cała tablica (top-50) – część sąsiadów może nie istnieć w Mongo
+    neighbours = goodbooks_lgcn_service.neighbours_for_goodbooks_id(gb_id, top_k=NEIGHBOURS_TOP_N)
+    if not neighbours:
+        return None
+
+    by_gb_id = await book_cache.get_by_goodbooks_ids(db, [b for b, _ in neighbours])
+
+    results = []
+    for neighbour_id, score in neighbours:
+        doc = by_gb_id.get(neighbour_id)
+        if doc is None or doc["_id"] == book["_id"]:
+            continue
+        doc["similarity"] = round(score, 4)
+        results.append(doc)
+        if len(results) >= limit:
+            break
+
+    return results or None
@@ -0,0 +1,63 @@
+"""
+Cache zalogowanych użytkowników dla get_current_user.
+
+Klucz: (user_id, iat tokenu, generacja użytkownika). invalidate(user_id)
+podbija generację, więc stare wpisy przestają być trafiane i wypadają
+z LRU/TTL. Zmiany profilu/preferencji (routes/users.py) unieważniają wpis.
+
+Dane (w tym role/is_active) zawsze pochodzą z bazy – jeden find_one na
+pierwsze żądanie danym tokenem w danym workerze. Tryby różnią się czasem
+życia wpisu:
+- domyślny – AUTH_USER_CACHE_TTL_SECONDS
+- AUTH_TRUST_TOKEN_CLAIMS – do wygaśnięcia tokenu: kolejne żądania tym
+  tokenem nie czytają bazy. invalidate() działa od razu, ale zmiany roli
+  czy is_active zapisane poza tym procesem (inny worker, ręcznie w bazie)
+  są widoczne dopiero po wygaśnięciu tokenu (ACCESS_TOKEN_EXPIRE_MINUTES).
+"""
+import time
+from typing import Optional
+
+from ..config import settings
+from ..models.user import UserInDB
+from ..utils.cache import TTLCache
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float, trust_token_claims: bool, token_ttl: float) -> None:
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # user_id -> generacja; wpisy żyją najwyżej do wygaśnięcia tokenu, więc
+        # po tym czasie od ostatniego invalidate() generację można zapomnieć
+        self._generation = TTLCache(maxsize=maxsize, ttl=max(ttl, token_ttl))
+        self.trust_token_claims = trust_token_claims
+
+    def _key(self, user_id: str, iat):
+        return (user_id, iat, self._generation.get(user_id, 0))
+
+    def get(self, payload: dict) -> Optional[UserInDB]:
+        user = self._cache.get(self._key(payload["sub"], payload.get("iat")))
+        # kopia – route może modyfikować model
+        return user.model_copy() if user is not None else None
+
+    def set(self, payload: dict, user: UserInDB) -> UserInDB:
+        ttl = None
+        if self.trust_token_claims and payload.get("exp"):
+            ttl = max(0.0, payload["exp"] - time.time())
+
+        self._cache.set(self._key(payload["sub"], payload.get("iat")), user, ttl=ttl)
+        return user.model_copy()
+
+    def invalidate(self, user_id: str) -> None:
+        user_id = str(user_id)
+        self._generation.set(user_id, self._generation.get(user_id, 0) + 1)
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "trust_token_claims": self.trust_token_claims}
+
+
+# Singleton cache użytkowników
+user_cache = UserCache(
+    maxsize=settings.AUTH_USER_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    trust_token_claims=settings.AUTH_TRUST_TOKEN_CLAIMS,
+    token_ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
@@ -0,0 +1,199 @@
+"""
+Zmaterializowany profil gustu użytkownika dla routerów rekomendacji.
+
+Jeden dokument w kolekcji user_profiles (_id = id użytkownika jako string):
+    genre_counts / author_counts  – {nazwa: liczba} z wypożyczeń i wysokich ocen
+    borrowed_book_ids             – wszystkie wypożyczone książki
+    recent_book_ids               – ostatnie wypożyczenia, najnowsze pierwsze
+    goodbooks_ids                 – goodbooks_book_id wypożyczonych książek
+    liked_goodbooks_ids           – goodbooks_book_id książek ocenionych wysoko
+
+Aktualizowany przyrostowo przez routes/loans.py (create_loan) i
+routes/reviews.py (ocena >= TASTE_PROFILE_LIKED_RATING), więc rekomendacje
+czytają go jednym find_one po _id zamiast agregacji $lookup po loans.
+Zwrot książki nie zmienia gustu – historia wypożyczeń zostaje w profilu.
+
+Użytkownicy bez profilu (sprzed jego wprowadzenia) dostają go przy
+pierwszym odczycie – budowany jest z loans i reviews.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+from .book_resolver import books_by_ids
+
+# pola książki potrzebne do aktualizacji profilu
+PROFILE_BOOK_PROJECTION = {"genre": 1, "genres": 1, "author": 1, "goodbooks_book_id": 1}
+
+# nazwy gatunków/autorów są kluczami dokumentu – "." i "$" są tam zarezerwowane
+_KEY_ESCAPES = {".": "．", "$": "＄"}
+_KEY_UNESCAPES = {v: k for k, v in _KEY_ESCAPES.items()}
+
+
+def _encode_key(name: str) -> str:
+    return "".join(_KEY_ESCAPES.get(ch, ch) for ch in name)
+
+
+def _decode_key(key: str) -> str:
+    return "".join(_KEY_UNESCAPES.get(ch, ch) for ch in key)
+
+
+def book_genres(book: dict) -> List[str]:
+    """Gatunki książki – genres albo genre (lista lub string), jak normalize_book."""
+    genres = book.get("genres")
+    if genres is None:
+        genres = book.get("genre")
+    if isinstance(genres, str):
+        genres = [genres]
+    return [g for g in genres or [] if isinstance(g, str) and g]
+
+
+def _goodbooks_id(book: dict) -> Optional[int]:
+    try:
+        return int(book["goodbooks_book_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _taste_inc(book: dict, weight: int) -> dict:
+    inc = {f"genre_counts.{_encode_key(g)}": weight for g in set(book_genres(book))}
+    author = book.get("author")
+    if isinstance(author, str) and author:
+        inc[f"author_counts.{_encode_key(author)}"] = weight
+    return inc
+
+
+async def record_loan(db, user_id: str, book_id: str, book: dict) -> None:
+    """Wypożyczenie: +1 dla gatunków i autora, książka na początek recent_book_ids."""
+    update = {
+        "$inc": _taste_inc(book, 1),
+        "$addToSet": {"borrowed_book_ids": str(book_id)},
+        # ponowne wypożyczenie przenosi książkę na początek (bez duplikatu, jak build_profile)
+        "$pull": {"recent_book_ids": str(book_id)},
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+    gb_id = _goodbooks_id(book)
+    if gb_id is not None:
+        update["$addToSet"]["goodbooks_ids"] = gb_id
+
+    # bez upsert – brakujący profil zbuduje get_profile (już z tym wypożyczeniem)
+    result = await db.user_profiles.update_one({"_id": str(user_id)}, update)
+    if result.matched_count:
+        # $pull i $push na tym samym polu nie mogą być w jednym update
+        await db.user_profiles.update_one({"_id": str(user_id)}, {"$push": {"recent_book_ids": {
+            "$each": [str(book_id)],
+            "$position": 0,
+            "$slice": settings.TASTE_PROFILE_RECENT_BOOKS,
+        }}})
+
+
+async def record_review(db, user_id: str, book: dict, liked: bool) -> None:
+    """Wysoka ocena dodaje się do gustu (liked=True), jej cofnięcie odejmuje."""
+    update = {
+        "$inc": _taste_inc(book, 1 if liked else -1),
+        "$set": {"updated_at": datetime.utcnow()},
+    }
+    gb_id = _goodbooks_id(book)
+    if gb_id is not None:
+        update["$addToSet" if liked else "$pull"] = {"liked_goodbooks_ids": gb_id}
+
+    await db.user_profiles.update_one({"_id": str(user_id)}, update)
+
+
+def is_liked(rating: Optional[int]) -> bool:
+    return rating is not None and rating >= settings.TASTE_PROFILE_LIKED_RATING
+
+
+async def build_profile(db, user_id: str) -> dict:
+    """Profil od zera z loans i reviews (user_id bywa stringiem albo ObjectId)."""
+    user_ids = [str(user_id)]
+    if ObjectId.is_valid(str(user_id)):
+        user_ids.append(ObjectId(str(user_id)))
+
+    loans = await db.loans.find(
+        {"user_id": {"$in": user_ids}}, {"book_id": 1, "loan_date": 1}
+    ).sort("loan_date", -1).to_list(None)
+    liked = await db.reviews.find(
+        {"user_id": {"$in": user_ids}, "rating": {"$gte": settings.TASTE_PROFILE_LIKED_RATING}},
+        {"book_id": 1},
+    ).to_list(None)
+
+    borrowed = list(dict.fromkeys(str(loan["book_id"]) for loan in loans if loan.get("book_id")))
+    liked_ids = [str(review["book_id"]) for review in liked if review.get("book_id")]
+    books = await books_by_ids(db, borrowed + liked_ids, PROFILE_BOOK_PROJECTION)
+
+    genre_counts, author_counts = Counter(), Counter()
+    goodbooks_ids, liked_goodbooks_ids = set(), set()
+
+    def count(book: dict) -> None:
+        genre_counts.update(_encode_key(g) for g in set(book_genres(book)))
+        if isinstance(book.get("author"), str) and book["author"]:
+            author_counts[_encode_key(book["author"])] += 1
+
+    for loan in loans:
+        book = books.get(str(loan.get("book_id")))
+        if book:
+            count(book)
+            if _goodbooks_id(book) is not None:
+                goodbooks_ids.add(_goodbooks_id(book))
+    for book_id in liked_ids:
+        book = books.get(book_id)
+        if book:
+            count(book)
+            if _goodbooks_id(book) is not None:
+                liked_goodbooks_ids.add(_goodbooks_id(book))
+
+    return {
+        "_id": str(user_id),
+        "genre_counts": dict(genre_counts),
+        "author_counts": dict(author_counts),
+        "borrowed_book_ids": borrowed,
+        "recent_book_ids": borrowed[: settings.TASTE_PROFILE_RECENT_BOOKS],
+        "goodbooks_ids": sorted(goodbooks_ids),
+        "liked_goodbooks_ids": sorted(liked_goodbooks_ids),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+async def get_profile(db, user_id: str) -> dict:
+    """Profil użytkownika – jeden find_one po _id; brakujący jest budowany i zapisywany."""
+    profile = await db.user_profiles.find_one({"_id": str(user_id)})
+    if profile is not None:
+        return profile
+
+    profile = await build_profile(db, user_id)
+    try:
+        # $setOnInsert – równoległe budowanie nie nadpisze profilu zapisanego wcześniej
+        await db.user_profiles.update_one(
+            {"_id": profile["_id"]},
+            {"$setOnInsert": {k: v for k, v in profile.items() if k != "_id"}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass
+    return profile
+
+
+def _top(counts: Optional[dict], n: int) -> List[str]:
+    ranked = sorted(
+        ((count, _decode_key(key)) for key, count in (counts or {}).items() if count > 0),
+        key=lambda item: (-item[0], item[1]),
+    )
+    return [name for _, name in ranked[:n]]
+
+
+def top_genres(profile: dict, n: int) -> List[str]:
+    return _top(profile.get("genre_counts"), n)
+
+
+def top_authors(profile: dict, n: int) -> List[str]:
+    return _top(profile.get("author_counts"), n)
+
+
+def seed_goodbooks_ids(profile: dict) -> List[int]:
+    """Ziarna dla LightGCN: wypożyczone i wysoko ocenione książki goodbooks."""
+    return sorted(set(profile.get("goodbooks_ids") or []) | set(profile.get("liked_goodbooks_ids") or []))
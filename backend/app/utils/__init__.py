@@ -1,6 +1,9 @@
 from .security import (
     verify_password,
     get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    PasswordHasherBusy,
     create_access_token,
     decode_access_token
 )
@@ -8,6 +11,9 @@ from .security import (
 __all__ = [
     "verify_password",
     "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
+    "PasswordHasherBusy",
     "create_access_token",
     "decode_access_token"
 ]
@@ -0,0 +1,30 @@
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyWindow:
+    """Przesuwne okno ostatnich pomiarów czasu (w sekundach) z percentylami."""
+
+    def __init__(self, size: int = 1000) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def summary(self) -> Dict[str, float]:
+        """p50/p95/p99 w milisekundach + liczba pomiarów."""
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+        }
@@ -0,0 +1,123 @@
+"""
+Paginacja kursorowa (keyset) dla list sortowanych po jednym polu.
+
+Kursor to nieprzezroczysty token z wartością pola sortowania i _id ostatniego
+elementu strony. Kolejna strona to zapytanie "po tym elemencie" na indeksie
+(pole, _id) – koszt nie rośnie z numerem strony jak przy skip().
+"""
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+from bson import json_util
+
+from ..config import settings
+from .cache import TTLCache
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_field: str, sort_order: int, doc: dict) -> str:
+    payload = json_util.dumps({"f": sort_field, "o": sort_order, "v": doc.get(sort_field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, sort_order: int) -> Tuple[Any, Any]:
+    """(wartość pola sortowania, _id) z kursora; InvalidCursor gdy token jest zły lub z innego sortowania."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json_util.loads(raw)
+        value, last_id = payload["v"], payload["id"]
+        field, order = payload["f"], payload["o"]
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        raise InvalidCursor("Nieprawidłowy kursor")
+    if field != sort_field or order != sort_order:
+        raise InvalidCursor("Kursor nie pasuje do sortowania")
+    return value, last_id
+
+
+def keyset_sort(sort_field: str, sort_order: int) -> List[Tuple[str, int]]:
+    """Sortowanie z _id jako rozstrzygnięciem remisów – stabilna kolejność stron."""
+    return [(sort_field, sort_order), ("_id", sort_order)]
+
+
+def keyset_query(query: dict, sort_field: str, sort_order: int, cursor: Optional[str]) -> dict:
+    """
+    Dokłada do query warunek "za elementem z kursora".
+
+    Mongo sortuje brakujące/null pola jako najmniejsze, a porównania
+    $gt/$lt nie przechodzą między typami – stąd osobne gałęzie dla null.
+    """
+    if not cursor:
+        return query
+
+    value, last_id = decode_cursor(cursor, sort_field, sort_order)
+    op = "$gt" if sort_order == 1 else "$lt"
+
+    after = [{sort_field: value, "_id": {op: last_id}}]
+    if value is None:
+        if sort_order == 1:
+            after.append({sort_field: {"$ne": None}})
+    else:
+        after.append({sort_field: {op: value}})
+        if sort_order == -1:
+            after.append({sort_field: None})
+
+    condition = {"$or": after}
+    return {"$and": [query, condition]} if query else condition
+
+
+async def fetch_page(collection, query: dict, sort_field: str, sort_order: int,
+                     limit: int, cursor: Optional[str] = None, skip: int = 0,
+                     projection: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Strona dokumentów i kursor następnej (None = ostatnia strona).
+    Z kursorem skip jest ignorowany; pobiera limit + 1, żeby wiedzieć, czy jest dalej.
+    """
+    find_query = keyset_query(query, sort_field, sort_order, cursor)
+    find_cursor = collection.find(find_query, projection).sort(keyset_sort(sort_field, sort_order))
+    if skip and not cursor:
+        find_cursor = find_cursor.skip(skip)
+
+    docs = await find_cursor.limit(limit + 1).to_list(None)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(sort_field, sort_order, docs[-1])
+
+
+class CountCache:
+    """
+    Liczniki dla list (total / total_pages). Bez filtrów –
+    estimated_document_count z metadanych kolekcji, z filtrami –
+    count_documents trzymany przez ttl sekund.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def count(self, collection, query: dict) -> int:
+        key = (collection.name, json_util.dumps(query, sort_keys=True))
+        total = self._cache.get(key)
+        if total is None:
+            if query:
+                total = await collection.count_documents(query)
+            else:
+                total = await collection.estimated_document_count()
+            self._cache.set(key, total)
+        return total
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# Wspólny cache liczników list (książki, wypożyczenia)
+listing_counts = CountCache(
+    maxsize=settings.LISTING_COUNT_CACHE_MAX_SIZE,
+    ttl=settings.LISTING_COUNT_CACHE_TTL_SECONDS,
+)
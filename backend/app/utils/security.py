@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,6 +8,18 @@ from ..config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt (~100-300 ms CPU) nie może blokować event loopa – osobna, ograniczona pula.
+# bcrypt zwalnia GIL, więc wątki liczą równolegle.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_password_pending = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Za dużo operacji na hasłach w kolejce – wywołujący powinien zwrócić 503."""
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -17,15 +31,44 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_password_op(fn, *args):
+    global _password_pending
+    if _password_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy()
+
+    _password_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_pending -= 1
+
+
+def shutdown_password_executor() -> None:
+    """Zamyka pulę bcrypt (shutdown aplikacji); oczekujące operacje są anulowane."""
+    _password_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password w puli bcrypt (dla handlerów async)"""
+    return await _run_password_op(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash w puli bcrypt (dla handlerów async)"""
+    return await _run_password_op(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # iat – część klucza cache użytkownika (services/user_cache.py)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -0,0 +1,40 @@
+"""
+Normalizacja tekstu do wyszukiwania: bez wielkości liter i znaków
+diakrytycznych ("Łódź" -> "lodz"). Ten sam normalize() używa
+scripts/map_goodbooks.py przy dopasowaniu katalogu do goodbooks.
+"""
+import re
+import unicodedata
+from typing import List
+
+try:
+    from unidecode import unidecode
+except ImportError:  # unidecode jest opcjonalne – fallback obsługuje alfabety łacińskie
+    unidecode = None
+
+# litery, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+_EXTRA_FOLDS = str.maketrans({
+    "ł": "l", "Ł": "L", "ø": "o", "Ø": "O", "đ": "d", "Đ": "D",
+    "ß": "ss", "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE",
+})
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_diacritics(text: str) -> str:
+    if unidecode is not None:
+        return unidecode(text)
+    decomposed = unicodedata.normalize("NFKD", text.translate(_EXTRA_FOLDS))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize(text: str) -> str:
+    if not text:
+        return ""
+    t = fold_diacritics(text).lower().strip()
+    return " ".join(t.split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Słowa (litery/cyfry) znormalizowanego tekstu."""
+    return _TOKEN_RE.findall(normalize(text))
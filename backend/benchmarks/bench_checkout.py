@@ -0,0 +1,149 @@
+"""
+Benchmark współbieżnych wypożyczeń: wielu użytkowników naraz wypożycza
+tę samą książkę o --copies egzemplarzach.
+
+Sprawdza, że udanych wypożyczeń jest dokładnie tyle, ile egzemplarzy
+(brak "nadsprzedaży"), a available_copies kończy na 0 – oraz mierzy
+latencję POST /v1/loans/.
+
+Wymaga uruchomionego API (z katalogu backend/):
+    uvicorn app.main:app --port 8000
+
+Uruchom:
+    python benchmarks/bench_checkout.py
+    python benchmarks/bench_checkout.py --url http://localhost:8000 --users 200 --copies 20 --concurrency 50
+
+Książkę zakłada konto --admin (domyślnie admin/admin123 z init_db.py),
+wypożyczają użytkownicy bench_loan_<i>. Po pomiarze wypożyczenia są
+zwracane, a książka usuwana. Tylko biblioteka standardowa.
+"""
+
+import argparse
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def request(method: str, url: str, body=None, headers: dict = None, form: bool = False):
+    headers = dict(headers or {})
+    data = None
+    if body is not None:
+        if form:
+            data = urllib.parse.urlencode(body).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def login(args, username: str, password: str) -> dict:
+    status, body = request("POST", f"{args.url}/v1/auth/token",
+                           {"username": username, "password": password}, form=True)
+    if status != 200:
+        raise SystemExit(f"❌ Logowanie {username} nie powiodło się ({status})")
+    return {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def prepare_users(args) -> list:
+    def prepare(i):
+        username = f"bench_loan_{i}"
+        # 400 = już istnieje
+        request("POST", f"{args.url}/v1/auth/register", {
+            "email": f"{username}@example.com",
+            "username": username,
+            "password": args.password,
+            "full_name": f"Bench {i}",
+        })
+        return login(args, username, args.password)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(prepare, range(args.users)))
+
+
+def checkout(args, book_id: str, headers: dict):
+    start = time.perf_counter()
+    status, body = request("POST", f"{args.url}/v1/loans/", {"book_id": book_id}, headers)
+    return status, time.perf_counter() - start, body
+
+
+def fmt(timings) -> str:
+    if not timings:
+        return "brak pomiarów"
+    t = np.asarray(timings) * 1000
+    return (
+        f"p50={np.percentile(t, 50):.1f} ms  p95={np.percentile(t, 95):.1f} ms  "
+        f"p99={np.percentile(t, 99):.1f} ms  (n={len(t)})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--admin", default="admin")
+    parser.add_argument("--admin-password", default="admin123")
+    args = parser.parse_args()
+
+    admin = login(args, args.admin, args.admin_password)
+
+    print(f"👥 Przygotowanie {args.users} użytkowników...")
+    users = prepare_users(args)
+
+    status, book = request("POST", f"{args.url}/v1/books/", {
+        "title": "Bench checkout",
+        "author": "Bench",
+        "total_copies": args.copies,
+        "available_copies": args.copies,
+    }, admin)
+    if status != 201:
+        raise SystemExit(f"❌ Nie udało się założyć książki ({status})")
+    book_id = book.get("_id") or book.get("id")
+
+    print(f"📚 {args.users} wypożyczeń {args.copies} egzemplarzy, współbieżność {args.concurrency}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda h: checkout(args, book_id, h), users))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [(h, body) for h, (status, _, body) in zip(users, results) if status == 201]
+
+    _, after = request("GET", f"{args.url}/v1/books/{book_id}", headers=admin)
+    available = after.get("available_copies") if after else None
+    expected = min(args.copies, args.users)
+
+    print()
+    print(f"⏱️  {len(results)} żądań w {elapsed:.2f} s")
+    print(f"   statusy: {statuses}")
+    print(f"   latencja wszystkich: {fmt([t for _, t, _ in results])}")
+    print(f"   latencja udanych:    {fmt([t for status, t, _ in results if status == 201])}")
+    print(f"📦 Udane wypożyczenia: {len(ok)} (oczekiwane {expected}), available_copies po teście: {available}")
+    if len(ok) == expected and available == args.copies - expected:
+        print("✅ Brak nadsprzedaży egzemplarzy")
+    else:
+        print("❌ Liczba wypożyczeń nie zgadza się z liczbą egzemplarzy!")
+
+    print("🧹 Sprzątanie...")
+    for headers, loan in ok:
+        request("POST", f"{args.url}/v1/loans/{loan['_id']}/return", {}, headers)
+    request("DELETE", f"{args.url}/v1/books/{book_id}", headers=admin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark indeksów itemów: recall@k vs latencja dla ExactIndex i IVFIndex
+(różne nprobe) przy katalogach od 10k do 1M książek.
+
+Uruchom (z katalogu backend/):
+    python benchmarks/bench_item_index.py
+    python benchmarks/bench_item_index.py --sizes 10000 100000 --nprobe 4 8 16
+    python benchmarks/bench_item_index.py --artifact   # embeddingi z artefaktu serwującego
+
+Syntetyczne embeddingi to mieszanina gaussowska (skupiska "gatunków"),
+zapytania to średnie kilku itemów – jak seedy w recommend_batch().
+Recall liczony względem wyniku ExactIndex dla tych samych zapytań.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from recommendation_engine.item_index import ExactIndex, IVFIndex, build_ivf, default_nlist
+
+
+def synthetic_items(n: int, dim: int, rng) -> np.ndarray:
+    n_clusters = max(8, int(np.sqrt(n) / 2))
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, n_clusters, n)
+    items = centers[assign] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return items.astype(np.float32)
+
+
+def make_queries(items: np.ndarray, n_queries: int, seeds_per_query: int, rng) -> np.ndarray:
+    seeds = rng.integers(0, len(items), (n_queries, seeds_per_query))
+    return items[seeds].mean(axis=1).astype(np.float32)
+
+
+def time_search(index, queries: np.ndarray, k: int, batch: int):
+    """(wyniki, lista czasów na batch zapytań w sekundach)."""
+    ids, timings = [], []
+    for start in range(0, len(queries), batch):
+        t0 = time.perf_counter()
+        top, _ = index.search(queries[start:start + batch], k)
+        timings.append(time.perf_counter() - t0)
+        ids.append(top)
+    return np.concatenate(ids), timings
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    hits = [len(np.intersect1d(a, e)) / len(e) for a, e in zip(approx, exact)]
+    return float(np.mean(hits))
+
+
+def bench_size(items: np.ndarray, args, rng) -> list:
+    queries = make_queries(items, args.queries, args.seeds, rng)
+    rows = []
+
+    exact = ExactIndex(items, "dot")
+    exact_ids, timings = time_search(exact, queries, args.k, args.batch)
+    rows.append(("exact", "-", 1.0, timings))
+
+    t0 = time.perf_counter()
+    centroids, offsets, list_items = build_ivf(items, nlist=args.nlist, metric="dot")
+    build_s = time.perf_counter() - t0
+    print(f"   IVF: nlist={len(centroids)}, budowa {build_s:.1f} s")
+
+    for nprobe in args.nprobe:
+        ivf = IVFIndex(items, centroids, offsets, list_items, "dot", nprobe)
+        ids, timings = time_search(ivf, queries, args.k, args.batch)
+        rows.append(("ivf", nprobe, recall_at_k(ids, exact_ids), timings))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--nlist", type=int, default=None, help="domyślnie ~4*sqrt(N)")
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=32, help="zapytań na wywołanie (jak micro-batch)")
+    parser.add_argument("--seeds", type=int, default=5, help="seedów na zapytanie")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--artifact", action="store_true", help="item_emb z aktualnego artefaktu zamiast syntetycznych")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    if args.artifact:
+        from recommendation_engine.serving_artifact import load_serving_artifact
+        catalogues = [np.asarray(load_serving_artifact().item_emb, dtype=np.float32)]
+    else:
+        catalogues = (synthetic_items(n, args.dim, rng) for n in args.sizes)
+
+    for items in catalogues:
+        n = len(items)
+        print(f"\n📚 Katalog: {n} itemów, dim={items.shape[1]} (domyślne nlist={default_nlist(n)})")
+        rows = bench_size(items, args, rng)
+
+        print(f"{'backend':<8}{'nprobe':>8}{f'recall@{args.k}':>12}{'p50 [ms]':>12}{'p95 [ms]':>12}{'zapyt./s':>12}")
+        for backend, nprobe, recall, timings in rows:
+            t = np.asarray(timings)
+            qps = args.queries / t.sum()
+            print(
+                f"{backend:<8}{nprobe!s:>8}{recall:>12.3f}"
+                f"{np.percentile(t, 50) * 1000:>12.2f}{np.percentile(t, 95) * 1000:>12.2f}{qps:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
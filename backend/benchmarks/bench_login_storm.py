@@ -0,0 +1,131 @@
+"""
+Benchmark "porannej fali logowań": przepustowość /v1/auth/token i latencja
+niezwiązanego endpointu (domyślnie /health) w trakcie fali.
+
+Wymaga uruchomionego API (z katalogu backend/):
+    uvicorn app.main:app --port 8000
+
+Uruchom:
+    python benchmarks/bench_login_storm.py
+    python benchmarks/bench_login_storm.py --url http://localhost:8000 --logins 400 --concurrency 50
+
+Skrypt zakłada (albo używa istniejących) użytkowników bench_login_<i>
+z hasłem --password. Tylko biblioteka standardowa.
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def request(url: str, data: bytes = None, headers: dict = None) -> int:
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def ensure_users(args) -> None:
+    for i in range(args.users):
+        body = json.dumps({
+            "email": f"bench_login_{i}@example.com",
+            "username": f"bench_login_{i}",
+            "password": args.password,
+            "full_name": f"Bench {i}",
+        }).encode()
+        # 400 = już istnieje
+        request(f"{args.url}/v1/auth/register", body, {"Content-Type": "application/json"})
+
+
+def login(args, i: int):
+    body = urllib.parse.urlencode({
+        "username": f"bench_login_{i % args.users}",
+        "password": args.password,
+    }).encode()
+    start = time.perf_counter()
+    status = request(f"{args.url}/v1/auth/token", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    return status, time.perf_counter() - start
+
+
+def probe_latency(args, stop: threading.Event) -> list:
+    """Latencja niezwiązanego endpointu, co --probe-interval-ms, aż do stop."""
+    timings = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        request(f"{args.url}{args.probe}")
+        timings.append(time.perf_counter() - start)
+        time.sleep(args.probe_interval_ms / 1000)
+    return timings
+
+
+def fmt(timings) -> str:
+    if not timings:
+        return "brak pomiarów"
+    t = np.asarray(timings) * 1000
+    return (
+        f"p50={np.percentile(t, 50):.1f} ms  p95={np.percentile(t, 95):.1f} ms  "
+        f"p99={np.percentile(t, 99):.1f} ms  (n={len(t)})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--probe", default="/health", help="niezwiązany endpoint mierzony w trakcie fali")
+    parser.add_argument("--probe-interval-ms", type=float, default=20)
+    parser.add_argument("--baseline-s", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"👥 Przygotowanie {args.users} użytkowników...")
+    ensure_users(args)
+
+    print(f"⏱️  Bazowa latencja {args.probe} ({args.baseline_s:.0f} s bez obciążenia)...")
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as probe_pool:
+        baseline = probe_pool.submit(probe_latency, args, stop)
+        time.sleep(args.baseline_s)
+        stop.set()
+        baseline = baseline.result()
+
+    print(f"🌊 Fala logowań: {args.logins} żądań, współbieżność {args.concurrency}...")
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as probe_pool:
+        during = probe_pool.submit(probe_latency, args, stop)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda i: login(args, i), range(args.logins)))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        during = during.result()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [t for status, t in results if status == 200]
+
+    print()
+    print(f"🔐 Logowania: {len(ok)}/{args.logins} OK w {elapsed:.1f} s -> {len(ok) / elapsed:.1f} logowań/s")
+    print(f"   statusy: {statuses}")
+    print(f"   latencja logowania: {fmt(ok)}")
+    print(f"📡 {args.probe} bez obciążenia: {fmt(baseline)}")
+    print(f"📡 {args.probe} w trakcie fali: {fmt(during)}")
+
+
+if __name__ == "__main__":
+    main()
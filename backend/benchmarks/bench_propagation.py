@@ -0,0 +1,173 @@
+"""
+Benchmark propagacji LightGCN: nowa ścieżka sparse CSR vs stara ścieżka scatter
+(gather + index_add_).
+
+Uruchom (z katalogu backend/):
+    python benchmarks/bench_propagation.py
+    python benchmarks/bench_propagation.py --ratings recommendation_engine/data/goodbooks_data/ratings.csv
+
+Bez --ratings generowany jest syntetyczny graf o skali goodbooks-10k
+(~53k użytkowników, 10k książek, ~900k krawędzi user-item).
+
+Każdy silnik mierzony jest w osobnym procesie, żeby szczytowe RSS
+(ru_maxrss) nie mieszało się między ścieżkami.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import torch
+
+from recommendation_engine.goodbooks_lightgcn import (
+    BATCH_SIZE,
+    LightGCN,
+    build_edge_index,
+)
+
+
+def build_graph(args):
+    """Zwraca (df, num_users, num_items) – z ratings.csv albo syntetycznie."""
+    if args.ratings:
+        df = pd.read_csv(args.ratings)
+        df = df[df["rating"] >= 3].copy()
+        df["user_idx"] = df["user_id"].astype("category").cat.codes
+        df["item_idx"] = df["book_id"].astype("category").cat.codes
+        return df, int(df["user_idx"].max() + 1), int(df["item_idx"].max() + 1)
+
+    rng = np.random.default_rng(args.seed)
+    # rozkład popularności zbliżony do power-law, jak w goodbooks
+    item_p = 1.0 / np.arange(1, args.items + 1) ** 0.8
+    item_p /= item_p.sum()
+    df = pd.DataFrame({
+        "user_idx": rng.integers(0, args.users, args.edges),
+        "item_idx": rng.choice(args.items, size=args.edges, p=item_p),
+    }).drop_duplicates()
+    return df, args.users, args.items
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: KB na Linuksie, bajty na macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss / 1024
+
+
+def run_engine(args) -> dict:
+    """Jedna "epoka" treningu (args.batches batchy) na wskazanym silniku."""
+    torch.manual_seed(args.seed)
+    df, num_users, num_items = build_graph(args)
+    edge_index = build_edge_index(df, num_users).cpu()
+
+    model = LightGCN(num_users, num_items)
+    propagate = model.propagate if args.engine == "sparse" else model.propagate_scatter
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+
+    users_all = torch.tensor(df["user_idx"].values, dtype=torch.long)
+    items_all = torch.tensor(df["item_idx"].values, dtype=torch.long)
+
+    rss_before = peak_rss_mb()
+    timings = []
+
+    for b in range(args.batches + 1):
+        idx = torch.randint(0, len(df), (BATCH_SIZE,))
+        users, pos = users_all[idx], items_all[idx]
+        neg = torch.randint(0, num_items, (BATCH_SIZE,))
+
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        users_emb, items_emb = propagate(edge_index)
+        u = users_emb[users]
+        pos_score = torch.sum(u * items_emb[pos], dim=1)
+        neg_score = torch.sum(u * items_emb[neg], dim=1)
+        loss = -torch.mean(torch.log(torch.sigmoid(pos_score - neg_score)))
+        loss.backward()
+        optimizer.step()
+        elapsed = time.perf_counter() - start
+
+        # pierwszy batch to rozgrzewka (dla sparse – budowa macierzy CSR)
+        if b == 0:
+            warmup = elapsed
+            continue
+        timings.append(elapsed)
+
+    batches_per_epoch = int(np.ceil(len(df) / BATCH_SIZE))
+    mean_batch = float(np.mean(timings))
+
+    return {
+        "engine": args.engine,
+        "edges": int(edge_index.shape[1]),
+        "warmup_s": warmup,
+        "mean_batch_s": mean_batch,
+        "est_epoch_s": mean_batch * batches_per_epoch,
+        "batches_per_epoch": batches_per_epoch,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_train_mb": rss_before,
+    }
+
+
+def check_equivalence(args) -> float:
+    """Maksymalna różnica embeddingów między obiema ścieżkami (ten sam model)."""
+    torch.manual_seed(args.seed)
+    df, num_users, num_items = build_graph(args)
+    edge_index = build_edge_index(df, num_users).cpu()
+    model = LightGCN(num_users, num_items)
+
+    with torch.no_grad():
+        u_sparse, i_sparse = model.propagate(edge_index)
+        u_scatter, i_scatter = model.propagate_scatter(edge_index)
+
+    return max(
+        (u_sparse - u_scatter).abs().max().item(),
+        (i_sparse - i_scatter).abs().max().item(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratings", default=None, help="ścieżka do ratings.csv (opcjonalnie)")
+    parser.add_argument("--users", type=int, default=53424)
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--edges", type=int, default=900000)
+    parser.add_argument("--batches", type=int, default=10, help="liczba mierzonych batchy")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engine", choices=["sparse", "scatter"], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # tryb dziecka – mierzy jeden silnik i wypisuje JSON
+    if args.engine:
+        print(json.dumps(run_engine(args)))
+        return
+
+    print("🔍 Sprawdzanie zgodności embeddingów...")
+    max_diff = check_equivalence(args)
+    print(f"   max |sparse - scatter| = {max_diff:.2e}")
+
+    results = []
+    for engine in ("scatter", "sparse"):
+        print(f"⏱️  Pomiar silnika: {engine}")
+        cmd = [sys.executable, os.path.abspath(__file__), "--engine", engine] + sys.argv[1:]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print()
+    print(f"{'silnik':<10}{'batch [ms]':>12}{'epoka [s]':>12}{'peak RSS [MB]':>16}")
+    for r in results:
+        print(f"{r['engine']:<10}{r['mean_batch_s'] * 1000:>12.1f}{r['est_epoch_s']:>12.1f}{r['peak_rss_mb']:>16.0f}")
+
+    scatter, sparse = results
+    print(f"\n📊 Przyspieszenie epoki: x{scatter['est_epoch_s'] / sparse['est_epoch_s']:.2f}")
+    print(f"📊 Oszczędność peak RSS: {scatter['peak_rss_mb'] - sparse['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark wyszukiwarki katalogu: odwrócony indeks (app/services/search_index.py)
+vs dotychczasowa ścieżka $regex po title/author, przy 10k i 1M książek,
+oraz latencja podpowiedzi /books/suggest (PrefixIndex).
+
+Uruchom (z katalogu backend/):
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --sizes 10000 100000 --queries 200
+    python benchmarks/bench_search.py --sizes 10000 --mongo   # także prawdziwy $regex w MongoDB
+
+Ścieżka regex w procesie to przejście re.search po wszystkich tytułach
+i autorach – dolne ograniczenie kosztu skanu kolekcji w Mongo (które
+dodatkowo deserializuje dokumenty). Z --mongo syntetyczny katalog jest
+wstawiany do osobnej kolekcji (--mongo-collection) i mierzony jest
+dokładnie filtr z get_books; kolekcja jest usuwana po teście.
+
+Zapytania to prefiksy słów z katalogu (jak przy pisaniu w wyszukiwarce).
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.search_index import InvertedIndex, PrefixIndex, suggest_key
+from app.utils.text import tokenize
+
+SYLLABLES = ["ka", "ro", "mi", "sta", "wie", "dź", "min", "sol", "ar", "is", "lem", "sap",
+             "ko", "ski", "ła", "no", "wa", "ta", "de", "usz", "ze", "na", "pol", "ry"]
+
+
+def synthetic_catalogue(n: int, rng):
+    """(tytuły, autorzy, ratings_count) – słowa z polskimi znakami, rozkład Zipfa."""
+    vocab_size = max(2000, n // 20)
+    words = ["".join(rng.choice(SYLLABLES, rng.integers(2, 5))) for _ in range(vocab_size)]
+    surnames = [w.capitalize() + "ski" for w in words[: vocab_size // 4]]
+
+    def zipf_pick(size, upper):
+        return np.minimum(rng.zipf(1.3, size) - 1, upper - 1)
+
+    title_lens = rng.integers(1, 6, n)
+    title_words = zipf_pick(int(title_lens.sum()), len(words))
+    titles, pos = [], 0
+    for length in title_lens:
+        titles.append(" ".join(words[i] for i in title_words[pos:pos + length]).capitalize())
+        pos += length
+
+    first = rng.choice(["Jan", "Anna", "Łukasz", "Żaneta", "Piotr", "Ewa"], n)
+    authors = [f"{f} {surnames[i]}" for f, i in zip(first, zipf_pick(n, len(surnames)))]
+    ratings = rng.zipf(1.5, n).astype(np.float64)
+    return titles, authors, ratings
+
+
+def make_queries(titles, authors, n_queries: int, rng):
+    queries = []
+    for i in rng.integers(0, len(titles), n_queries):
+        source = titles[i] if rng.random() < 0.7 else authors[i]
+        tokens = tokenize(source)
+        word = tokens[rng.integers(0, len(tokens))]
+        queries.append(word[: max(3, len(word) - rng.integers(0, 3))])
+    return queries
+
+
+def fmt(timings) -> str:
+    t = np.asarray(timings) * 1000
+    return f"p50={np.percentile(t, 50):8.2f} ms  p95={np.percentile(t, 95):8.2f} ms"
+
+
+def bench_index(index, queries):
+    timings, hits = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        positions, scores = index.search(tokenize(q))
+        top = positions[np.argsort(-scores)[:12]]
+        timings.append(time.perf_counter() - t0)
+        hits.append(len(positions))
+    return timings, hits
+
+
+def bench_suggest(prefix_index, titles, authors, n_queries: int, rng):
+    """Prefiksy 1-8 znaków z tytułów/autorów – jak kolejne znaki w polu wyszukiwania."""
+    timings = []
+    for i in rng.integers(0, len(titles), n_queries):
+        source = suggest_key(titles[i] if rng.random() < 0.7 else authors[i])
+        for length in range(1, min(len(source), 8) + 1):
+            t0 = time.perf_counter()
+            prefix_index.suggest(source[:length], 8)
+            timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def bench_regex(titles, authors, queries):
+    timings, hits = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        pattern = re.compile(re.escape(q), re.IGNORECASE)
+        matched = [i for i, (t, a) in enumerate(zip(titles, authors)) if pattern.search(t) or pattern.search(a)]
+        timings.append(time.perf_counter() - t0)
+        hits.append(len(matched))
+    return timings, hits
+
+
+def bench_mongo(titles, authors, ratings, queries, args):
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    col = client[os.getenv("DATABASE_NAME", "biblioteka")][args.mongo_collection]
+    col.drop()
+    try:
+        for start in range(0, len(titles), 10_000):
+            col.insert_many([
+                {"title": t, "author": a, "ratings_count": int(r)}
+                for t, a, r in zip(titles[start:start + 10_000], authors[start:start + 10_000], ratings[start:start + 10_000])
+            ])
+        col.create_index("title")
+        col.create_index("author")
+
+        timings = []
+        for q in queries:
+            regex = {"$regex": q, "$options": "i"}
+            t0 = time.perf_counter()
+            list(col.find({"$or": [{"title": regex}, {"author": regex}]}).sort("title", 1).limit(12))
+            col.count_documents({"$or": [{"title": regex}, {"author": regex}]})
+            timings.append(time.perf_counter() - t0)
+        return timings
+    finally:
+        col.drop()
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--regex-queries", type=int, default=20, help="ścieżka regex jest wolna – mniej zapytań")
+    parser.add_argument("--mongo", action="store_true", help="zmierz też $regex na prawdziwym MongoDB")
+    parser.add_argument("--mongo-collection", default="bench_search_books")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n in args.sizes:
+        print(f"\n📚 Katalog: {n:,} książek")
+        titles, authors, ratings = synthetic_catalogue(n, rng)
+        queries = make_queries(titles, authors, args.queries, rng)
+
+        t0 = time.perf_counter()
+        index = InvertedIndex((str(i), t, a, "", r) for i, (t, a, r) in enumerate(zip(titles, authors, ratings)))
+        print(f"   🔨 budowa indeksu: {time.perf_counter() - t0:.1f} s, {len(index.vocab):,} słów")
+
+        t0 = time.perf_counter()
+        prefix_index = PrefixIndex(index)
+        print(f"   🔨 budowa podpowiedzi: {time.perf_counter() - t0:.1f} s, {len(prefix_index.keys):,} kluczy")
+
+        index_t, index_hits = bench_index(index, queries)
+        regex_t, regex_hits = bench_regex(titles, authors, queries[: args.regex_queries])
+        print(f"   🔎 indeks:        {fmt(index_t)}  (śr. trafień {np.mean(index_hits):,.0f})")
+        print(f"   🐌 regex (proces): {fmt(regex_t)}  (śr. trafień {np.mean(regex_hits):,.0f})")
+        print(f"   ⌨️  suggest:       {fmt(bench_suggest(prefix_index, titles, authors, args.queries, rng))}")
+        if args.mongo:
+            print(f"   🍃 $regex Mongo:  {fmt(bench_mongo(titles, authors, ratings, queries[: args.regex_queries], args))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -237,17 +237,30 @@ async def init_database():
         await db.books.create_index([("author", ASCENDING)])
         await db.books.create_index([("genre", ASCENDING)])
         await db.books.create_index([("isbn", ASCENDING)], unique=True, sparse=True)
+        await db.books.create_index([("goodbooks_book_id", ASCENDING)], unique=True, sparse=True)
+        # paginacja kursorowa: pole sortowania + _id (app/utils/pagination.py)
+        for field in ("title", "author", "average_rating", "ratings_count", "publication_year", "created_at"):
+            await db.books.create_index([(field, ASCENDING), ("_id", ASCENDING)])
         
         # Reviews indexes
         await db.reviews.create_index([("book_id", ASCENDING)])
         await db.reviews.create_index([("user_id", ASCENDING)])
         await db.reviews.create_index([("created_at", DESCENDING)])
+        await db.reviews.create_index([("book_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
         
         # Loans indexes
         await db.loans.create_index([("book_id", ASCENDING)])
         await db.loans.create_index([("user_id", ASCENDING)])
         await db.loans.create_index([("status", ASCENDING)])
         await db.loans.create_index([("due_date", ASCENDING)])
+        await db.loans.create_index([("loan_date", DESCENDING), ("_id", DESCENDING)])
+        await db.loans.create_index([("status", ASCENDING), ("loan_date", DESCENDING), ("_id", DESCENDING)])
+        await db.loans.create_index(
+            [("user_id", ASCENDING), ("book_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": "active"},
+            name="active_loan_unique",
+        )
         
         # Insert sample admin user
         print("👤 Tworzenie użytkownika administratora...")
@@ -0,0 +1,140 @@
+"""
+Wspólna, zwektoryzowana ewaluacja Top-K (Recall / NDCG / Precision / Coverage)
+dla obu trenerów LightGCN (goodbooks_lightgcn.py i train_goodbooks.py).
+
+Interakcje trzymamy jako CSR (indptr, indices) w tensorach torch:
+- test_csr  – pozytywy, względem których liczymy trafienia
+- train_csr – (opcjonalnie) itemy maskowane przed top-K
+
+Użytkownicy oceniani są blokami: jedno mnożenie macierzy i jeden topk na blok.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+CSR = Tuple[torch.Tensor, torch.Tensor]
+
+
+def build_csr(users, items, num_users: int, device="cpu") -> CSR:
+    """
+    Buduje CSR użytkownik -> itemy z równoległych tablic users/items.
+    Zwraca (indptr [num_users + 1], indices [nnz]).
+    """
+    users = torch.as_tensor(np.asarray(users), dtype=torch.long, device=device)
+    items = torch.as_tensor(np.asarray(items), dtype=torch.long, device=device)
+
+    order = torch.argsort(users, stable=True)
+    counts = torch.bincount(users, minlength=num_users)
+
+    indptr = torch.zeros(num_users + 1, dtype=torch.long, device=device)
+    indptr[1:] = torch.cumsum(counts, dim=0)
+
+    return indptr, items[order]
+
+
+def csr_from_user_items(user_items: Dict[int, list], num_users: int, device="cpu") -> CSR:
+    """CSR ze słownika {user: [items]} (format train.txt / test.txt)."""
+    users, items = [], []
+    for user, user_list in user_items.items():
+        users.extend([user] * len(user_list))
+        items.extend(user_list)
+    return build_csr(users, items, num_users, device=device)
+
+
+def gather_rows(csr: CSR, users: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Wyciąga wiersze CSR dla podanych użytkowników bez pętli w Pythonie.
+    Zwraca (row_in_block, item, row_lengths).
+    """
+    indptr, indices = csr
+    starts = indptr[users]
+    lengths = indptr[users + 1] - starts
+
+    rows = torch.repeat_interleave(torch.arange(len(users), device=users.device), lengths)
+    # pozycja elementu wewnątrz swojego wiersza
+    row_offsets = torch.cumsum(lengths, dim=0) - lengths
+    within = torch.arange(int(lengths.sum()), device=users.device) - torch.repeat_interleave(row_offsets, lengths)
+    cols = indices[torch.repeat_interleave(starts, lengths) + within]
+
+    return rows, cols, lengths
+
+
+@torch.no_grad()
+def evaluate_topk(
+    user_emb: torch.Tensor,
+    item_emb: torch.Tensor,
+    test_csr: CSR,
+    train_csr: Optional[CSR] = None,
+    users: Optional[torch.Tensor] = None,
+    k: int = 20,
+    block_size: int = 1024,
+) -> Dict[str, float]:
+    """
+    Ranking wszystkich itemów dla każdego użytkownika z co najmniej jednym
+    pozytywem w test_csr (lub tylko dla `users`, jeśli podano).
+
+    Zwraca słownik: recall, ndcg, precision, coverage, users.
+    """
+    device = user_emb.device
+    num_items = item_emb.shape[0]
+    k = min(k, num_items)
+
+    test_csr = (test_csr[0].to(device), test_csr[1].to(device))
+    if train_csr is not None:
+        train_csr = (train_csr[0].to(device), train_csr[1].to(device))
+
+    if users is None:
+        users = torch.arange(user_emb.shape[0], device=device)
+    users = torch.as_tensor(users, dtype=torch.long, device=device)
+
+    # tylko użytkownicy, którzy mają cokolwiek do trafienia
+    test_lengths = test_csr[0][users + 1] - test_csr[0][users]
+    users = users[test_lengths > 0]
+
+    discount = 1.0 / torch.log2(torch.arange(2, k + 2, device=device, dtype=torch.float))
+    idcg_at = torch.cumsum(discount, dim=0)  # idcg dla min(|pos|, k) = idcg_at[n - 1]
+
+    recall_sum = 0.0
+    ndcg_sum = 0.0
+    precision_sum = 0.0
+    recommended = torch.zeros(num_items, dtype=torch.bool, device=device)
+
+    for start in range(0, len(users), block_size):
+        block = users[start:start + block_size]
+        b = len(block)
+
+        scores = user_emb[block] @ item_emb.T  # [B, num_items]
+
+        if train_csr is not None:
+            rows, cols, _ = gather_rows(train_csr, block)
+            scores[rows, cols] = -float("inf")
+
+        top_items = torch.topk(scores, k, dim=1).indices  # [B, k]
+        recommended[top_items.reshape(-1)] = True
+
+        rows, cols, n_pos = gather_rows(test_csr, block)
+        truth = torch.zeros(b, num_items, dtype=torch.bool, device=device)
+        truth[rows, cols] = True
+
+        hits = truth.gather(1, top_items).float()  # [B, k]
+        hit_count = hits.sum(dim=1)
+
+        dcg = (hits * discount).sum(dim=1)
+        idcg = idcg_at[torch.clamp(n_pos, max=k) - 1]
+
+        recall_sum += (hit_count / n_pos).sum().item()
+        ndcg_sum += (dcg / idcg).sum().item()
+        precision_sum += (hit_count / k).sum().item()
+
+    n_users = len(users)
+    if n_users == 0:
+        return {"recall": 0.0, "ndcg": 0.0, "precision": 0.0, "coverage": 0.0, "users": 0}
+
+    return {
+        "recall": recall_sum / n_users,
+        "ndcg": ndcg_sum / n_users,
+        "precision": precision_sum / n_users,
+        "coverage": recommended.sum().item() / num_items,
+        "users": n_users,
+    }
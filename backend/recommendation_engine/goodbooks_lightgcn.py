@@ -1,4 +1,8 @@
 import os
+import sys
+import time
+import json
+import argparse
 import numpy as np
 import pandas as pd
 import torch
@@ -6,7 +10,13 @@ import torch.nn as nn
 import torch.optim as optim
 from tqdm import tqdm
 import matplotlib.pyplot as plt
-from collections import defaultdict
+
+try:
+    from .evaluation import build_csr, evaluate_topk
+    from .serving_artifact import export_model
+except ImportError:  # uruchomienie jako skrypt: python recommendation_engine/goodbooks_lightgcn.py
+    from evaluation import build_csr, evaluate_topk
+    from serving_artifact import export_model
 
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
@@ -25,6 +35,19 @@ LR = 0.001
 BATCH_SIZE = 4096
 NEGATIVE_SAMPLES = 1
 
+# Ile mini-batchy BPR liczymy na jednej propagacji grafu.
+# Gradienty grupy są akumulowane i robimy jeden krok optymalizatora,
+# więc pełna propagacja (forward + backward) wykonuje się raz na grupę.
+# 1 = dawne zachowanie (propagacja na każdy batch). Większe wartości to
+# G razy mniej kroków Adama na epokę przy tym samym LR i EPOCHS – tylko
+# świadomie (--propagation-group / LIGHTGCN_PROPAGATION_GROUP), z kontrolą metryk.
+PROPAGATION_GROUP = int(os.getenv("LIGHTGCN_PROPAGATION_GROUP", "1"))
+
+# Dopuszczalny spadek Recall@20 / NDCG@20 względem metryk referencyjnych
+# (poprzedni zapis lightgcn_goodbooks_pro_metrics.json).
+# --metric-tolerance / LIGHTGCN_METRIC_TOLERANCE
+METRIC_TOLERANCE = float(os.getenv("LIGHTGCN_METRIC_TOLERANCE", "0.01"))
+
 
 # ============================================================
 #                   LIGHTGCN MODEL (PRO)
@@ -46,8 +69,52 @@ class LightGCN(nn.Module):
         # warstwy propagacji zgodne z LightGCN
         self.layers = LAYERS
 
+        # cache znormalizowanej macierzy sąsiedztwa (CSR) – nie trafia do state_dict
+        self.norm_adj = None
+        # edge_index, z którego zbudowano norm_adj, i jego wersja (zmiany in-place)
+        self._norm_adj_source = None
+        self._norm_adj_version = None
+
+    def get_norm_adj(self, edge_index):
+        """
+        Zwraca znormalizowaną macierz D^-1/2 A D^-1/2 dla edge_index.
+        Macierz budowana jest raz i trzymana przy modelu – kolejne wywołania
+        z tym samym obiektem edge_index korzystają z cache. Model trzyma
+        referencję do tensora, więc jego adres nie zostanie użyty ponownie
+        przez inny tensor (porównanie data_ptr() mogłoby dać fałszywe trafienie).
+        """
+        if (
+            self.norm_adj is None
+            or self._norm_adj_source is not edge_index
+            or self._norm_adj_version != edge_index._version
+        ):
+            self.norm_adj = build_norm_adj(edge_index, self.num_nodes)
+            self._norm_adj_source = edge_index
+            self._norm_adj_version = edge_index._version
+        return self.norm_adj
+
     def propagate(self, edge_index):
-    
+        """
+        Propagacja LightGCN: każda warstwa to jedno mnożenie
+        sparse (CSR) x dense przez zcache'owaną macierz sąsiedztwa.
+        """
+        adj = self.get_norm_adj(edge_index)
+
+        x = self.embedding.weight  # [num_nodes, emb_dim]
+        embs = [x]
+
+        for _ in range(self.layers):
+            x = torch.sparse.mm(adj, x)  # [num_nodes, emb_dim]
+            embs.append(x)
+
+        out = torch.stack(embs, dim=0).mean(0)
+        return out.split([self.num_users, self.num_items])
+
+    def propagate_scatter(self, edge_index):
+        """
+        Poprzednia implementacja (gather + index_add_ na każdej warstwie).
+        Zostawiona jako referencja do benchmarku i testów zgodności.
+        """
         x = self.embedding.weight  # [num_nodes, emb_dim]
         embs = [x]
 
@@ -78,11 +145,13 @@ class LightGCN(nn.Module):
         out = torch.stack(embs, dim=0).mean(0)
         return out.split([self.num_users, self.num_items])
 
-
-
     def forward(self, users, pos_items, neg_items, edge_index):
         users_emb, items_emb = self.propagate(edge_index)
+        return self.bpr_loss(users_emb, items_emb, users, pos_items, neg_items)
 
+    @staticmethod
+    def bpr_loss(users_emb, items_emb, users, pos_items, neg_items):
+        """BPR loss liczony na już spropagowanych embeddingach."""
         u = users_emb[users]
         pos = items_emb[pos_items]
         neg = items_emb[neg_items]
@@ -94,6 +163,33 @@ class LightGCN(nn.Module):
         return loss
 
 
+# ============================================================
+#          Znormalizowana macierz sąsiedztwa (CSR)
+# ============================================================
+def build_norm_adj(edge_index, num_nodes):
+    """
+    Buduje D^-1/2 A D^-1/2 jako sparse CSR [num_nodes, num_nodes].
+    Wiersz = węzeł docelowy (cols), kolumna = źródło (rows) – dokładnie
+    jak agregacja index_add_ w propagate_scatter. Zduplikowane krawędzie
+    są sumowane przy coalesce(), tak samo jak w index_add_.
+    """
+    rows = edge_index[0]
+    cols = edge_index[1]
+
+    deg = torch.bincount(rows, minlength=num_nodes).float()
+    deg_inv_sqrt = deg.pow(-0.5)
+    deg_inv_sqrt[deg_inv_sqrt == float("inf")] = 0
+
+    values = deg_inv_sqrt[rows] * deg_inv_sqrt[cols]
+
+    adj = torch.sparse_coo_tensor(
+        torch.stack([cols, rows], dim=0),
+        values,
+        (num_nodes, num_nodes),
+    )
+    return adj.coalesce().to_sparse_csr()
+
+
 # ============================================================
 #                     Wczytywanie GOODBOOKS
 # ============================================================
@@ -152,60 +248,41 @@ def build_edge_index(df, num_users):
 # ============================================================
 #                  Ewaluacja Recall@20 / NDCG@20
 # ============================================================
-def evaluate(model, edge_index, df, num_users, num_items, sample_users=2000):
+def evaluate(model, edge_index, df, num_users, num_items, sample_users=None):
     """
-    Eval na zestawie użytkowników (domyślnie 2000 losowych).
-    LightGCN: ranking wszystkich itemów i liczenie Recall/NDCG.
+    Ranking wszystkich itemów i liczenie Recall/NDCG/Precision/Coverage@20
+    (zwektoryzowane, blokami użytkowników – patrz evaluation.py).
+    Domyślnie oceniani są wszyscy użytkownicy; sample_users ogranicza
+    ewaluację do losowej próbki.
     """
     print("🔍 Ewaluacja modelu...")
 
-    # wybór użytkowników
-    users = np.random.choice(num_users, sample_users, replace=False)
+    positives = build_csr(df["user_idx"].values, df["item_idx"].values, num_users, device=DEVICE)
 
-    # mapowanie: user -> list of positives
-    positives = defaultdict(list)
-    for u, i in zip(df["user_idx"], df["item_idx"]):
-        positives[u].append(i)
+    users = None
+    if sample_users is not None:
+        users = torch.tensor(
+            np.random.choice(num_users, sample_users, replace=False), device=DEVICE
+        )
 
     model.eval()
     with torch.no_grad():
         users_emb, items_emb = model.propagate(edge_index)
 
-    recall_list = []
-    ndcg_list = []
-
-    for u in users:
-        if len(positives[u]) == 0:
-            continue
-
-        user_emb = users_emb[u]
-        scores = torch.matmul(user_emb, items_emb.T)
-        _, ranked_items = torch.topk(scores, 20)
-
-        ranked_items = ranked_items.cpu().numpy()
-        pos = set(positives[u])
-
-        # Recall@20
-        hit_count = sum([1 for x in ranked_items if x in pos])
-        recall = hit_count / len(pos)
-        recall_list.append(recall)
-
-        # NDCG@20
-        dcg = 0.0
-        for idx, item in enumerate(ranked_items):
-            if item in pos:
-                dcg += 1.0 / np.log2(idx + 2)
-        idcg = sum([1.0 / np.log2(i + 2) for i in range(min(len(pos), 20))])
-        ndcg = dcg / idcg if idcg > 0 else 0.0
-        ndcg_list.append(ndcg)
-
-    return float(np.mean(recall_list)), float(np.mean(ndcg_list))
+    return evaluate_topk(users_emb, items_emb, positives, users=users, k=20)
 
 
 # ============================================================
 #              GŁÓWNA PĘTLA TRENINGOWA (PRO)
 # ============================================================
-def train():
+def train(propagation_group=PROPAGATION_GROUP, lr=LR):
+    """
+    propagation_group – liczba mini-batchy (po BATCH_SIZE) na jedną propagację
+    grafu i jeden krok optymalizatora (akumulacja gradientu).
+    lr – learning rate Adama (nieskalowany przez propagation_group).
+
+    Model nie jest tu zapisywany – robi to main po kontroli metryk.
+    """
     df, num_users, num_items = load_goodbooks()
 
     # edge index
@@ -213,7 +290,7 @@ def train():
 
     # model
     model = LightGCN(num_users, num_items).to(DEVICE)
-    optimizer = optim.Adam(model.parameters(), lr=LR)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
     neg_sampler = NegativeSampler(num_items)
 
     # konwersja tensorów
@@ -226,7 +303,7 @@ def train():
     ndcgs = []
     epochs_logged = []
 
-    print("\n🚀 Start treningu PRO LightGCN\n")
+    print(f"\n🚀 Start treningu PRO LightGCN (propagacja co {propagation_group} batchy)\n")
 
     for epoch in range(1, EPOCHS + 1):
         model.train()
@@ -235,18 +312,29 @@ def train():
         p_shuffled = item_tensor[perm]
 
         epoch_losses = []
+        group_size = BATCH_SIZE * propagation_group
 
-        for i in range(0, len(df), BATCH_SIZE):
-            users = u_shuffled[i:i+BATCH_SIZE]
-            pos_items = p_shuffled[i:i+BATCH_SIZE]
-            neg_items = neg_sampler.sample(len(users))
-
+        for g in range(0, len(df), group_size):
             optimizer.zero_grad()
-            loss = model(users, pos_items, neg_items, edge_index)
+
+            # jedna propagacja na całą grupę mini-batchy
+            users_emb, items_emb = model.propagate(edge_index)
+
+            group_losses = []
+            for i in range(g, min(g + group_size, len(df)), BATCH_SIZE):
+                users = u_shuffled[i:i+BATCH_SIZE]
+                pos_items = p_shuffled[i:i+BATCH_SIZE]
+                neg_items = neg_sampler.sample(len(users))
+
+                group_losses.append(
+                    model.bpr_loss(users_emb, items_emb, users, pos_items, neg_items)
+                )
+
+            loss = torch.stack(group_losses).mean()
             loss.backward()
             optimizer.step()
 
-            epoch_losses.append(loss.item())
+            epoch_losses.extend(l.item() for l in group_losses)
 
         mean_loss = np.mean(epoch_losses)
         losses.append(mean_loss)
@@ -255,7 +343,8 @@ def train():
 
         # co 5 epok — ewaluacja
         if epoch % 5 == 0:
-            recall20, ndcg20 = evaluate(model, edge_index, df, num_users, num_items)
+            eval_metrics = evaluate(model, edge_index, df, num_users, num_items)
+            recall20, ndcg20 = eval_metrics["recall"], eval_metrics["ndcg"]
             recalls.append(recall20)
             ndcgs.append(ndcg20)
             epochs_logged.append(epoch)
@@ -263,12 +352,27 @@ def train():
             print(f"📊 Recall@20: {recall20:.4f}")
             print(f"📊 NDCG@20:  {ndcg20:.4f}\n")
 
-    # zapis modelu
-    save_path = os.path.join(MODEL_DIR, "lightgcn_goodbooks_pro.pt")
-    torch.save(model.state_dict(), save_path)
-    print(f"🎉 Model zapisany do {save_path}")
+    return model, losses, recalls, ndcgs, epochs_logged, num_users, num_items, df, edge_index
+
+
+# ============================================================
+#          Kontrola jakości względem metryk referencyjnych
+# ============================================================
+def check_metric_tolerance(metrics, reference, tolerance=METRIC_TOLERANCE):
+    """
+    Porównuje Recall@20 / NDCG@20 z metrykami referencyjnymi.
+    Zwraca listę metryk, które spadły o więcej niż tolerance.
+    """
+    failed = []
+    for key in ("recall20", "ndcg20"):
+        if key not in reference:
+            continue
+        drop = reference[key] - metrics[key]
+        if drop > tolerance:
+            failed.append(f"{key}: {metrics[key]:.4f} < {reference[key]:.4f} - {tolerance}")
+    return failed
+
 
-    return losses, recalls, ndcgs, epochs_logged, num_users, num_items, df, edge_index
 # ============================================================
 #                    GENEROWANIE WYKRESÓW
 # ============================================================
@@ -311,21 +415,42 @@ def plot_training(losses, recalls, ndcgs, epochs_logged):
 # ============================================================
 #                           MAIN
 # ============================================================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Trening LightGCN na goodbooks-10k")
+    parser.add_argument("--propagation-group", type=int, default=PROPAGATION_GROUP,
+                        help="mini-batchy na jedną propagację i krok optymalizatora (1 = każdy batch)")
+    parser.add_argument("--lr", type=float, default=LR)
+    parser.add_argument("--metric-tolerance", type=float, default=METRIC_TOLERANCE,
+                        help="dopuszczalny spadek Recall@20 / NDCG@20 względem poprzedniego treningu")
+    args = parser.parse_args()
+    if args.propagation_group < 1:
+        parser.error("--propagation-group musi być >= 1")
+    return args
+
+
 if __name__ == "__main__":
-    print(f"🚀 Start treningu LightGCN PRO (device={DEVICE})")
+    args = parse_args()
+    print(f"🚀 Start treningu LightGCN PRO (device={DEVICE}, propagation_group={args.propagation_group})")
 
-    losses, recalls, ndcgs, epochs_logged, num_users, num_items, df, edge_index = train()
+    metrics_path = os.path.join(MODEL_DIR, "lightgcn_goodbooks_pro_metrics.json")
 
-    # Eval końcowy na pełnych danych
-    print("🏁 Końcowa ewaluacja na 2000 użytkownikach...")
-    final_recall20, final_ndcg20 = evaluate(
-        LightGCN(num_users, num_items).to(DEVICE),
-        edge_index,
-        df,
-        num_users,
-        num_items,
-        sample_users=2000
+    # metryki poprzedniego treningu – punkt odniesienia dla --metric-tolerance
+    reference_metrics = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path) as f:
+            reference_metrics = json.load(f)
+
+    propagation_group, lr = args.propagation_group, args.lr
+    train_start = time.perf_counter()
+    model, losses, recalls, ndcgs, epochs_logged, num_users, num_items, df, edge_index = train(
+        propagation_group=propagation_group, lr=lr,
     )
+    train_seconds = time.perf_counter() - train_start
+
+    # Eval końcowy na pełnych danych
+    print("🏁 Końcowa ewaluacja na wszystkich użytkownikach...")
+    final_metrics = evaluate(model, edge_index, df, num_users, num_items)
+    final_recall20, final_ndcg20 = final_metrics["recall"], final_metrics["ndcg"]
 
     print(f"\n📌 Final Recall@20: {final_recall20:.4f}")
     print(f"📌 Final NDCG@20:  {final_ndcg20:.4f}")
@@ -334,22 +459,49 @@ if __name__ == "__main__":
     plot_training(losses, recalls, ndcgs, epochs_logged)
 
     # zapis metryk do JSON
-    metrics_path = os.path.join(MODEL_DIR, "lightgcn_goodbooks_pro_metrics.json")
     metrics = {
         "recall20": float(final_recall20),
         "ndcg20": float(final_ndcg20),
+        "precision20": float(final_metrics["precision"]),
         "epochs": EPOCHS,
         "embeddingDim": EMBEDDING_DIM,
         "layers": LAYERS,
-        "learningRate": LR,
+        "learningRate": lr,
+        "propagationGroup": propagation_group,
+        "trainSeconds": round(train_seconds, 1),
+        "epochSeconds": round(train_seconds / EPOCHS, 2),
         "interactions_used": len(df),
         "dataset": "goodbooks-10k",
-        "coverage": float(len(set(df['item_idx'])) / num_items),
+        "coverage": float(final_metrics["coverage"]),
     }
 
-    import json
+    failed = check_metric_tolerance(metrics, reference_metrics, args.metric_tolerance)
+    if failed:
+        # regresja nie może stać się nowym punktem odniesienia ani trafić do serwowania
+        rejected_path = os.path.join(MODEL_DIR, "lightgcn_goodbooks_pro_rejected_metrics.json")
+        with open(rejected_path, "w") as f:
+            json.dump(metrics, f, indent=4)
+        print(f"❌ Metryki poza tolerancją ({args.metric_tolerance}) względem poprzedniego treningu:")
+        for line in failed:
+            print(f"   - {line}")
+        print(f"   Model NIE został zapisany ani wyeksportowany (metryki: {rejected_path})")
+        sys.exit(1)
+
+    if reference_metrics.get("epochSeconds"):
+        print(f"⏱️  Czas epoki: {metrics['epochSeconds']:.2f} s "
+              f"(poprzednio {reference_metrics['epochSeconds']:.2f} s)")
+
+    # zapis modelu
+    save_path = os.path.join(MODEL_DIR, "lightgcn_goodbooks_pro.pt")
+    torch.save(model.state_dict(), save_path)
+    print(f"🎉 Model zapisany do {save_path}")
+
     with open(metrics_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
     print(f"📁 Metryki zapisane do {metrics_path}")
+
+    # artefakt dla API (embeddingi + mapowania, ładowane przez mmap)
+    model.eval()
+    export_model(model, edge_index, df)
     print("\n🎉 Trening LightGCN PRO zakończony!\n")
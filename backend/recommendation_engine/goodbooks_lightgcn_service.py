@@ -1,31 +1,176 @@
-
-
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Set
+from typing import Any, List, Dict, Optional, Tuple
+
+import numpy as np
 
-import torch
-import pandas as pd
+from .item_index import DEFAULT_NPROBE, make_index, normalize_rows
+from .serving_artifact import (
+    ARTIFACT_DIR,
+    MODEL_DIR,
+    current_artifact_path,
+    load_serving_artifact,
+)
 
-from .goodbooks_lightgcn import LightGCN, RATINGS_FILE, MODEL_DIR
 
 class GoodbooksLightGCNService:
     """
     Serwis do inferencji LightGCN trenowanego na goodbooks-10k.
     Ładuje:
-    - ratings.csv (rating >= 3)
-    - wytrenowany model lightgcn_goodbooks_pro.pt
-    - embeddings użytkowników i książek
+    - artefakt serwujący (embeddingi .npy przez mmap + mapowania), a gdy
+      go brak – dawną ścieżkę: ratings.csv + lightgcn_goodbooks_pro.pt
+      i pełną propagację
+
+    Model nie jest ładowany w konstruktorze – load() wywołuje się jawnie
+    albo w tle przez start_background_load() (lifespan FastAPI).
+    Do czasu załadowania is_loaded == False, a router serwuje fallback.
+
+    Wyszukiwanie top-k idzie przez indeks itemów (item_index.py):
+    index_backend = "exact" (domyślnie) albo "ivf" (przybliżony, nprobe list) –
+    z konstruktora albo przekazane do load() / start_background_load().
 
     Udostępnia:
     - recommend_for_goodbooks_ids(seed_book_ids) -> lista goodbooks_book_id
+    - similar_batch(book_ids) -> podobne książki (cosine) dla każdej z nich
+    - neighbours_for_goodbooks_id(book_id) -> gotowi sąsiedzi z artefaktu
+    - status() -> stan ładowania dla /v1/recommendations/health
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        artifact_dir: str = ARTIFACT_DIR,
+        index_backend: str = "exact",
+        nprobe: int = DEFAULT_NPROBE,
+    ) -> None:
+        self.artifact_dir = artifact_dir
+        self.artifact_version: Optional[str] = None
+        self.index_backend = index_backend
+        self.nprobe = nprobe
+
+        self.is_loaded = False
+        self.is_loading = False
+        self.load_error: Optional[str] = None
+        self.load_duration: Optional[float] = None
+        self.loaded_at: Optional[datetime] = None
+
+        self._load_lock = threading.Lock()
+        self._load_thread: Optional[threading.Thread] = None
+
+    # ----------------------------------------------------------
+    #  Ładowanie
+    # ----------------------------------------------------------
+    def start_background_load(self, index_backend: Optional[str] = None, nprobe: Optional[int] = None) -> None:
+        """Uruchamia load(index_backend, nprobe) w wątku w tle (tylko raz)."""
+        with self._load_lock:
+            if self.is_loaded or self._load_thread is not None:
+                return
+            self.is_loading = True
+            self._load_thread = threading.Thread(
+                target=self._background_load,
+                args=(index_backend, nprobe),
+                name="lightgcn-loader",
+                daemon=True,
+            )
+            self._load_thread.start()
+
+    def _background_load(self, index_backend: Optional[str], nprobe: Optional[int]) -> None:
+        try:
+            self.load(index_backend, nprobe)
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Nie udało się załadować GoodbooksLightGCNService: {self.load_error}")
+        finally:
+            self.is_loading = False
+
+    def load(self, index_backend: Optional[str] = None, nprobe: Optional[int] = None) -> "GoodbooksLightGCNService":
+        """
+        Ładuje artefakt (albo model z ratings.csv) – blokujące.
+        index_backend / nprobe nadpisują wartości z konstruktora.
+        """
+        if index_backend is not None:
+            self.index_backend = index_backend
+        if nprobe is not None:
+            self.nprobe = nprobe
         print("🔄 Inicjalizacja GoodbooksLightGCNService...")
-        self._load_data_and_model()
-        print("✅ GoodbooksLightGCNService gotowy.")
+        start = time.perf_counter()
+
+        if current_artifact_path(self.artifact_dir) is not None:
+            self._load_artifact(self.artifact_dir)
+        else:
+            print(f"⚠️ Brak artefaktu w {self.artifact_dir} – odtwarzam embeddingi z ratings.csv")
+            self._load_data_and_model()
+
+        self.num_users = int(self.user_emb.shape[0])
+        self.num_items = int(self.item_emb.shape[0])
+
+        # ===== Mappings item_idx <-> goodbooks_book_id =====
+        self.item_idx_to_book_id: Dict[int, int] = {
+            idx: int(book_id) for idx, book_id in enumerate(self.item_book_ids.tolist())
+        }
+        self.book_id_to_item_idx: Dict[int, int] = {
+            book_id: item_idx for item_idx, book_id in self.item_idx_to_book_id.items()
+        }
+
+        # ===== Indeksy itemów: user->item (dot) i item->item (cosine) =====
+        # każdy z własnym IVF – brakujące (stary artefakt) make_index buduje w locie
+        if self.item_emb_normed is None:
+            self.item_emb_normed = normalize_rows(self.item_emb)
+        self.user_index = make_index(self.index_backend, self.item_emb, "dot", self.ivf_dot, self.nprobe)
+        self.item_index = make_index(self.index_backend, self.item_emb_normed, "cosine", self.ivf, self.nprobe)
+
+        self.load_duration = time.perf_counter() - start
+        self.loaded_at = datetime.now()
+        self.load_error = None
+        # flaga na końcu – router czyta ją bez blokady
+        self.is_loaded = True
+        print(f"✅ GoodbooksLightGCNService gotowy ({self.load_duration * 1000:.0f} ms).")
+        return self
+
+    def status(self) -> Dict[str, Any]:
+        """Stan ładowania modelu (dla endpointu health)."""
+        if self.is_loaded:
+            state = "loaded"
+        elif self.is_loading:
+            state = "loading"
+        elif self.load_error:
+            state = "failed"
+        else:
+            state = "not_started"
+
+        return {
+            "state": state,
+            "artifact_version": self.artifact_version,
+            "index_backend": self.index_backend,
+            "load_duration_ms": round(self.load_duration * 1000, 1) if self.load_duration is not None else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "error": self.load_error,
+        }
+
+    def _load_artifact(self, artifact_dir: str) -> None:
+        artifact = load_serving_artifact(artifact_dir)
+        print(f"📦 Artefakt serwujący: {artifact.path} (wersja {artifact.version})")
+
+        self.artifact_version = artifact.version
+        self.user_emb: np.ndarray = artifact.user_emb
+        self.item_emb: np.ndarray = artifact.item_emb
+        self.item_book_ids: np.ndarray = artifact.item_book_ids
+        # posortowane od najpopularniejszych
+        self.popular_item_indices: np.ndarray = artifact.popular_items
+        self.item_emb_normed: Optional[np.ndarray] = artifact.item_emb_normed
+        self.ivf = artifact.ivf
+        self.ivf_dot = artifact.ivf_dot
+        self.item_neighbours: Optional[np.ndarray] = artifact.item_neighbours
+        self.item_neighbour_scores: Optional[np.ndarray] = artifact.item_neighbour_scores
 
     def _load_data_and_model(self) -> None:
+        # Ścieżka awaryjna – ciężkie importy tylko gdy naprawdę potrzebne
+        import pandas as pd
+        import torch
+
+        from .goodbooks_lightgcn import LightGCN, RATINGS_FILE
+
         # ===== 1. Wczytanie ratings.csv i odtworzenie indeksów =====
         print(f"📥 Wczytuję ratings z {RATINGS_FILE}")
         df = pd.read_csv(RATINGS_FILE)
@@ -37,31 +182,25 @@ class GoodbooksLightGCNService:
         df["user_idx"] = df["user_id"].astype("category").cat.codes
         df["item_idx"] = df["book_id"].astype("category").cat.codes
 
-        self.num_users = int(df["user_idx"].max() + 1)
-        self.num_items = int(df["item_idx"].max() + 1)
+        num_users = int(df["user_idx"].max() + 1)
+        num_items = int(df["item_idx"].max() + 1)
 
-        # ===== 2. Mappings item_idx <-> goodbooks_book_id =====
+        # ===== 2. Mapowanie item_idx -> goodbooks_book_id =====
         mapping_df = df[["item_idx", "book_id"]].drop_duplicates()
-        self.item_idx_to_book_id: Dict[int, int] = {
-            int(row.item_idx): int(row.book_id) for row in mapping_df.itertuples()
-        }
-        self.book_id_to_item_idx: Dict[int, int] = {
-            book_id: item_idx for item_idx, book_id in self.item_idx_to_book_id.items()
-        }
+        self.item_book_ids = np.zeros(num_items, dtype=np.int64)
+        self.item_book_ids[mapping_df["item_idx"].values] = mapping_df["book_id"].values
 
         # ===== 3. Popularność itemów (fallback globalny) =====
-        counts = df.groupby("item_idx").size()
+        counts = np.bincount(df["item_idx"].values, minlength=num_items)
         # posortowane od najpopularniejszych
-        self.popular_item_indices: List[int] = (
-            counts.sort_values(ascending=False).index.astype(int).tolist()
-        )
+        self.popular_item_indices = np.argsort(-counts, kind="stable")
 
         # ===== 4. edge_index na CPU =====
         users = torch.tensor(df["user_idx"].values, dtype=torch.long)
-        items = torch.tensor(df["item_idx"].values, dtype=torch.long) + self.num_users
+        items = torch.tensor(df["item_idx"].values, dtype=torch.long) + num_users
         rows = torch.cat([users, items], dim=0)
         cols = torch.cat([items, users], dim=0)
-        self.edge_index = torch.stack([rows, cols], dim=0)  # [2, E]
+        edge_index = torch.stack([rows, cols], dim=0)  # [2, E]
 
         # ===== 5. Załadowanie modelu =====
         model_path = Path(MODEL_DIR) / "lightgcn_goodbooks_pro.pt"
@@ -72,18 +211,23 @@ class GoodbooksLightGCNService:
                 f"i plik się zapisał."
             )
 
-        self.model = LightGCN(self.num_users, self.num_items)
+        model = LightGCN(num_users, num_items)
         state = torch.load(model_path, map_location="cpu")
-        self.model.load_state_dict(state)
-        self.model.eval()
+        model.load_state_dict(state)
+        model.eval()
 
         # ===== 6. Prekomputacja embeddingów =====
         with torch.no_grad():
-            user_emb, item_emb = self.model.propagate(self.edge_index)
+            user_emb, item_emb = model.propagate(edge_index)
 
-        # Trzymamy wszystko na CPU
-        self.user_emb = user_emb.cpu()
-        self.item_emb = item_emb.cpu()
+        # Trzymamy wszystko na CPU jako numpy
+        self.user_emb = user_emb.cpu().numpy()
+        self.item_emb = item_emb.cpu().numpy()
+        # indeksy zbuduje load() (IVF w locie, jeśli wybrany)
+        self.item_emb_normed = None
+        self.ivf = self.ivf_dot = None
+        self.item_neighbours = None
+        self.item_neighbour_scores = None
 
     # ----------------------------------------------------------
     #  API serwisu
@@ -97,56 +241,155 @@ class GoodbooksLightGCNService:
         Zwraca listę goodbooks_book_id rekomendowanych na podstawie seed_book_ids.
         Jeśli seed_book_ids jest puste => zwraca globalnie najpopularniejsze.
         """
-        # Zamiana na item_idx
-        seed_indices: List[int] = []
-        for b in seed_book_ids:
-            try:
-                b_int = int(b)
-            except (TypeError, ValueError):
+        return self.recommend_batch(seed_lists=[seed_book_ids], top_k=top_k)[0]
+
+    def recommend_batch(
+        self,
+        seed_lists: Optional[List[List[int]]] = None,
+        user_indices: Optional[List[int]] = None,
+        top_k: int = 20,
+        block_size: int = 1024,
+    ) -> List[List[int]]:
+        """
+        Top-K dla wielu użytkowników naraz – jedno mnożenie macierzy
+        i jeden batchowy top-k na blok (do block_size wierszy).
+
+        Podaj dokładnie jedno z:
+        - seed_lists   – listy goodbooks_book_id; wektor użytkownika to średnia
+                         embeddingów seedów, a seedy są maskowane w swoim wierszu
+        - user_indices – indeksy użytkowników goodbooks (user_idx z treningu)
+
+        Wiersze bez sygnału (brak znanych seedów / indeks spoza zakresu)
+        dostają globalnie najpopularniejsze książki.
+        """
+        if (seed_lists is None) == (user_indices is None):
+            raise ValueError("Podaj dokładnie jedno z: seed_lists, user_indices")
+
+        n_rows = len(seed_lists) if seed_lists is not None else len(user_indices)
+        k = min(top_k, self.num_items)
+        popular = [self.item_idx_to_book_id[i] for i in self.popular_item_indices[:k].tolist()]
+
+        results: List[List[int]] = [list(popular) for _ in range(n_rows)]
+
+        for start in range(0, n_rows, block_size):
+            stop = min(start + block_size, n_rows)
+
+            if seed_lists is not None:
+                rows, queries, mask_rows, mask_cols = self._seed_queries(seed_lists[start:stop])
+            else:
+                rows, queries = self._user_queries(user_indices[start:stop])
+                mask_rows = mask_cols = None
+
+            if len(rows) == 0:
                 continue
-            idx = self.book_id_to_item_idx.get(b_int)
+
+            # nie rekomenduj już "seedów"
+            exclude = (mask_rows, mask_cols) if mask_rows is not None else None
+            top, _ = self.user_index.search(queries, k, exclude)
+
+            self._fill_results(results, start, rows, top)
+
+        return results
+
+    def similar_batch(self, book_ids: List[int], top_k: int = 20) -> List[List[int]]:
+        """
+        Najbardziej podobne książki (cosine embeddingów) dla każdego
+        goodbooks_book_id. Książki spoza modelu dostają pustą listę.
+        """
+        results: List[List[int]] = [[] for _ in book_ids]
+
+        rows: List[int] = []
+        items: List[int] = []
+        for row, b in enumerate(book_ids):
+            idx = self.book_id_to_item_idx.get(int(b))
             if idx is not None:
-                seed_indices.append(idx)
+                rows.append(row)
+                items.append(idx)
+        if not rows:
+            return results
 
-        # Brak seedów -> globalny fallback
-        if not seed_indices:
-            indices = []
-            for idx in self.popular_item_indices:
-                if len(indices) >= top_k:
-                    break
-                indices.append(int(idx))
-            return [self.item_idx_to_book_id[i] for i in indices]
+        row_arr = np.asarray(rows, dtype=np.int64)
+        item_arr = np.asarray(items, dtype=np.int64)
+        queries = np.asarray(self.item_emb_normed[item_arr], dtype=np.float32)
 
-        seed_tensor = torch.tensor(seed_indices, dtype=torch.long)
-        seed_embs = self.item_emb[seed_tensor]  # [S, dim]
-        user_vec = seed_embs.mean(dim=0)        # [dim]
+        # sama książka nie jest swoim sąsiadem
+        exclude = (np.arange(len(item_arr)), item_arr)
+        top, _ = self.item_index.search(queries, min(top_k, self.num_items - 1), exclude)
 
-        # scores = item_emb ⋅ user_vec
-        scores = torch.matmul(self.item_emb, user_vec)  # [num_items]
+        self._fill_results(results, 0, row_arr, top)
+        return results
 
-        # nie rekomenduj już "seedów"
-        scores[seed_tensor] = -1e9
+    def neighbours_for_goodbooks_id(self, book_id: int, top_k: int = 20) -> Optional[List[Tuple[int, float]]]:
+        """
+        Prekomputowani sąsiedzi książki: [(goodbooks_book_id, podobieństwo), ...].
+        None, jeśli książki nie ma w modelu. Gdy artefakt nie ma tablicy
+        sąsiadów (stara wersja), liczy ją w locie przez indeks itemów.
+        """
+        idx = self.book_id_to_item_idx.get(int(book_id))
+        if idx is None:
+            return None
 
-        # Top-k
-        k = min(top_k, self.num_items)
-        top_scores, top_indices = torch.topk(scores, k=k)
+        if self.item_neighbours is None:
+            top, scores = self.item_index.search(
+                np.asarray(self.item_emb_normed[idx:idx + 1], dtype=np.float32),
+                min(top_k, self.num_items - 1),
+                ([0], [idx]),
+            )
+            neighbours, neighbour_scores = top[0], scores[0]
+        else:
+            neighbours = self.item_neighbours[idx, :top_k]
+            neighbour_scores = self.item_neighbour_scores[idx, :top_k]
 
-        result_ids: List[int] = []
-        seen: Set[int] = set()
+        return [
+            (int(self.item_book_ids[n]), float(score))
+            for n, score in zip(neighbours.tolist(), neighbour_scores.tolist())
+            if n >= 0
+        ]
 
-        for idx in top_indices.tolist():
-            book_id = self.item_idx_to_book_id.get(int(idx))
-            if book_id is None:
-                continue
-            if book_id in seen:
-                continue
-            seen.add(book_id)
-            result_ids.append(int(book_id))
-            if len(result_ids) >= top_k:
-                break
+    def _fill_results(self, results: List[List[int]], start: int, rows: np.ndarray, top: np.ndarray) -> None:
+        """Wpisuje item_idx z indeksu jako goodbooks_book_id (pomija dopełnienie -1)."""
+        book_ids = self.item_book_ids[np.maximum(top, 0)]  # [B, k]
+        for row, ids, valid in zip(rows.tolist(), book_ids.tolist(), (top >= 0).tolist()):
+            results[start + row] = [b for b, ok in zip(ids, valid) if ok]
+
+    def _seed_queries(self, seed_lists: List[List[int]]):
+        """
+        Zamienia listy seedów na macierz zapytań (średnie embeddingi seedów).
+        Zwraca (wiersze_z_sygnałem, zapytania, wiersze_maski, kolumny_maski).
+        """
+        row_ids: List[int] = []
+        item_ids: List[int] = []
+
+        for row, seeds in enumerate(seed_lists):
+            for b in seeds or []:
+                try:
+                    b_int = int(b)
+                except (TypeError, ValueError):
+                    continue
+                idx = self.book_id_to_item_idx.get(b_int)
+                if idx is not None:
+                    row_ids.append(row)
+                    item_ids.append(idx)
+
+        row_arr = np.asarray(row_ids, dtype=np.int64)
+        item_arr = np.asarray(item_ids, dtype=np.int64)
+
+        # wiersze bez żadnego znanego seeda idą do fallbacku
+        rows, local_rows, counts = np.unique(row_arr, return_inverse=True, return_counts=True)
+
+        queries = np.zeros((len(rows), self.item_emb.shape[1]), dtype=np.float32)
+        np.add.at(queries, local_rows, self.item_emb[item_arr])
+        queries /= counts[:, None]
+
+        return rows, queries, local_rows, item_arr
 
-        return result_ids
+    def _user_queries(self, user_indices: List[int]):
+        """Wiersze użytkowników goodbooks -> (wiersze_z_sygnałem, zapytania)."""
+        idx = np.asarray(user_indices, dtype=np.int64)
+        valid = (idx >= 0) & (idx < self.num_users)
+        rows = np.flatnonzero(valid)
+        return rows, np.asarray(self.user_emb[idx[valid]], dtype=np.float32)
 
 
-# Singleton serwisu – wczyta się raz przy starcie backendu
+# Singleton serwisu – ładowany w tle z lifespan aplikacji (start_background_load)
 goodbooks_lgcn_service = GoodbooksLightGCNService()
@@ -0,0 +1,271 @@
+"""
+Indeksy wektorów itemów dla zapytań user->item i item->item.
+
+Dwa backendy o wspólnym API search(queries, k, exclude) -> (ids, scores):
+- ExactIndex – pełne mnożenie macierzy; dla metryki "cosine" wektory są
+               znormalizowane raz (przy eksporcie), a nie przy każdym zapytaniu
+- IVFIndex   – przybliżony (inverted file): itemy pogrupowane k-means
+               w nlist list, zapytanie liczy iloczyny tylko dla nprobe
+               najbliższych list
+
+Tablice IVF (centroidy + listy w układzie CSR) buduje build_ivf() przy
+eksporcie artefaktu – serwis tylko je mapuje z dysku. Dla metryki "dot"
+(maximum inner product) itemy przed klasteryzacją przechodzą redukcję
+MIPS -> cosine (mips_augment), żeby podział na listy uwzględniał normy.
+
+Czysty numpy, bez torch.
+"""
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+METRICS = ("dot", "cosine")
+BACKENDS = ("exact", "ivf")
+
+DEFAULT_NPROBE = 16
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    """Wiersze o normie 1 (float32); wiersze zerowe zostają zerowe."""
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-10)
+
+
+def default_nlist(num_items: int) -> int:
+    """~4 * sqrt(N) list – typowy kompromis dla IVF."""
+    return int(max(1, min(num_items, round(4 * np.sqrt(num_items)))))
+
+
+def mips_augment(vectors: np.ndarray) -> np.ndarray:
+    """
+    Redukcja MIPS -> cosine: x -> [x, sqrt(M^2 - |x|^2)] / M, M = max |x|.
+    Wszystkie wiersze mają normę 1, a dla zapytania [q, 0] iloczyn z nimi
+    to q.x / M – kolejność jak przy iloczynie skalarnym z oryginałami.
+    """
+    x = np.asarray(vectors, dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", x, x)
+    max_sq = max(float(sq_norms.max()) if len(x) else 0.0, 1e-20)
+    extra = np.sqrt(np.maximum(max_sq - sq_norms, 0.0))[:, None]
+    return np.hstack([x, extra]).astype(np.float32) / np.float32(np.sqrt(max_sq))
+
+
+def _topk_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k w każdym wierszu: argpartition + sortowanie tylko k najlepszych."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class ExactIndex:
+    """Dokładne wyszukiwanie – jeden matmul na blok zapytań."""
+
+    backend = "exact"
+
+    def __init__(self, vectors: np.ndarray, metric: str = "dot") -> None:
+        """
+        vectors – dla metryki "cosine" muszą być już znormalizowane
+                  (normalize_rows przy eksporcie).
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Nieznana metryka: {metric}")
+        self.vectors = vectors
+        self.metric = metric
+        self.num_items = int(vectors.shape[0])
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[Tuple[Sequence[int], Sequence[int]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        queries – [B, dim]; exclude – para (wiersze, itemy) do pominięcia.
+        Zwraca (ids [B, k], scores [B, k]) posortowane malejąco.
+        """
+        k = min(k, self.num_items)
+        if self.metric == "cosine":
+            queries = normalize_rows(queries)
+
+        scores = np.asarray(queries, dtype=np.float32) @ self.vectors.T  # [B, num_items]
+        if exclude is not None and len(exclude[0]):
+            scores[exclude[0], exclude[1]] = -np.inf
+
+        return _topk_rows(scores, k)
+
+
+class IVFIndex:
+    """
+    Przybliżone wyszukiwanie (inverted file).
+
+    Listy w układzie CSR: itemy listy l to list_items[list_offsets[l]:list_offsets[l + 1]].
+    Przeszukiwane jest nprobe list o najwyższym iloczynie z centroidem;
+    jeśli mają razem mniej niż k kandydatów, dochodzą kolejne listy.
+    """
+
+    backend = "ivf"
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_items: np.ndarray,
+        metric: str = "dot",
+        nprobe: int = DEFAULT_NPROBE,
+    ) -> None:
+        if metric not in METRICS:
+            raise ValueError(f"Nieznana metryka: {metric}")
+        self.vectors = vectors
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_items = list_items
+        self.metric = metric
+        self.nprobe = max(1, min(nprobe, len(self.centroids)))
+        self.num_items = int(vectors.shape[0])
+        self._list_sizes = np.diff(self.list_offsets)
+        # kopia wektorów w kolejności list – kandydaci listy to ciągły blok pamięci
+        self._list_vectors = np.asarray(vectors[list_items], dtype=np.float32)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[Tuple[Sequence[int], Sequence[int]]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Jak ExactIndex.search, ale scoring tylko dla kandydatów z wybranych list.
+
+        Kandydaci całego bloku zapytań trafiają do jednej macierzy [B, max kandydatów]
+        (brak = -inf), bez pętli w Pythonie: pary (zapytanie, lista) są
+        rozwijane na płaskie indeksy itemów, iloczyny liczone jednym einsum,
+        a top-k to jedno argpartition dla całego bloku.
+        """
+        k = min(k, self.num_items)
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.metric == "cosine":
+            queries = normalize_rows(queries)
+
+        n_rows, nlist = len(queries), len(self.centroids)
+        excl_rows = excl_items = None
+        n_excluded = np.zeros(n_rows, dtype=np.int64)
+        if exclude is not None and len(exclude[0]):
+            excl_rows, excl_items = (np.asarray(a, dtype=np.int64) for a in exclude)
+            n_excluded = np.bincount(excl_rows, minlength=n_rows)
+
+        # listy od najbliższej centroidy: zwykle wystarcza nprobe najlepszych
+        # (argpartition, kolejność w obrębie wiersza nie ma znaczenia); pełne
+        # sortowanie tylko gdy mają razem mniej niż k + liczba wykluczeń kandydatów
+        centroid_scores = queries @ self.centroids.T
+        need = k + n_excluded
+        probe = min(self.nprobe, nlist)
+        list_order = np.argpartition(-centroid_scores, probe - 1, axis=1)[:, :probe]
+        if (self._list_sizes[list_order].sum(axis=1) < need).any():
+            list_order = np.argsort(-centroid_scores, axis=1)
+        sizes = self._list_sizes[list_order]                  # [B, nprobe] albo [B, nlist]
+        ends = np.cumsum(sizes, axis=1)
+        n_lists = np.minimum(np.maximum(probe, (ends < need[:, None]).sum(axis=1) + 1), sizes.shape[1])
+        row_counts = ends[np.arange(n_rows), n_lists - 1]
+
+        # pary (wiersz, lista) w kolejności wierszy -> płaskie itemy (ragged arange po CSR);
+        # kolumna w macierzy kandydatów to po prostu pozycja w obrębie wiersza
+        rows, ranks = np.nonzero(np.arange(sizes.shape[1])[None, :] < n_lists[:, None])
+        pair_sizes = sizes[rows, ranks]
+        pair_first = np.cumsum(pair_sizes) - pair_sizes
+        within = np.arange(int(pair_sizes.sum())) - np.repeat(pair_first, pair_sizes)
+        flat_pos = np.repeat(self.list_offsets[list_order[rows, ranks]], pair_sizes) + within
+        flat_items = self.list_items[flat_pos]
+        flat_scores = np.einsum(
+            "ij,ij->i",
+            self._list_vectors[flat_pos],
+            np.repeat(queries, row_counts, axis=0),
+        )
+
+        width = int(row_counts.max()) if n_rows else 0
+        valid = np.arange(width)[None, :] < row_counts[:, None]
+        cand_ids = np.full((n_rows, width), -1, dtype=np.int64)
+        cand_scores = np.full((n_rows, width), -np.inf, dtype=np.float32)
+        cand_ids[valid] = flat_items
+        cand_scores[valid] = flat_scores
+
+        if excl_rows is not None:
+            keys = np.arange(n_rows, dtype=np.int64)[:, None] * self.num_items + cand_ids
+            cand_scores[np.isin(keys, excl_rows * self.num_items + excl_items) & (cand_ids >= 0)] = -np.inf
+
+        top, scores = _topk_rows(cand_scores, min(k, width)) if width else (
+            np.empty((n_rows, 0), dtype=np.int64), np.empty((n_rows, 0), dtype=np.float32)
+        )
+        ids = np.take_along_axis(cand_ids, top, axis=1)
+        # wykluczenia zjadły cały katalog – dopełnienie pustymi
+        ids[np.isneginf(scores)] = -1
+        return ids, scores
+
+
+def build_ivf(
+    vectors: np.ndarray,
+    nlist: Optional[int] = None,
+    iters: int = 10,
+    sample_size: int = 100_000,
+    seed: int = 42,
+    block_size: int = 65_536,
+    metric: str = "cosine",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sferyczny k-means na próbce znormalizowanych wektorów, potem przypisanie
+    wszystkich itemów. Zwraca (centroids [nlist, dim], list_offsets [nlist + 1],
+    list_items [num_items]).
+
+    metric="dot" – klasteryzacja wektorów po mips_augment; centroidy są
+    obcinane do dim, bo zapytanie [q, 0] i tak zeruje dodatkową współrzędną.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Nieznana metryka: {metric}")
+    dim = np.asarray(vectors).shape[1]
+    normed = mips_augment(vectors) if metric == "dot" else normalize_rows(vectors)
+    n = len(normed)
+    nlist = min(nlist or default_nlist(n), n)
+    rng = np.random.default_rng(seed)
+
+    sample = normed[rng.choice(n, size=min(n, max(sample_size, nlist)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        # pusta lista dostaje losowy punkt z próbki
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    # przypisanie całego katalogu blokami (pamięć: block_size x nlist)
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        assign[start:stop] = np.argmax(normed[start:stop] @ centroids.T, axis=1)
+
+    list_items = np.argsort(assign, kind="stable").astype(np.int64)
+    list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+
+    return np.ascontiguousarray(centroids[:, :dim], dtype=np.float32), list_offsets, list_items
+
+
+def make_index(
+    backend: str,
+    vectors: np.ndarray,
+    metric: str = "dot",
+    ivf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+    nprobe: int = DEFAULT_NPROBE,
+):
+    """
+    Fabryka backendów. Dla "ivf" bez gotowych tablic (stary artefakt)
+    buduje je w locie – ivf musi być zbudowane dla tej samej metryki.
+    """
+    if backend == "exact":
+        return ExactIndex(vectors, metric)
+    if backend == "ivf":
+        centroids, list_offsets, list_items = ivf if ivf is not None else build_ivf(vectors, metric=metric)
+        return IVFIndex(vectors, centroids, list_offsets, list_items, metric, nprobe)
+    raise ValueError(f"Nieznany backend indeksu: {backend} (dostępne: {', '.join(BACKENDS)})")
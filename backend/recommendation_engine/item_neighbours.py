@@ -0,0 +1,99 @@
+"""
+Tablica sąsiadów item->item (top-N najbliższych embeddingów, cosine).
+
+Liczona offline – przy eksporcie artefaktu albo osobno dla już istniejącego
+artefaktu – i zapisywana obok embeddingów:
+
+    item_neighbours.npy        # int64   [num_items, N]  item_idx sąsiadów od najlepszego
+    item_neighbour_scores.npy  # float32 [num_items, N]  podobieństwo cosine
+
+Endpointy /similar czytają gotowy wiersz zamiast liczyć podobieństwa
+(i zamiast heurystyki gatunek/autor).
+
+Przeliczenie dla aktualnego artefaktu (z katalogu backend/):
+    python -m recommendation_engine.item_neighbours
+    python -m recommendation_engine.item_neighbours --top-n 100
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from .item_index import ExactIndex, normalize_rows
+except ImportError:
+    from item_index import ExactIndex, normalize_rows
+
+NEIGHBOURS_TOP_N = 50
+NEIGHBOUR_FILES = ("item_neighbours", "item_neighbour_scores")
+
+
+def build_item_neighbours(
+    item_emb_normed: np.ndarray,
+    top_n: int = NEIGHBOURS_TOP_N,
+    block_size: int = 1024,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dokładne top-N sąsiadów każdego itemu (bez niego samego), blokami
+    po block_size wierszy. Zwraca (neighbours [num_items, N], scores [num_items, N]).
+    """
+    index = ExactIndex(item_emb_normed, "cosine")
+    num_items = index.num_items
+    top_n = min(top_n, num_items - 1)
+
+    neighbours = np.empty((num_items, top_n), dtype=np.int64)
+    scores = np.empty((num_items, top_n), dtype=np.float32)
+
+    for start in range(0, num_items, block_size):
+        stop = min(start + block_size, num_items)
+        own = np.arange(start, stop)
+        exclude = (own - start, own)
+        neighbours[start:stop], scores[start:stop] = index.search(
+            np.asarray(item_emb_normed[start:stop], dtype=np.float32), top_n, exclude
+        )
+
+    return neighbours, scores
+
+
+def save_item_neighbours(target: Path, neighbours: np.ndarray, scores: np.ndarray) -> None:
+    """Zapis do katalogu wersji artefaktu (każdy plik podmieniany atomowo)."""
+    for name, array in zip(NEIGHBOUR_FILES, (neighbours, scores)):
+        tmp = target / f"{name}.tmp.npy"
+        np.save(tmp, array)
+        os.replace(tmp, target / f"{name}.npy")
+
+
+def rebuild_for_current_artifact(top_n: int = NEIGHBOURS_TOP_N) -> Path:
+    """Przelicza tablicę sąsiadów dla aktualnej wersji artefaktu i dopisuje ją do manifestu."""
+    try:
+        from .serving_artifact import current_artifact_path, load_serving_artifact
+    except ImportError:
+        from serving_artifact import current_artifact_path, load_serving_artifact
+
+    artifact = load_serving_artifact()
+    normed = artifact.item_emb_normed
+    if normed is None:
+        normed = normalize_rows(artifact.item_emb)
+
+    print(f"🔄 Sąsiedzi item->item: {artifact.item_emb.shape[0]} itemów, top-{top_n}")
+    neighbours, scores = build_item_neighbours(normed, top_n)
+
+    target = current_artifact_path()
+    save_item_neighbours(target, neighbours, scores)
+
+    manifest = dict(artifact.manifest, neighbours_top_n=int(neighbours.shape[1]))
+    with open(target / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    print(f"✅ Zapisano {target / 'item_neighbours.npy'}")
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Przeliczenie tablicy sąsiadów item->item")
+    parser.add_argument("--top-n", type=int, default=NEIGHBOURS_TOP_N)
+    args = parser.parse_args()
+    rebuild_for_current_artifact(args.top_n)
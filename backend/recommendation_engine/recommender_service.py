@@ -3,12 +3,16 @@ import numpy as np
 import json
 from pathlib import Path
 
+from .item_index import ExactIndex, normalize_rows
+
 class RecommenderService:
     def __init__(self):
         self.user_embeddings = None
         self.item_embeddings = None
         self.book_mapping = None
         self.user_mapping = None
+        self.user_index = None
+        self.item_index = None
         self.is_loaded = False
     
     def load(self, model_dir: str = "recommendation_engine"):
@@ -28,6 +32,10 @@ class RecommenderService:
         with open(model_dir / "data" / "processed" / "user_mapping.json") as f:
             self.user_mapping = json.load(f)
         
+        # normy liczone raz przy ładowaniu, nie przy każdym zapytaniu
+        self.user_index = ExactIndex(self.item_embeddings, "dot")
+        self.item_index = ExactIndex(normalize_rows(self.item_embeddings), "cosine")
+        
         self.is_loaded = True
         print(f"✅ Model załadowany!")
         print(f"   Users: {self.user_embeddings.shape[0]}")
@@ -50,22 +58,20 @@ class RecommenderService:
         if user_idx >= len(self.user_embeddings):
             return []
         
-        scores = self.user_embeddings[user_idx] @ self.item_embeddings.T
-        
+        exclude = None
         if exclude_books:
-            for book_idx in exclude_books:
-                if book_idx < len(scores):
-                    scores[book_idx] = -np.inf
+            cols = [b for b in exclude_books if b < len(self.item_embeddings)]
+            exclude = ([0] * len(cols), cols)
         
-        top_indices = np.argsort(scores)[-n:][::-1]
+        top_indices, scores = self.user_index.search(self.user_embeddings[user_idx][None, :], n, exclude)
         
         recommendations = []
-        for idx in top_indices:
+        for idx, score in zip(top_indices[0].tolist(), scores[0].tolist()):
             original_book_id = self.book_mapping['to_original'].get(str(idx))
             if original_book_id:
                 recommendations.append({
                     'book_id': int(original_book_id),
-                    'score': float(scores[idx])
+                    'score': float(score)
                 })
         
         return recommendations
@@ -80,22 +86,16 @@ class RecommenderService:
         if book_idx >= len(self.item_embeddings):
             return []
         
-        book_emb = self.item_embeddings[book_idx]
-        
-        norms = np.linalg.norm(self.item_embeddings, axis=1)
-        similarities = (self.item_embeddings @ book_emb) / (norms * np.linalg.norm(book_emb) + 1e-10)
-        
-        similarities[book_idx] = -np.inf
-        
-        top_indices = np.argsort(similarities)[-n:][::-1]
+        book_emb = self.item_index.vectors[book_idx]
+        top_indices, similarities = self.item_index.search(book_emb[None, :], n, ([0], [book_idx]))
         
         similar = []
-        for idx in top_indices:
+        for idx, similarity in zip(top_indices[0].tolist(), similarities[0].tolist()):
             original_book_id = self.book_mapping['to_original'].get(str(idx))
             if original_book_id:
                 similar.append({
                     'book_id': int(original_book_id),
-                    'similarity': float(similarities[idx])
+                    'similarity': float(similarity)
                 })
         
         return similar
@@ -0,0 +1,226 @@
+"""
+Artefakt serwujący LightGCN (goodbooks-10k).
+
+Trening eksportuje gotowe do inferencji tablice, żeby API nie musiało
+czytać ratings.csv ani uruchamiać propagacji przy starcie:
+
+    recommendation_engine/model/serving/
+        CURRENT                   # nazwa aktualnej wersji (podmieniana atomowo)
+        <wersja>/
+            manifest.json
+            user_emb.npy          # float32 [num_users, dim]
+            item_emb.npy          # float32 [num_items, dim]
+            item_book_ids.npy     # int64   [num_items]  item_idx -> goodbooks_book_id
+            popular_items.npy     # int64   [num_items]  item_idx od najpopularniejszych
+            item_emb_normed.npy   # float32 [num_items, dim]  znormalizowane (item->item, cosine)
+            ivf_centroids.npy     # float32 [nlist, dim]      indeks IVF item->item (cosine, item_index.py)
+            ivf_list_offsets.npy  # int64   [nlist + 1]
+            ivf_list_items.npy    # int64   [num_items]
+            ivf_dot_centroids.npy     # float32 [nlist, dim]  indeks IVF user->item (dot, po mips_augment)
+            ivf_dot_list_offsets.npy  # int64   [nlist + 1]
+            ivf_dot_list_items.npy    # int64   [num_items]
+            item_neighbours.npy        # int64   [num_items, 50]  sąsiedzi item->item (item_neighbours.py)
+            item_neighbour_scores.npy  # float32 [num_items, 50]
+
+Serwis ładuje tablice przez np.load(mmap_mode="r"), więc workery współdzielą
+strony pamięci, a zimny start to tylko otwarcie plików.
+
+Ten moduł celowo nie importuje torch na poziomie modułu.
+
+Eksport z istniejącego checkpointu (z katalogu backend/):
+    python -m recommendation_engine.serving_artifact
+"""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+try:
+    from .item_index import build_ivf, normalize_rows
+    from .item_neighbours import NEIGHBOUR_FILES, NEIGHBOURS_TOP_N, build_item_neighbours
+except ImportError:
+    from item_index import build_ivf, normalize_rows
+    from item_neighbours import NEIGHBOUR_FILES, NEIGHBOURS_TOP_N, build_item_neighbours
+
+# to samo co MODEL_DIR w goodbooks_lightgcn.py (bez importu torch)
+MODEL_DIR = "recommendation_engine/model"
+ARTIFACT_DIR = os.path.join(MODEL_DIR, "serving")
+
+ARRAY_FILES = ("user_emb", "item_emb", "item_book_ids", "popular_items")
+# indeksy itemów – artefakty sprzed ich wprowadzenia ich nie mają
+IVF_FILES = ("ivf_centroids", "ivf_list_offsets", "ivf_list_items")
+IVF_DOT_FILES = ("ivf_dot_centroids", "ivf_dot_list_offsets", "ivf_dot_list_items")
+INDEX_FILES = ("item_emb_normed",) + IVF_FILES + IVF_DOT_FILES + NEIGHBOUR_FILES
+
+
+class ServingArtifact:
+    """Zmapowane w pamięć tablice artefaktu + manifest."""
+
+    def __init__(self, path: Path, manifest: dict, arrays: dict) -> None:
+        self.path = path
+        self.manifest = manifest
+        self.version: str = manifest["version"]
+
+        self.user_emb: np.ndarray = arrays["user_emb"]
+        self.item_emb: np.ndarray = arrays["item_emb"]
+        self.item_book_ids: np.ndarray = arrays["item_book_ids"]
+        self.popular_items: np.ndarray = arrays["popular_items"]
+
+        self.item_emb_normed: Optional[np.ndarray] = arrays.get("item_emb_normed")
+        self.item_neighbours: Optional[np.ndarray] = arrays.get("item_neighbours")
+        self.item_neighbour_scores: Optional[np.ndarray] = arrays.get("item_neighbour_scores")
+
+        # IVF dla metryki cosine (item->item) i dot (user->item) – listy różnią się
+        self.ivf: Optional[tuple] = _ivf_arrays(arrays, IVF_FILES)
+        self.ivf_dot: Optional[tuple] = _ivf_arrays(arrays, IVF_DOT_FILES)
+
+
+def _ivf_arrays(arrays: dict, names: tuple) -> Optional[tuple]:
+    if all(name in arrays for name in names):
+        return tuple(arrays[name] for name in names)
+    return None
+
+
+def current_artifact_path(artifact_dir: str = ARTIFACT_DIR) -> Optional[Path]:
+    """Ścieżka do aktualnej wersji artefaktu albo None, jeśli brak."""
+    pointer = Path(artifact_dir) / "CURRENT"
+    if not pointer.exists():
+        return None
+
+    path = Path(artifact_dir) / pointer.read_text(encoding="utf-8").strip()
+    if not (path / "manifest.json").exists():
+        return None
+    return path
+
+
+def export_serving_artifact(
+    user_emb,
+    item_emb,
+    item_book_ids,
+    popular_items,
+    artifact_dir: str = ARTIFACT_DIR,
+    extra: Optional[dict] = None,
+    ivf_nlist: Optional[int] = None,
+    neighbours_top_n: int = NEIGHBOURS_TOP_N,
+) -> dict:
+    """
+    Zapisuje nową wersję artefaktu (razem z indeksami itemów) i przełącza
+    na nią CURRENT. Przyjmuje tablice numpy (albo tensory CPU – konwertowane
+    przez np.asarray). Zwraca manifest.
+    """
+    version = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    target = Path(artifact_dir) / version
+    target.mkdir(parents=True, exist_ok=True)
+
+    arrays = {
+        "user_emb": np.ascontiguousarray(np.asarray(user_emb, dtype=np.float32)),
+        "item_emb": np.ascontiguousarray(np.asarray(item_emb, dtype=np.float32)),
+        "item_book_ids": np.asarray(item_book_ids, dtype=np.int64),
+        "popular_items": np.asarray(popular_items, dtype=np.int64),
+    }
+    arrays["item_emb_normed"] = normalize_rows(arrays["item_emb"])
+    arrays["ivf_centroids"], arrays["ivf_list_offsets"], arrays["ivf_list_items"] = build_ivf(
+        arrays["item_emb"], nlist=ivf_nlist, metric="cosine"
+    )
+    arrays["ivf_dot_centroids"], arrays["ivf_dot_list_offsets"], arrays["ivf_dot_list_items"] = build_ivf(
+        arrays["item_emb"], nlist=ivf_nlist, metric="dot"
+    )
+    arrays["item_neighbours"], arrays["item_neighbour_scores"] = build_item_neighbours(
+        arrays["item_emb_normed"], neighbours_top_n
+    )
+    for name, array in arrays.items():
+        np.save(target / f"{name}.npy", array)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "num_users": int(arrays["user_emb"].shape[0]),
+        "num_items": int(arrays["item_emb"].shape[0]),
+        "embedding_dim": int(arrays["item_emb"].shape[1]),
+        "ivf_nlist": int(arrays["ivf_centroids"].shape[0]),
+        "neighbours_top_n": int(arrays["item_neighbours"].shape[1]),
+        **(extra or {}),
+    }
+    with open(target / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    # atomowe przełączenie wskaźnika – workery nigdy nie widzą połowy eksportu
+    pointer_tmp = Path(artifact_dir) / "CURRENT.tmp"
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, Path(artifact_dir) / "CURRENT")
+
+    print(f"📦 Artefakt serwujący zapisany: {target}")
+    return manifest
+
+
+def load_serving_artifact(artifact_dir: str = ARTIFACT_DIR) -> ServingArtifact:
+    """Ładuje aktualną wersję artefaktu (mmap, tylko do odczytu)."""
+    path = current_artifact_path(artifact_dir)
+    if path is None:
+        raise FileNotFoundError(
+            f"Brak artefaktu serwującego w {artifact_dir}.\n"
+            f"Uruchom trening goodbooks_lightgcn albo: "
+            f"python -m recommendation_engine.serving_artifact"
+        )
+
+    with open(path / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAY_FILES}
+    for name in INDEX_FILES:
+        if (path / f"{name}.npy").exists():
+            arrays[name] = np.load(path / f"{name}.npy", mmap_mode="r")
+    return ServingArtifact(path, manifest, arrays)
+
+
+def export_from_checkpoint(artifact_dir: str = ARTIFACT_DIR) -> dict:
+    """
+    Buduje artefakt z ratings.csv + lightgcn_goodbooks_pro.pt
+    (dla modeli wytrenowanych przed wprowadzeniem artefaktu).
+    """
+    import torch
+
+    from .goodbooks_lightgcn import LightGCN, build_edge_index, load_goodbooks
+
+    df, num_users, num_items = load_goodbooks()
+    edge_index = build_edge_index(df, num_users).cpu()
+
+    model_path = Path(MODEL_DIR) / "lightgcn_goodbooks_pro.pt"
+    model = LightGCN(num_users, num_items)
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+
+    return export_model(model, edge_index, df, artifact_dir)
+
+
+def export_model(model, edge_index, df, artifact_dir: str = ARTIFACT_DIR) -> dict:
+    """Propaguje model i eksportuje embeddingi + mapowania z df (user_idx/item_idx/book_id)."""
+    import torch
+
+    with torch.no_grad():
+        user_emb, item_emb = model.propagate(edge_index)
+
+    num_items = item_emb.shape[0]
+
+    item_book_ids = np.zeros(num_items, dtype=np.int64)
+    mapping = df[["item_idx", "book_id"]].drop_duplicates()
+    item_book_ids[mapping["item_idx"].values] = mapping["book_id"].values
+
+    counts = np.bincount(df["item_idx"].values, minlength=num_items)
+    popular_items = np.argsort(-counts, kind="stable")
+
+    return export_serving_artifact(
+        user_emb.cpu().numpy(),
+        item_emb.cpu().numpy(),
+        item_book_ids,
+        popular_items,
+        artifact_dir,
+        extra={"interactions": int(len(df)), "layers": int(model.layers)},
+    )
+
+
+if __name__ == "__main__":
+    export_from_checkpoint()
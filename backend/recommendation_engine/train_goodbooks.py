@@ -3,6 +3,8 @@ import numpy as np
 from torch import optim
 import scipy.sparse as sp
 
+from evaluation import build_csr, csr_from_user_items, evaluate_topk
+
 # === KONFIGURACJA ===
 EMBEDDING_DIM = 64
 N_LAYERS = 3
@@ -92,6 +94,14 @@ train_items = np.array(train_items)
 
 print(f"Training pairs: {len(train_users):,}")
 
+# CSR pozytywów do ewaluacji – budowane raz, nie przy każdej ewaluacji
+train_csr = build_csr(train_users, train_items, n_users, device=DEVICE)
+test_csr = csr_from_user_items(
+    {u: items for u, items in test_data.items() if u in train_data},
+    n_users,
+    device=DEVICE,
+)
+
 best_recall = 0
 for epoch in range(EPOCHS):
     model.train()
@@ -142,25 +152,15 @@ for epoch in range(EPOCHS):
         with torch.no_grad():
             user_emb, item_emb = model()
             
-            # Recall@20
-            recalls = []
-            for user_id, test_items in test_data.items():
-                if user_id not in train_data:
-                    continue
-                
-                scores = (user_emb[user_id] @ item_emb.T).cpu().numpy()
-                
-                # Maskuj train items
-                for item in train_data[user_id]:
-                    scores[item] = -np.inf
-                
-                top20 = np.argsort(scores)[-20:]
-                hits = len(set(top20) & set(test_items))
-                recalls.append(hits / len(test_items))
-            
-            recall = np.mean(recalls)
+            # Recall/NDCG/Precision/Coverage@20 dla wszystkich użytkowników testowych
+            metrics = evaluate_topk(user_emb, item_emb, test_csr, train_csr=train_csr, k=20)
+            recall = metrics["recall"]
             
-            print(f"Epoch {epoch+1}: Loss={total_loss/n_batches:.4f}, Recall@20={recall:.4f}")
+            print(
+                f"Epoch {epoch+1}: Loss={total_loss/n_batches:.4f}, Recall@20={recall:.4f}, "
+                f"NDCG@20={metrics['ndcg']:.4f}, Precision@20={metrics['precision']:.4f}, "
+                f"Coverage={metrics['coverage']:.4f}"
+            )
             
             if recall > best_recall:
                 best_recall = recall
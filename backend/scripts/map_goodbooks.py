@@ -1,9 +1,15 @@
 import csv
 import asyncio
+import os
+import sys
 from pprint import pprint
 from motor.motor_asyncio import AsyncIOMotorClient
 from rapidfuzz import fuzz, process
-from unidecode import unidecode
+
+# uruchamiany jako skrypt z backend/ – normalize() współdzielone z wyszukiwarką API
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.text import normalize
 
 
 
@@ -16,13 +22,6 @@ GOODBOOKS_CSV = "./books.csv"
 FUZZY_THRESHOLD = 85            
 
 
-def normalize(text: str) -> str:
-    if not text:
-        return ""
-    t = unidecode(text).lower().strip()
-    return " ".join(t.split())
-
-
 async def map_books():
 
     print("Wczytywanie goodbooks CSV...")
@@ -0,0 +1,174 @@
+"""
+Migracja goodbooks_book_id do jednego typu (int).
+
+Część książek ma goodbooks_book_id zapisany jako string (ręczne dodawanie
+przez API), część jako double albo null. Skrypt:
+    1. wypisuje duplikaty goodbooks_book_id po konwersji (np. "123" i 123)
+       i kończy się bez zapisu – unikalny indeks (import_goodbooks.py,
+       init_db.py) odrzuciłby ich konwersję, więc trzeba je rozwiązać ręcznie,
+    2. zamienia string/double/decimal na int (bulk_write w batchach),
+    3. usuwa pole, gdy wartość jest pusta lub nie jest liczbą całkowitą,
+    4. zakłada unikalny indeks sparse.
+
+Uruchom:
+    cd backend
+    python scripts/migrate_goodbooks_ids.py --dry-run
+    python scripts/migrate_goodbooks_ids.py
+
+Wymaga:
+    pip install pymongo
+"""
+
+import argparse
+import os
+import sys
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+MONGO_URI = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "biblioteka")
+
+# int32/int64 zostają – Mongo porównuje je jako te same liczby
+NON_INT_TYPES = ["string", "double", "decimal", "null"]
+
+
+def to_int(value):
+    """Wartość goodbooks_book_id -> int albo None, jeśli nie da się jej sensownie zamienić."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        as_float = float(str(value).strip())
+    except ValueError:
+        return None
+    if not as_float.is_integer():
+        return None
+    return int(as_float)
+
+
+def migrate(books, batch_size: int, dry_run: bool) -> dict:
+    stats = {"converted": 0, "unset": 0, "failed": 0}
+    ops, op_ids = [], []
+
+    def flush():
+        if ops and not dry_run:
+            try:
+                books.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # ordered=False – reszta batcha zapisana; konflikty (np. z unikalnym
+                # indeksem, gdy ktoś zapisał duplikat w trakcie migracji) do ręcznej naprawy
+                errors = e.details.get("writeErrors", [])
+                stats["failed"] += len(errors)
+                for error in errors:
+                    print(f"   ❌ {op_ids[error['index']]}: {error.get('errmsg')}")
+        ops.clear()
+        op_ids.clear()
+
+    cursor = books.find(
+        {"goodbooks_book_id": {"$type": NON_INT_TYPES}},
+        {"goodbooks_book_id": 1, "title": 1},
+    )
+    for doc in cursor:
+        value = to_int(doc["goodbooks_book_id"])
+        if value is None:
+            print(f"   ⚠️  {doc['_id']} ({doc.get('title')}): {doc['goodbooks_book_id']!r} -> usuwam pole")
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$unset": {"goodbooks_book_id": ""}}))
+            stats["unset"] += 1
+        else:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"goodbooks_book_id": value}}))
+            stats["converted"] += 1
+        op_ids.append(doc["_id"])
+
+        if len(ops) >= batch_size:
+            flush()
+            print(f"   ✓ Przetworzono: {stats['converted'] + stats['unset']}")
+
+    flush()
+    return stats
+
+
+# goodbooks_book_id po konwersji jak to_int(): liczba całkowita (string po trim,
+# double, decimal) albo null
+_TRIMMED = {"$cond": [
+    {"$eq": [{"$type": "$goodbooks_book_id"}, "string"]},
+    {"$trim": {"input": "$goodbooks_book_id"}},
+    {"$cond": [{"$eq": [{"$type": "$goodbooks_book_id"}, "bool"]}, None, "$goodbooks_book_id"]},
+]}
+_AS_DOUBLE = {"$convert": {"input": _TRIMMED, "to": "double", "onError": None, "onNull": None}}
+_AS_LONG = {"$let": {"vars": {"d": _AS_DOUBLE}, "in": {"$cond": [
+    {"$and": [{"$ne": ["$$d", None]}, {"$eq": ["$$d", {"$trunc": "$$d"}]}]},
+    {"$toLong": "$$d"},
+    None,
+]}}}
+
+
+def find_duplicates(books) -> list:
+    """Grupy książek o tym samym goodbooks_book_id po konwersji (bez zapisu)."""
+    pipeline = [
+        {"$match": {"goodbooks_book_id": {"$exists": True}}},
+        {"$group": {"_id": _AS_LONG, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"_id": {"$ne": None}, "count": {"$gt": 1}}},
+    ]
+    return list(books.aggregate(pipeline))
+
+
+def ensure_unique_index(books) -> None:
+    """Unikalny indeks sparse; stary nieunikalny indeks na tym polu jest zastępowany."""
+    for name, info in books.index_information().items():
+        if info["key"] == [("goodbooks_book_id", ASCENDING)] and not info.get("unique"):
+            print(f"   🗑️  Usuwam nieunikalny indeks {name}")
+            books.drop_index(name)
+    books.create_index("goodbooks_book_id", unique=True, sparse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migracja goodbooks_book_id do int")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="tylko raport, bez zapisu")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔢 Migracja goodbooks_book_id -> int")
+    print("=" * 60)
+
+    print(f"\n🔌 Łączenie z MongoDB: {MONGO_URI}")
+    client = MongoClient(MONGO_URI)
+    books = client[DATABASE_NAME].books
+
+    # przed zapisem – konwersja duplikatu wywróciłaby się na unikalnym indeksie w połowie
+    print("\n🔍 Szukanie duplikatów...")
+    duplicates = find_duplicates(books)
+    if duplicates:
+        print(f"\n❌ Duplikaty goodbooks_book_id: {len(duplicates)} – nic nie zapisano, rozwiąż je ręcznie")
+        for dup in duplicates[:50]:
+            print(f"   {dup['_id']}: {', '.join(str(i) for i in dup['ids'])}")
+        client.close()
+        sys.exit(1)
+    print("   ✓ Brak duplikatów")
+
+    print(f"\n🔄 Konwersja{' (dry-run)' if args.dry_run else ''}...")
+    stats = migrate(books, args.batch_size, args.dry_run)
+    print(f"   ✓ Zamieniono na int: {stats['converted']}")
+    print(f"   ✓ Usunięto niepoprawne: {stats['unset']}")
+
+    if args.dry_run:
+        print("\n⚠️  Dry-run – nic nie zapisano.")
+
+    if stats["failed"]:
+        print(f"\n❌ Nieudane zapisy: {stats['failed']} – indeks unikalny NIE został założony")
+        client.close()
+        sys.exit(1)
+
+    if not args.dry_run:
+        print("\n🔍 Tworzenie indeksu unikalnego...")
+        ensure_unique_index(books)
+        print("   ✓ goodbooks_book_id: unique, sparse")
+
+    client.close()
+    print("\n🎉 Gotowe!")
+
+
+if __name__ == "__main__":
+    main()
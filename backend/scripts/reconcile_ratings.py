@@ -0,0 +1,132 @@
+"""
+Naprawa rozjazdów ocen książek (rating_sum / rating_count / average_rating /
+ratings_count) utrzymywanych przyrostowo przez routes/reviews.py.
+
+Jedna agregacja po całej kolekcji reviews ($group po book_id), potem
+bulk_write w batchach:
+    1. książki z recenzjami dostają sumę i liczbę ocen z agregacji,
+    2. książki z rating_count > 0, które nie mają już recenzji, są zerowane.
+Zapisywane są tylko książki, których wartości się różnią.
+
+Uruchom:
+    cd backend
+    python scripts/reconcile_ratings.py --dry-run
+    python scripts/reconcile_ratings.py
+
+Wymaga:
+    pip install pymongo
+"""
+
+import argparse
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+MONGO_URI = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "biblioteka")
+
+RATING_FIELDS = {"rating_sum": 1, "rating_count": 1, "average_rating": 1, "ratings_count": 1}
+
+
+def rating_fields(rating_sum: int, rating_count: int) -> dict:
+    """Te same pola i zaokrąglenie co apply_rating_delta w routes/reviews.py."""
+    return {
+        "rating_sum": rating_sum,
+        "rating_count": rating_count,
+        "ratings_count": rating_count,
+        "average_rating": round(rating_sum / rating_count, 2) if rating_count else 0,
+    }
+
+
+def review_totals(reviews) -> dict:
+    """{book_id (str): (suma ocen, liczba ocen)} – jedna agregacja."""
+    pipeline = [
+        {"$group": {"_id": "$book_id", "rating_sum": {"$sum": "$rating"}, "rating_count": {"$sum": 1}}},
+    ]
+    return {
+        str(row["_id"]): (row["rating_sum"], row["rating_count"])
+        for row in reviews.aggregate(pipeline, allowDiskUse=True)
+    }
+
+
+def differs(book: dict, expected: dict) -> bool:
+    return any(book.get(field) != value for field, value in expected.items())
+
+
+def reconcile(books, totals: dict, batch_size: int, dry_run: bool) -> dict:
+    stats = {"checked": 0, "fixed": 0, "reset": 0, "orphaned": 0}
+    ops = []
+
+    def flush():
+        if ops and not dry_run:
+            books.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    def queue(book: dict, expected: dict, counter: str):
+        if not differs(book, expected):
+            return
+        if stats["fixed"] + stats["reset"] < 50:
+            print(f"   ✏️  {book['_id']}: {book.get('rating_sum')}/{book.get('rating_count')} "
+                  f"-> {expected['rating_sum']}/{expected['rating_count']}")
+        ops.append(UpdateOne({"_id": book["_id"]}, {"$set": {**expected, "updated_at": datetime.utcnow()}}))
+        stats[counter] += 1
+        if len(ops) >= batch_size:
+            flush()
+
+    # 1. książki z recenzjami
+    ids = [ObjectId(book_id) for book_id in totals if ObjectId.is_valid(book_id)]
+    seen = set()
+    for start in range(0, len(ids), batch_size):
+        for book in books.find({"_id": {"$in": ids[start:start + batch_size]}}, RATING_FIELDS):
+            seen.add(str(book["_id"]))
+            stats["checked"] += 1
+            queue(book, rating_fields(*totals[str(book["_id"])]), "fixed")
+    stats["orphaned"] = len(totals) - len(seen)
+
+    # 2. książki, które mają liczniki, a nie mają już recenzji
+    for book in books.find({"rating_count": {"$gt": 0}}, RATING_FIELDS):
+        if str(book["_id"]) not in totals:
+            stats["checked"] += 1
+            queue(book, rating_fields(0, 0), "reset")
+
+    flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Przeliczenie ocen książek z recenzji")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="tylko raport, bez zapisu")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⭐ Uzgadnianie ocen książek z recenzjami")
+    print("=" * 60)
+
+    print(f"\n🔌 Łączenie z MongoDB: {MONGO_URI}")
+    client = MongoClient(MONGO_URI)
+    db = client[DATABASE_NAME]
+
+    print("\n📊 Agregacja recenzji...")
+    totals = review_totals(db.reviews)
+    print(f"   ✓ Książek z recenzjami: {len(totals)}")
+
+    print(f"\n🔄 Porównanie{' (dry-run)' if args.dry_run else ''}...")
+    stats = reconcile(db.books, totals, args.batch_size, args.dry_run)
+    print(f"   ✓ Sprawdzono: {stats['checked']}")
+    print(f"   ✓ Poprawiono: {stats['fixed']}")
+    print(f"   ✓ Wyzerowano: {stats['reset']}")
+    if stats["orphaned"]:
+        print(f"   ⚠️  Recenzje nieistniejących książek: {stats['orphaned']}")
+
+    if args.dry_run:
+        print("\n⚠️  Dry-run – nic nie zapisano.")
+
+    client.close()
+    print("\n🎉 Gotowe!")
+
+
+if __name__ == "__main__":
+    main()
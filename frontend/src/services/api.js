@@ -44,7 +44,8 @@ export const booksAPI = {
   create: (data) => api.post('/books/', data),
   update: (id, data) => api.put(`/books/${id}`, data),
   delete: (id) => api.delete(`/books/${id}`),
-  search: (query) => api.get('/books/', { params: { search: query } })
+  search: (query) => api.get('/books/', { params: { search: query } }),
+  suggest: (query, limit = 8) => api.get('/books/suggest', { params: { q: query, limit } })
 };
 
 // Auth API